@@ -0,0 +1,136 @@
+"""
+JokeFlow runs against a mock provider that enforces requests/tokens limits, with and
+without the rate limiter:
+
+    python -m benchmarks.rate_limit --runs 200 --concurrency 50 --rpw 20 --window 1
+
+- "naive": LLM calls fire unthrottled and each retries a 429 after a short fixed delay
+- "aimd": adaptive concurrency and jittered retries, limits unknown to the client
+- "buckets": aimd plus token buckets set to the provider's limits
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, CompletionResponse
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.llm import LLM
+
+from src.utils.guarded_llm import DelegatingLLM, LLMGuard
+from src.utils.mock_backend import MockRateLimitError, ProviderLimits, mock_llm_factory
+from src.utils.rate_limit import RateLimiter
+from src.utils.resources import ResourceRegistry
+from src.workflows.jokeflow import JokeFlow
+
+
+class FixedDelayRetryLLM(DelegatingLLM):
+    """Retries a 429 after a fixed delay, what a client without a rate limiter usually does."""
+
+    _retries: int = PrivateAttr(default=0)
+    _delay: float = PrivateAttr(default=0.0)
+
+    @classmethod
+    def wrap(cls, llm: LLM, retries: int, delay: float) -> "FixedDelayRetryLLM":
+        retrying = cls._wrapping(llm)
+        retrying._retries = retries
+        retrying._delay = delay
+        return retrying
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FixedDelayRetryLLM"
+
+    async def _retry(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        for attempt in range(self._retries + 1):
+            try:
+                return await call()
+            except MockRateLimitError:
+                if attempt == self._retries:
+                    raise
+                await asyncio.sleep(self._delay)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self._retry(lambda: self.llm.achat(messages, **kwargs))
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self._retry(lambda: self.llm.acomplete(prompt, formatted=formatted, **kwargs))
+
+
+async def scenario(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    limits = ProviderLimits(requests=args.rpw, tokens=args.tpw, window=args.window)
+    per_minute = 60 / args.window
+    limiter = None
+    if mode != "naive":
+        limiter = RateLimiter(
+            requests_per_minute=args.rpw * per_minute if mode == "buckets" else None,
+            tokens_per_minute=args.tpw * per_minute if mode == "buckets" and args.tpw else None,
+            burst=args.window / 60,
+            max_concurrency=args.concurrency,
+            max_retries=args.retries,
+            base_delay=args.window / 4,
+        )
+    guard = LLMGuard(max_concurrency=args.concurrency, rate_limiter=limiter, completion_tokens=args.output_tokens)
+    llm_factory = guard.factory(
+        mock_llm_factory(latency_ms=args.latency_ms, output_tokens=args.output_tokens, provider_limits=limits)
+    )
+    if mode == "naive":
+        # retried per LLM call like the limiter does, so every mode sends the same requests
+        guarded_factory = llm_factory
+
+        def llm_factory(registry: Any, model: Optional[str], **kwargs: Any) -> LLM:
+            return FixedDelayRetryLLM.wrap(
+                guarded_factory(registry, model, **kwargs), args.retries, args.naive_delay_ms / 1000
+            )
+
+    resources = ResourceRegistry(llm_factory=llm_factory)
+    workflow = JokeFlow(resources=resources, timeout=600)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failed = 0
+
+    async def one(i: int) -> None:
+        nonlocal failed
+        async with semaphore:
+            try:
+                await workflow.run(topic=f"topic {i}")
+            except Exception:
+                failed += 1
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one(i) for i in range(args.runs)))
+    wall = time.perf_counter() - started
+    return {
+        "completed": args.runs - failed,
+        "failed": failed,
+        "provider_accepted": limits.accepted,
+        "provider_429s": limits.rejected,
+        "seconds": round(wall, 2),
+        "runs_per_sec": round((args.runs - failed) / wall, 2),
+        "guard": guard.stats,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=["naive", "aimd", "buckets"], default=["naive", "aimd", "buckets"])
+    parser.add_argument("--runs", type=int, default=100, help="JokeFlow runs, two LLM calls each")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rpw", type=int, default=20, help="provider requests per window")
+    parser.add_argument("--tpw", type=int, default=None, help="provider tokens per window")
+    parser.add_argument("--window", type=float, default=1.0, help="provider window in seconds (60 for real RPM)")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--output-tokens", type=int, default=32)
+    parser.add_argument("--retries", type=int, default=8)
+    parser.add_argument("--naive-delay-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    report = {mode: await scenario(mode, args) for mode in args.modes}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+LLM calls and latency of CompactAndRefine vs PackedSynthesizer for one query.
+
+Runs offline: a mock LLM sleeps per call and per prompt token, nodes are
+overlapping SentenceSplitter chunks of generated text:
+
+    python -m benchmarks.synthesis --nodes 12 --chunk-size 512 --call-ms 300
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Any
+
+from llama_index.core.llms import MockLLM
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.response_synthesizers import CompactAndRefine
+from llama_index.core.schema import Document, NodeWithScore
+
+from src.utils.packing import PackedSynthesizer, count_tokens
+
+
+class TimedMockLLM(MockLLM):
+    """MockLLM that takes `call_s` plus `token_s` per prompt token and counts its calls."""
+
+    call_s: float = 0.3
+    token_s: float = 0.0
+    calls: int = 0
+    prompt_tokens: int = 0
+
+    def _wait(self, prompt: str) -> None:
+        tokens = count_tokens(prompt)
+        self.calls += 1
+        self.prompt_tokens += tokens
+        time.sleep(self.call_s + self.token_s * tokens)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        self._wait(prompt)
+        return super().complete(prompt, formatted=formatted, **kwargs)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        self._wait(prompt)
+        return super().stream_complete(prompt, formatted=formatted, **kwargs)
+
+
+def _nodes(count: int, chunk_size: int, overlap: int) -> list:
+    rng = random.Random(0)
+    words = [f"term{i}" for i in range(2000)]
+    sentences = [" ".join(rng.choices(words, k=rng.randint(8, 24))) + "." for _ in range(count * chunk_size // 8)]
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
+    chunks = splitter.get_nodes_from_documents([Document(text=" ".join(sentences))])[:count]
+    # reranked order: best first, some neighbours retrieved together
+    return [NodeWithScore(node=node, score=1.0 - i / count) for i, node in enumerate(chunks)]
+
+
+async def _run(synthesizer, llm, nodes, queries):
+    timings = []
+    llm.calls = llm.prompt_tokens = 0
+    for query in queries:
+        started = time.perf_counter()
+        response = await synthesizer.asynthesize(query, nodes=nodes)
+        async for _ in response.async_response_gen():
+            pass
+        timings.append(time.perf_counter() - started)
+    return {
+        "llm_calls_per_query": llm.calls / len(queries),
+        "prompt_tokens_per_query": llm.prompt_tokens // len(queries),
+        "p50_s": round(statistics.median(timings), 3),
+        "mean_s": round(statistics.fmean(timings), 3),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=12)
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--chunk-overlap", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--call-ms", type=float, default=300.0, help="fixed cost of one LLM call")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=50.0, help="prompt processing cost")
+    parser.add_argument("--token-budget", type=int, default=None)
+    args = parser.parse_args()
+
+    nodes = _nodes(args.nodes, args.chunk_size, args.chunk_overlap)
+    queries = [f"What does term{i} refer to?" for i in range(args.queries)]
+    llm = TimedMockLLM(max_tokens=20)
+    llm.call_s, llm.token_s = args.call_ms / 1000, args.ms_per_1k_tokens / 1e6
+
+    packed = PackedSynthesizer(llm=llm, streaming=True, token_budget=args.token_budget)
+    report = {
+        "nodes": len(nodes),
+        "node_tokens": sum(count_tokens(n.node.get_content()) for n in nodes),
+        "context_window": llm.metadata.context_window,
+        "packed_nodes": len(packed.pack(queries[0], nodes)),
+        "compact_and_refine": await _run(CompactAndRefine(llm=llm, streaming=True), llm, nodes, queries),
+        "packed": await _run(packed, llm, nodes, queries),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Query latency of the default SimpleVectorStore vs NumpyVectorStore (exact and IVF).
+
+Runs offline on random vectors:
+
+    python -m benchmarks.vector_store --rows 50000 --dim 256 --queries 50
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from src.utils.numpy_vector_store import NumpyVectorStore
+
+
+def _latencies(store, queries, top_k):
+    timings, results = [], []
+    for q in queries:
+        started = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k))
+        timings.append((time.perf_counter() - started) * 1000)
+        results.append(result.ids)
+    return timings, results
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--n-probe", type=int, default=8)
+    parser.add_argument("--clusters", type=int, default=200, help="real embeddings cluster, pure noise would understate IVF recall")
+    parser.add_argument("--skip-simple", action="store_true", help="the default store is slow past ~100k rows")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    embeddings = centers[rng.integers(args.clusters, size=args.rows)]
+    embeddings += 0.5 * rng.standard_normal((args.rows, args.dim), dtype=np.float32)
+    queries = centers[rng.integers(args.clusters, size=args.queries)]
+    queries += 0.5 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    nodes = [TextNode(id_=str(i), text="") for i in range(args.rows)]
+
+    report = {"rows": args.rows, "dim": args.dim, "queries": args.queries, "top_k": args.top_k}
+
+    exact = NumpyVectorStore.from_arrays(nodes, embeddings)
+    timings, exact_ids = _latencies(exact, queries, args.top_k)
+    report["numpy_exact"] = _summary(timings)
+
+    half = NumpyVectorStore.from_arrays(nodes, embeddings, dtype="float16")
+    timings, _ = _latencies(half, queries, args.top_k)
+    report["numpy_float16"] = _summary(timings)
+
+    ivf = NumpyVectorStore.from_arrays(nodes, embeddings, approximate=True, n_probe=args.n_probe)
+    started = time.perf_counter()
+    ivf.build_ivf()
+    report["numpy_ivf_build_s"] = round(time.perf_counter() - started, 3)
+    timings, ivf_ids = _latencies(ivf, queries, args.top_k)
+    report["numpy_ivf"] = _summary(timings)
+    report["numpy_ivf"]["recall"] = round(
+        statistics.fmean(len(set(a) & set(b)) / args.top_k for a, b in zip(exact_ids, ivf_ids)), 3
+    )
+
+    if not args.skip_simple:
+        simple = SimpleVectorStore()
+        simple.add(
+            [node.model_copy(update={"embedding": row.tolist()}) for node, row in zip(nodes, embeddings)]
+        )
+        timings, _ = _latencies(simple, queries, args.top_k)
+        report["simple"] = _summary(timings)
+        report["speedup_p50"] = round(report["simple"]["p50_ms"] / report["numpy_exact"]["p50_ms"], 1)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Latency, throughput, per-step time and memory of every workflow in src/workflows.
+
+Runs offline against the mock backend (src/utils/mock_backend.py):
+
+    python -m benchmarks.workflows --runs 200 --concurrency 20 --output results.json
+    python -m benchmarks.workflows --only rag agent --compare results.json
+
+Each scenario does a timed pass of `--runs` runs, at most `--concurrency` in flight,
+then a shorter pass under tracemalloc for peak Python memory.
+"""
+import argparse
+import asyncio
+import atexit
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.tools import FunctionTool
+
+from src.utils.mock_backend import mock_embedding_factory, mock_llm_factory
+from src.utils.resources import ResourceRegistry
+from src.utils.tracing import RunTrace, WorkflowTracer
+from src.workflows.collect_examples import CollectExampleFlow
+from src.workflows.context_example import GloabalExampleFlow
+from src.workflows.function_calling import FunctionCallingAgent
+from src.workflows.jokeflow import JokeFlow
+from src.workflows.loop_example import LoopExampleFlow
+from src.workflows.rag import RagWorkflow
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda q: values[min(int(q * len(values)), len(values) - 1)]
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(values) * 1000, 3),
+    }
+
+
+# --- scenarios ---------------------------------------------------------------------
+# each returns (workflow, run_kwargs(i)); setup work done here is not timed
+
+
+def _lookup(key: str) -> str:
+    """Looks a key up in the inventory."""
+    time.sleep(_lookup.delay)
+    return f"{key}: in stock"
+
+
+_lookup.delay = 0.0
+
+
+def _write_corpus(dirname: str, docs: int) -> None:
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(3000)]
+    for d in range(docs):
+        sentences = [" ".join(rng.choices(words, k=12)) + f" part E{d * 10 + s}." for s in range(60)]
+        with open(os.path.join(dirname, f"doc{d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(sentences))
+
+
+async def rag_scenario(resources: ResourceRegistry, args: argparse.Namespace):
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    corpus = os.path.join(workdir, "data")
+    os.makedirs(corpus)
+    _write_corpus(corpus, args.rag_docs)
+    workflow = RagWorkflow(
+        resources=resources,
+        persist_dir=os.path.join(workdir, "store"),
+        reranker="local",
+        hybrid=True,
+        timeout=120,
+    )
+    index = await workflow.run(dirname=corpus)
+    return workflow, lambda i: {"query": f"What is part E{i % (args.rag_docs * 10)}?", "index": index}
+
+
+async def agent_scenario(resources: ResourceRegistry, args: argparse.Namespace):
+    _lookup.delay = args.tool_ms / 1000
+    calls = [{"tool_name": "lookup", "tool_kwargs": {"key": f"sku{k}"}} for k in range(args.tool_calls)]
+    llm = resources.llm("agent", tool_script=[calls, "all of them are in stock"])
+    workflow = FunctionCallingAgent(
+        llm=llm, tools=[FunctionTool.from_defaults(_lookup, name="lookup")], resources=resources, timeout=120
+    )
+    return workflow, lambda i: {"input": f"are sku0 to sku{args.tool_calls - 1} in stock? ({i})", "session_id": f"s{i}"}
+
+
+async def joke_scenario(resources: ResourceRegistry, args: argparse.Namespace):
+    return JokeFlow(resources=resources, timeout=120), lambda i: {"topic": f"topic {i}"}
+
+
+async def collect_scenario(resources: ResourceRegistry, args: argparse.Namespace):
+    return CollectExampleFlow(timeout=120), lambda i: {"input": f"input {i}", "query": f"query {i}"}
+
+
+async def loop_scenario(resources: ResourceRegistry, args: argparse.Namespace):
+    random.seed(0)
+    return LoopExampleFlow(timeout=120), lambda i: {"query": f"query {i}"}
+
+
+async def global_scenario(resources: ResourceRegistry, args: argparse.Namespace):
+    return GloabalExampleFlow(timeout=120), lambda i: {"query": f"query {i}"}
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "rag": rag_scenario,
+    "agent": agent_scenario,
+    "joke": joke_scenario,
+    "collect": collect_scenario,
+    "loop": loop_scenario,
+    "global": global_scenario,
+}
+
+
+# --- harness -----------------------------------------------------------------------
+
+
+async def _drive(workflow, run_kwargs, runs: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await workflow.run(**run_kwargs(i))
+                # a streamed answer only counts once its last token is in
+                if hasattr(result, "async_response_gen"):
+                    async for _ in result.async_response_gen():
+                        pass
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(runs)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def _step_stats(runs: List[RunTrace]) -> Dict[str, Dict[str, Any]]:
+    """Per step: wall time percentiles, mean queue wait and mean LLM usage per call of the step."""
+    by_step: Dict[str, list] = {}
+    for run in runs:
+        for step in run.steps:
+            by_step.setdefault(f"{run.workflow}.{step.name}", []).append(step)
+    stats = {}
+    for name, steps in sorted(by_step.items()):
+        mean = lambda attr: round(statistics.fmean(getattr(step, attr) for step in steps), 2)
+        stats[name] = _percentiles([step.duration for step in steps]) | {
+            "count": len(steps),
+            "queue_wait_mean_ms": round(statistics.fmean(step.queue_wait for step in steps) * 1000, 3),
+            "llm_calls": mean("llm_calls"),
+            "prompt_tokens": mean("prompt_tokens"),
+            "completion_tokens": mean("completion_tokens"),
+        }
+    return stats
+
+
+async def bench(name: str, args: argparse.Namespace, tracer: WorkflowTracer) -> Dict[str, Any]:
+    resources = ResourceRegistry(
+        llm_factory=mock_llm_factory(
+            latency_ms=args.latency_ms,
+            latency_distribution=args.distribution,
+            tokens_per_sec=args.tokens_per_sec,
+            output_tokens=args.output_tokens,
+        ),
+        embed_model_factory=mock_embedding_factory(latency_ms=args.embed_latency_ms),
+    )
+    async with resources:
+        workflow, run_kwargs = await SCENARIOS[name](resources, args)
+
+        await _drive(workflow, run_kwargs, min(args.warmup, args.runs), args.concurrency)
+        tracer.reset()
+        latencies, errors, wall = await _drive(workflow, run_kwargs, args.runs, args.concurrency)
+        runs = tracer.reset()
+        steps = _step_stats(runs)
+        if args.trace:
+            tracer.dump_json(os.path.join(args.trace, f"{name}.json"), runs)
+
+        tracemalloc.start()
+        await _drive(workflow, run_kwargs, min(args.memory_runs, args.runs), args.concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "runs": args.runs,
+        "concurrency": args.concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "runs_per_sec": round(len(latencies) / wall, 2) if wall else None,
+        "latency": _percentiles(latencies),
+        "steps": steps,
+        "peak_traced_mb": round(peak / 2**20, 2),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change per scenario, e.g. +0.12 = 12% more than the baseline."""
+    delta = lambda new, old: round(new / old - 1, 3) if new is not None and old else None
+    changes = {}
+    for name, result in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        changes[name] = {
+            "runs_per_sec": delta(result["runs_per_sec"], base["runs_per_sec"]),
+            **{
+                key: delta(result["latency"].get(key), base["latency"].get(key))
+                for key in ("p50_ms", "p95_ms", "p99_ms")
+            },
+            "peak_traced_mb": delta(result["peak_traced_mb"], base["peak_traced_mb"]),
+        }
+    return {"baseline_commit": baseline.get("commit"), "changes": changes}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--memory-runs", type=int, default=20, help="runs of the tracemalloc pass")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mock LLM median time to first token")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--output-tokens", type=int, default=32)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--rag-docs", type=int, default=20)
+    parser.add_argument("--tool-calls", type=int, default=4, help="parallel tool calls per agent turn")
+    parser.add_argument("--tool-ms", type=float, default=20.0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--trace", help="directory to write each scenario's step spans to, as JSON")
+    parser.add_argument("--compare", help="JSON report of an earlier run to diff against")
+    parser.add_argument("--verbose", action="store_true", help="keep the workflows' prints")
+    args = parser.parse_args()
+
+    tracer = WorkflowTracer(max_runs=args.runs).install()
+
+    report: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "args": vars(args),
+        "scenarios": {},
+    }
+    for name in args.only:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            report["scenarios"][name] = await bench(name, args, tracer)
+        print(f"{name}: {report['scenarios'][name]['latency']} "
+              f"{report['scenarios'][name]['runs_per_sec']} runs/s", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
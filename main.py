@@ -1,4 +1,5 @@
 from src.workflows.function_calling import FunctionCallingAgent
+from src.utils.resources import ResourceRegistry
 from llama_index.utils.workflow import (
     draw_all_possible_flows,
     draw_most_recent_execution,
@@ -10,7 +11,6 @@ import asyncio
 async def main():
     draw_all_possible_flows(FunctionCallingAgent, filename="FunctionCalling_all.html")
     from llama_index.core.tools import FunctionTool
-    from llama_index.llms.openai import OpenAI
 
 
     def add(x: int, y: int) -> int:
@@ -28,12 +28,19 @@ async def main():
         FunctionTool.from_defaults(multiply),
     ]
 
-    agent = FunctionCallingAgent(
-        llm=OpenAI(model="gpt-4o-mini"), tools=tools, timeout=120, verbose=True
-    )
-
-    ret = await agent.run(input="what is 4*8 ?")
-    print(ret['response'])
+    # one registry per process: LLM clients and connection pools are shared and closed at the end
+    async with ResourceRegistry() as resources:
+        agent = FunctionCallingAgent(
+            llm=resources.llm("gpt-4o-mini"),
+            tools=tools,
+            resources=resources,
+            cacheable_tools=["add", "multiply"],
+            timeout=120,
+            verbose=True,
+        )
+
+        ret = await agent.run(input="what is 4*8 ?")
+        print(ret['response'])
 
     draw_most_recent_execution(agent, filename="FunctionCalling_recent.html")
  
@@ -0,0 +1,111 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from llama_index.core.schema import NodeWithScore
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    source_nodes: List[NodeWithScore] = field(default_factory=list)
+    latency: float = 0.0
+    created: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query embedding: a lookup hits when the cosine similarity
+    to a stored query is at least `threshold` and the entry is younger than `ttl`
+    seconds. Holds at most `max_entries`, evicting the least recently used.
+    The cache is cleared when `check_version` sees a different index version.
+
+    `stats` reports hits, misses, hit rate and the seconds saved, the latter being
+    the end-to-end latency recorded for each answer when it was first produced.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600.0, max_entries: int = 1000) -> None:
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version: Optional[str] = None
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._entries: List[CachedAnswer] = []
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._entries = []
+
+    def check_version(self, version: str) -> None:
+        """Call with the current index version, answers from an older index are dropped."""
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _drop(self, keep: np.ndarray) -> None:
+        self._matrix = self._matrix[keep]
+        self._entries = [entry for entry, kept in zip(self._entries, keep) if kept]
+
+    def lookup(self, query_embedding) -> Optional[CachedAnswer]:
+        now = time.monotonic()
+        if self._entries:
+            fresh = np.array([now - entry.created < self.ttl for entry in self._entries], dtype=bool)
+            if not fresh.all():
+                self._drop(fresh)
+
+        if self._entries:
+            scores = self._matrix @ self._normalize(query_embedding)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                entry = self._entries[best]
+                entry.last_used = now
+                self.hits += 1
+                self.latency_saved += entry.latency
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        query: str,
+        query_embedding,
+        answer: str,
+        source_nodes: List[NodeWithScore] | None = None,
+        latency: float = 0.0,
+    ) -> None:
+        vector = self._normalize(query_embedding)
+        if len(self._entries) >= self.max_entries:
+            keep = np.ones(len(self._entries), dtype=bool)
+            keep[int(np.argmin([entry.last_used for entry in self._entries]))] = False
+            self._drop(keep)
+        self._matrix = vector[None, :] if not self._entries else np.vstack([self._matrix, vector])
+        self._entries.append(
+            CachedAnswer(query=query, answer=answer, source_nodes=list(source_nodes or []), latency=latency)
+        )
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved_s": round(self.latency_saved, 3),
+        }
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+
+class EmbeddingCache:
+    """
+    Two tier embedding cache keyed by (model name, text hash):
+    - an in-memory LRU of `max_memory_items` vectors
+    - an optional SQLite file (`path`) so embeddings survive restarts, opened (and its
+      directory created) on first use and released by `close`
+    Vectors are stored as float32 blobs. Safe to share between threads.
+    """
+
+    def __init__(self, path: str | None = None, max_memory_items: int = 10_000) -> None:
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory: OrderedDict[str, List[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """The SQLite tier, opened on first use; call with the lock held."""
+        if self._db is None and self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self._db.commit()
+        return self._db
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return model_name + ":" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[List[float]]]:
+        keys = [self.make_key(model_name, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            self.memory_hits += len(found)
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            db = self._connection() if missing else None
+            if db is not None:
+                placeholders = ",".join("?" * len(missing))
+                rows = db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    missing,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.disk_hits += len(rows)
+
+            result = [found.get(key) for key in keys]
+            self.misses += sum(vector is None for vector in result)
+        return result
+
+    def put_many(self, model_name: str, texts: List[str], vectors: List[List[float]]) -> None:
+        items = [
+            (self.make_key(model_name, text), vector) for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            db = self._connection()
+            if db is not None:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items],
+                )
+                db.commit()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps any embedding model and answers from an EmbeddingCache first.
+    Query and document embeddings are cached under separate namespaces since
+    some models embed them differently.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(
+        self, embed_model: BaseEmbedding, cache: EmbeddingCache | None = None, **kwargs: Any
+    ) -> None:
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._cache = cache or EmbeddingCache()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        return self._embed_model
+
+    def _split(self, namespace: str, texts: List[str]):
+        cached = self._cache.get_many(namespace, texts)
+        missing = [text for text, vector in zip(texts, cached) if vector is None]
+        # identical texts inside one batch are embedded once
+        return cached, list(dict.fromkeys(missing))
+
+    @staticmethod
+    def _merge(texts, cached, missing, vectors) -> List[Embedding]:
+        fresh = dict(zip(missing, vectors))
+        return [vector if vector is not None else fresh[text] for text, vector in zip(texts, cached)]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        namespace = self.model_name + "/query"
+        (vector,), missing = self._split(namespace, [query])
+        if vector is None:
+            vector = self._embed_model.get_query_embedding(query)
+            self._cache.put_many(namespace, [query], [vector])
+        return vector
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        namespace = self.model_name + "/query"
+        (vector,), missing = self._split(namespace, [query])
+        if vector is None:
+            vector = await self._embed_model.aget_query_embedding(query)
+            self._cache.put_many(namespace, [query], [vector])
+        return vector
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        cached, missing = self._split(self.model_name, texts)
+        vectors = self._embed_model.get_text_embedding_batch(missing) if missing else []
+        self._cache.put_many(self.model_name, missing, vectors)
+        return self._merge(texts, cached, missing, vectors)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        cached, missing = self._split(self.model_name, texts)
+        vectors = await self._embed_model.aget_text_embedding_batch(missing) if missing else []
+        self._cache.put_many(self.model_name, missing, vectors)
+        return self._merge(texts, cached, missing, vectors)
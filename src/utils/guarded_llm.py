@@ -0,0 +1,272 @@
+"""
+One limit on concurrent LLM calls for everything sharing a ResourceRegistry, however
+many workflows run at once:
+
+    guard = LLMGuard(max_concurrency=16)
+    resources = ResourceRegistry(llm_factory=guard.factory(openai_llm_factory))
+
+Every LLM the registry creates is wrapped in a GuardedLLM, which holds one of the
+guard's slots for the duration of each async call (for streams: until the stream is
+exhausted or closed). Sync calls pass through unguarded, the workflows only use async.
+With a `rate_limiter` (src/utils/rate_limit.py) each call also waits for its request
+and estimated tokens, and throttled calls are retried.
+"""
+import asyncio
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.bridge.pydantic import PrivateAttr, SerializeAsAny
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import LLM, ToolSelection
+
+from src.utils.packing import count_tokens
+from src.utils.rate_limit import RateLimiter
+from src.utils.tracing import llm_usage
+
+
+class LLMGuard:
+    """
+    A shared semaphore for LLM calls, with counters for the pool's stats, and optionally
+    a RateLimiter. `completion_tokens` is the output estimate for the tokens bucket when
+    a call sets no max_tokens.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        rate_limiter: Optional[RateLimiter] = None,
+        completion_tokens: int = 256,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.completion_tokens = completion_tokens
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_seconds += time.perf_counter() - started
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def call(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        tokens: int = 0,
+        usage: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """`await call()` in a slot, through the rate limiter if there is one."""
+
+        async def attempt() -> Any:
+            async with self.slot():
+                return await call()
+
+        if self.rate_limiter is None:
+            return await attempt()
+        return await self.rate_limiter.run(attempt, tokens=tokens, usage=usage)
+
+    def wrap(self, llm: LLM) -> "GuardedLLM":
+        return GuardedLLM.wrap(llm, self)
+
+    def factory(self, llm_factory: Callable[..., LLM]) -> Callable[..., LLM]:
+        """`llm_factory` for ResourceRegistry, with every LLM it makes behind this guard."""
+
+        def guarded_factory(registry: Any, model: Optional[str], **kwargs: Any) -> LLM:
+            return self.wrap(llm_factory(registry, model, **kwargs))
+
+        return guarded_factory
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "wait_mean_s": round(self.wait_seconds / self.calls, 6) if self.calls else 0.0,
+        }
+        if self.rate_limiter is not None:
+            stats["rate_limit"] = self.rate_limiter.stats
+        return stats
+
+
+def unwrap_llm(llm: LLM) -> LLM:
+    """The LLM behind any wrapper layers (GuardedLLM, ...), for checks on the concrete class."""
+    while isinstance(llm, DelegatingLLM):
+        llm = llm.llm
+    return llm
+
+
+class DelegatingLLM(FunctionCallingLLM):
+    """
+    Passes every call through to `llm`, the base for wrappers that change a few of them.
+    Tool calling is delegated too, so it works wherever `llm` is a FunctionCallingLLM.
+    """
+
+    llm: SerializeAsAny[LLM]
+
+    @classmethod
+    def _wrapping(cls, llm: LLM) -> "DelegatingLLM":
+        return cls(
+            llm=llm,
+            callback_manager=llm.callback_manager,
+            system_prompt=llm.system_prompt,
+            messages_to_prompt=llm.messages_to_prompt,
+            completion_to_prompt=llm.completion_to_prompt,
+            pydantic_program_mode=llm.pydantic_program_mode,
+            query_wrapper_prompt=llm.query_wrapper_prompt,
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "DelegatingLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.llm.metadata
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self.llm.chat(messages, **kwargs)
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self.llm.complete(prompt, formatted=formatted, **kwargs)
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        return self.llm.stream_chat(messages, **kwargs)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        return self.llm.stream_complete(prompt, formatted=formatted, **kwargs)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self.llm.achat(messages, **kwargs)
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        return await self.llm.astream_chat(messages, **kwargs)
+
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        return await self.llm.astream_complete(prompt, formatted=formatted, **kwargs)
+
+    def _prepare_chat_with_tools(self, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        return self.llm._prepare_chat_with_tools(*args, **kwargs)
+
+    def _validate_chat_with_tools_response(self, *args: Any, **kwargs: Any) -> ChatResponse:
+        return self.llm._validate_chat_with_tools_response(*args, **kwargs)
+
+    def get_tool_calls_from_response(self, *args: Any, **kwargs: Any) -> List[ToolSelection]:
+        return self.llm.get_tool_calls_from_response(*args, **kwargs)
+
+
+class GuardedLLM(DelegatingLLM):
+    """Delegates to `llm`, each async call inside one of the guard's slots."""
+
+    _guard: LLMGuard = PrivateAttr()
+
+    @classmethod
+    def wrap(cls, llm: LLM, guard: LLMGuard) -> "GuardedLLM":
+        guarded = cls._wrapping(llm)
+        guarded._guard = guard
+        return guarded
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "GuardedLLM"
+
+    @property
+    def guard(self) -> LLMGuard:
+        return self._guard
+
+    def _estimate(self, prompt: str, kwargs: Dict[str, Any]) -> int:
+        completion = kwargs.get("max_tokens") or getattr(self.llm, "max_tokens", None)
+        return count_tokens(prompt) + (completion or self._guard.completion_tokens)
+
+    @staticmethod
+    def _chat_prompt(messages: Sequence[ChatMessage]) -> str:
+        return "\n".join(str(message.content or "") for message in messages)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        prompt = self._chat_prompt(messages)
+        return await self._guard.call(
+            lambda: self.llm.achat(messages, **kwargs),
+            tokens=self._estimate(prompt, kwargs),
+            usage=lambda response: sum(llm_usage(response, prompt, str(response.message.content or ""))),
+        )
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self._guard.call(
+            lambda: self.llm.acomplete(prompt, formatted=formatted, **kwargs),
+            tokens=self._estimate(prompt, kwargs),
+            usage=lambda response: sum(llm_usage(response, prompt, response.text)),
+        )
+
+    async def _guarded_stream(self, start: Callable[[], Awaitable[Any]], tokens: int) -> AsyncIterator[Any]:
+        async def open_stream() -> Tuple[Any, Any]:
+            # a throttled stream fails on its first chunk, so that is what gets retried
+            stream = await start()
+            async for first in stream:
+                return stream, first
+            return stream, None
+
+        async def attempt() -> Tuple[AsyncExitStack, Any, Any]:
+            # a slot per attempt like `LLMGuard.call`, so backoffs between retries hold none
+            async with AsyncExitStack() as stack:
+                await stack.enter_async_context(self._guard.slot())
+                stream, first = await open_stream()
+                return stack.pop_all(), stream, first
+
+        # the guard slot and the limiter's concurrency slot are held until the stream ends
+        limiter = self._guard.rate_limiter
+        if limiter is None:
+            held, stream, first = await attempt()
+        else:
+            held, stream, first = await limiter.run(attempt, tokens=tokens, hold=True)
+            held.push_async_callback(limiter.release)
+        async with held:
+            if first is None:
+                return
+            yield first
+            async for item in stream:
+                yield item
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        return self._guarded_stream(
+            lambda: self.llm.astream_chat(messages, **kwargs),
+            tokens=self._estimate(self._chat_prompt(messages), kwargs),
+        )
+
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        return self._guarded_stream(
+            lambda: self.llm.astream_complete(prompt, formatted=formatted, **kwargs),
+            tokens=self._estimate(prompt, kwargs),
+        )
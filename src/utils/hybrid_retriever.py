@@ -0,0 +1,92 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from src.utils.numpy_vector_store import NumpyVectorStore
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[NodeWithScore]], k: int = 60
+) -> List[NodeWithScore]:
+    """score(node) = sum over rankings of 1 / (k + rank), ranks start at 1."""
+    scores: Dict[str, float] = {}
+    nodes: Dict[str, NodeWithScore] = {}
+    for ranking in rankings:
+        for rank, node in enumerate(ranking, start=1):
+            node_id = node.node.node_id
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+            nodes.setdefault(node_id, node)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [NodeWithScore(node=nodes[node_id].node, score=scores[node_id]) for node_id in ordered]
+
+
+class FusedNodeWithScore(NodeWithScore):
+    """`score` is the fused RRF score, `dense_score` the retrieval cosine (None: not a dense hit)."""
+
+    dense_score: Optional[float] = Field(default=None)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Runs dense retrieval and a BM25 lookup in the vector store's InvertedIndex
+    side by side, then fuses both rankings with reciprocal rank fusion.
+    Each path fetches `candidate_k` nodes, `similarity_top_k` fused nodes are returned,
+    as FusedNodeWithScore so rerankers can still see the dense cosine. When the query
+    bundle carries its embedding, hits found only by BM25 get theirs from the store's matrix.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        vector_store: NumpyVectorStore,
+        similarity_top_k: int = 2,
+        candidate_k: int | None = None,
+        rrf_k: int = 60,
+    ) -> None:
+        super().__init__()
+        self._vector_retriever = vector_retriever
+        self._vector_store = vector_store
+        self._similarity_top_k = similarity_top_k
+        self._candidate_k = candidate_k or max(10, 2 * similarity_top_k)
+        self._rrf_k = rrf_k
+
+    def _lexical(self, query_str: str) -> Tuple[List[NodeWithScore], Dict[str, int]]:
+        """BM25 hits, and the store row of each hit by node id."""
+        rows, scores = self._vector_store.lexical_index.search(query_str, self._candidate_k)
+        nodes = self._vector_store.nodes
+        hits = [NodeWithScore(node=nodes[row], score=float(score)) for row, score in zip(rows, scores)]
+        return hits, {nodes[row].node_id: int(row) for row in rows}
+
+    def _fuse(
+        self,
+        dense: List[NodeWithScore],
+        lexical: List[NodeWithScore],
+        rows: Dict[str, int],
+        query_bundle: QueryBundle,
+    ) -> List[FusedNodeWithScore]:
+        fused = reciprocal_rank_fusion([dense, lexical], k=self._rrf_k)[: self._similarity_top_k]
+        cosine = {node.node.node_id: node.score for node in dense}
+        if query_bundle.embedding is not None:
+            # lexical-only hits: their cosine is one dot product against the stored row away
+            missing = [node.node.node_id for node in fused if node.node.node_id not in cosine]
+            if missing:
+                scores = self._vector_store.similarities(query_bundle.embedding, [rows[i] for i in missing])
+                cosine.update(zip(missing, (float(score) for score in scores)))
+        return [
+            FusedNodeWithScore(node=node.node, score=node.score, dense_score=cosine.get(node.node.node_id))
+            for node in fused
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense = self._vector_retriever.retrieve(query_bundle)
+        return self._fuse(dense, *self._lexical(query_bundle.query_str), query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense, (lexical, rows) = await asyncio.gather(
+            self._vector_retriever.aretrieve(query_bundle),
+            asyncio.to_thread(self._lexical, query_bundle.query_str),
+        )
+        return self._fuse(dense, lexical, rows, query_bundle)
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from llama_index.core import SimpleDirectoryReader, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+
+from src.utils.ingestion import EmbeddingPipeline, iter_documents
+from src.utils.inverted_index import InvertedIndex
+from src.utils.numpy_vector_store import NumpyVectorStore
+
+
+EMBEDDINGS_FILE = "embeddings.npy"
+NODES_FILE = "nodes.jsonl"
+META_FILE = "meta.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def file_fingerprint(path: str) -> Dict:
+    """mtime/size are checked first, the content hash only decides when they changed."""
+    stat = os.stat(path)
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha.hexdigest()}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _reserve(matrix: np.ndarray | None, size: int, needed: int, dim: int, hint: int = 0) -> np.ndarray:
+    """`matrix` with room for `needed` rows and its first `size` rows kept, grown geometrically."""
+    capacity = len(matrix) if matrix is not None else 0
+    if needed <= capacity:
+        return matrix
+    grown = np.empty((max(needed, 2 * capacity, hint), dim), dtype=np.float32)
+    if size:
+        grown[:size] = matrix[:size]
+    return grown
+
+
+class LocalIndexStore:
+    """
+    On-disk store for an embedded corpus:
+    - embeddings.npy: float32 matrix (one row per node), loaded memory-mapped
+    - nodes.jsonl: node text + metadata, one node per line, same order as the rows
+    - meta.json: embedding model name and dimension, used to detect stale stores
+    - manifest.json: fingerprint of every ingested file, used for incremental updates
+    - postings.npz + vocab.json: BM25 inverted index over the same nodes, for hybrid retrieval
+    """
+
+    def __init__(
+        self,
+        nodes: Sequence[BaseNode] | None = None,
+        embeddings: np.ndarray | None = None,
+        model_name: str | None = None,
+        files: Dict[str, Dict] | None = None,
+        lexical_index: InvertedIndex | None = None,
+    ) -> None:
+        self.nodes = list(nodes or [])
+        if embeddings is None:
+            embeddings = np.zeros((len(self.nodes), 0), dtype=np.float32)
+        assert len(embeddings) == len(self.nodes), "one embedding row per node"
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.files = dict(files or {})
+        self.lexical_index = lexical_index
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the ingested content does."""
+        sha = hashlib.sha256(str(self.model_name).encode("utf-8"))
+        for path in sorted(self.files):
+            sha.update(f"{path}:{self.files[path]['sha256']}".encode("utf-8"))
+        sha.update(str(len(self.nodes)).encode("utf-8"))
+        return sha.hexdigest()
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(persist_dir, name))
+            for name in (EMBEDDINGS_FILE, NODES_FILE, META_FILE)
+        )
+
+    async def aupdate(
+        self,
+        dirname: str,
+        embed_model: BaseEmbedding,
+        node_parser: NodeParser | None = None,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+    ) -> Dict[str, Any]:
+        """
+        Bring the store in line with `dirname`:
+        - unchanged files (same mtime/size) are skipped entirely; touched files with the
+          same content hash only get their fingerprint refreshed (counted as `refreshed`,
+          the store then needs persisting for the next run to skip the hash)
+        - new and modified files go through the EmbeddingPipeline, only chunks whose text
+          is not already stored for that file are sent to the embedding model
+        - nodes of files that no longer exist are dropped
+        Returns counts of what happened, handy for logging.
+        """
+        if self.model_name not in (None, embed_model.model_name):
+            raise ValueError(
+                f"store was embedded with {self.model_name}, not {embed_model.model_name}"
+            )
+
+        stats = {"unchanged": 0, "refreshed": 0, "changed": 0, "removed": 0, "embedded": 0, "reused": 0}
+
+        current_files = [str(path) for path in SimpleDirectoryReader(dirname).input_files]
+
+        changed: Dict[str, Dict] = {}
+        for path in current_files:
+            known = self.files.get(path)
+            stat = os.stat(path)
+            if known and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+                stats["unchanged"] += 1
+                continue
+            fingerprint = file_fingerprint(path)
+            if known and known["sha256"] == fingerprint["sha256"]:
+                # touched but identical, just refresh the fingerprint
+                self.files[path] = fingerprint
+                stats["refreshed"] += 1
+                continue
+            changed[path] = fingerprint
+
+        removed = set(self.files) - set(current_files)
+        stats["changed"] = len(changed)
+        stats["removed"] = len(removed)
+        if not changed and not removed:
+            if self.lexical_index is None or len(self.lexical_index) != len(self.nodes):
+                self.lexical_index = InvertedIndex.build(self.nodes)
+            return stats
+
+        # old rows of changed files can be reused when their chunk text did not move
+        reusable: Dict[str, np.ndarray] = {}
+        keep_nodes, keep_rows = [], []
+        for i, node in enumerate(self.nodes):
+            path = node.metadata.get("file_path")
+            if path in changed:
+                reusable[text_hash(node.get_content(metadata_mode=MetadataMode.EMBED))] = self.embeddings[i]
+            elif path not in removed:
+                keep_nodes.append(node)
+                keep_rows.append(i)
+
+        # rows go straight into the new matrix as batches arrive: kept rows first, copied from
+        # the old (possibly memory-mapped) matrix, then each batch, no list of row arrays
+        dim = self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+        # changed files usually come back with about as many chunks as they had
+        expected = len(keep_rows) + len(reusable) + batch_size
+        embeddings = _reserve(None, 0, len(keep_rows), dim, expected) if dim else None
+        size = len(keep_rows)
+        if keep_rows:
+            np.take(self.embeddings, keep_rows, axis=0, out=embeddings[:size])
+
+        new_nodes: List[BaseNode] = []
+        if changed:
+            pipeline = EmbeddingPipeline(
+                embed_model,
+                node_parser=node_parser,
+                batch_size=batch_size,
+                max_concurrency=max_concurrency,
+            )
+            # files are read one by one and indexed batch by batch as the pipeline yields
+            batches = pipeline.stream(
+                iter_documents(list(changed)), lookup=lambda text: reusable.get(text_hash(text))
+            )
+            async for batch_nodes, batch_rows in batches:
+                if not batch_rows:
+                    continue
+                dim = dim or len(batch_rows[0])
+                embeddings = _reserve(embeddings, size, size + len(batch_rows), dim, expected)
+                embeddings[size : size + len(batch_rows)] = batch_rows
+                size += len(batch_rows)
+                new_nodes.extend(batch_nodes)
+            stats["embedded"] = pipeline.stats.embedded
+            stats["reused"] = pipeline.stats.reused
+            stats["pipeline"] = pipeline.stats.as_dict()
+
+        if embeddings is None:
+            embeddings = np.zeros((0, dim), dtype=np.float32)
+        elif len(embeddings) > size:
+            # hand the spare capacity back, nothing else refers to this buffer
+            embeddings.resize((size, dim), refcheck=False)
+        del keep_rows, reusable
+        self.nodes = keep_nodes + new_nodes
+        self.embeddings = embeddings
+        self.model_name = embed_model.model_name
+        for path in removed:
+            del self.files[path]
+        self.files.update(changed)
+        # rebuilding postings is cheap next to embedding, keeps doc ids equal to row positions
+        self.lexical_index = InvertedIndex.build(self.nodes)
+
+        return stats
+
+    def persist(self, persist_dir: str) -> None:
+        """Write the store, each file is swapped in atomically so readers never see half a store."""
+        os.makedirs(persist_dir, exist_ok=True)
+
+        embeddings_path = os.path.join(persist_dir, EMBEDDINGS_FILE)
+        with open(embeddings_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        os.replace(embeddings_path + ".tmp", embeddings_path)
+
+        nodes_path = os.path.join(persist_dir, NODES_FILE)
+        with open(nodes_path + ".tmp", "w", encoding="utf-8") as f:
+            for node in self.nodes:
+                # the vector lives in embeddings.npy, don't store it twice
+                f.write(json.dumps(doc_to_json(node.model_copy(update={"embedding": None}))))
+                f.write("\n")
+        os.replace(nodes_path + ".tmp", nodes_path)
+
+        meta_path = os.path.join(persist_dir, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "model_name": self.model_name,
+                    "dim": int(self.embeddings.shape[1]) if self.embeddings.ndim == 2 else 0,
+                    "count": len(self.nodes),
+                },
+                f,
+            )
+        os.replace(meta_path + ".tmp", meta_path)
+
+        manifest_path = os.path.join(persist_dir, MANIFEST_FILE)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.files, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        if self.lexical_index is not None:
+            self.lexical_index.persist(persist_dir)
+
+    @classmethod
+    def load(cls, persist_dir: str, mmap: bool = True) -> "LocalIndexStore":
+        """Load a persisted store; with `mmap` the embedding matrix is paged in lazily by the OS."""
+        with open(os.path.join(persist_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        embeddings = np.load(
+            os.path.join(persist_dir, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None
+        )
+
+        nodes: List[BaseNode] = []
+        with open(os.path.join(persist_dir, NODES_FILE), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    nodes.append(json_to_doc(json.loads(line)))
+
+        files = {}
+        manifest_path = os.path.join(persist_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                files = json.load(f)
+
+        lexical_index = None
+        if InvertedIndex.exists(persist_dir):
+            lexical_index = InvertedIndex.load(persist_dir)
+            if len(lexical_index) != len(nodes):
+                lexical_index = None
+        if lexical_index is None:
+            lexical_index = InvertedIndex.build(nodes)
+
+        return cls(
+            nodes=nodes,
+            embeddings=embeddings,
+            model_name=meta.get("model_name"),
+            files=files,
+            lexical_index=lexical_index,
+        )
+
+    def to_index(self, embed_model: BaseEmbedding, **vector_store_kwargs: Any) -> VectorStoreIndex:
+        """
+        Build a VectorStoreIndex over a NumpyVectorStore that searches the stored
+        matrix directly (memory-mapped after `load`), nothing is re-embedded or copied
+        into Python lists. `vector_store_kwargs` go to NumpyVectorStore, e.g. `approximate=True`.
+        """
+        vector_store = NumpyVectorStore.from_arrays(
+            self.nodes, self.embeddings, version=self.version, **vector_store_kwargs
+        )
+        if self.lexical_index is not None:
+            vector_store.set_lexical_index(self.lexical_index)
+        return VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
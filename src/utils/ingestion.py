@@ -0,0 +1,219 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.node_parser import NodeParser, SentenceSplitter
+from llama_index.core.schema import BaseNode, Document, MetadataMode
+
+
+def iter_documents(input_files: List[str]) -> Iterator[Document]:
+    """Read files lazily, only one file's documents are alive at a time."""
+    for documents in SimpleDirectoryReader(input_files=input_files).iter_data():
+        yield from documents
+
+
+@dataclass
+class PipelineStats:
+    documents: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    reused: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "reused": self.reused,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "docs_per_sec": round(self.docs_per_sec, 1),
+            "chunks_per_sec": round(self.chunks_per_sec, 1),
+        }
+
+
+@dataclass
+class _Batch:
+    seq: int
+    nodes: List[BaseNode]
+    vectors: List[Optional[np.ndarray]]
+    texts: List[str] = field(default_factory=list)
+    positions: List[int] = field(default_factory=list)
+
+
+_DONE = object()
+
+
+class EmbeddingPipeline:
+    """
+    Streams documents -> chunks -> embedding batches.
+
+    - documents are pulled from the iterable one at a time and chunked off the event loop,
+      so a generator such as `iter_documents` is never materialized
+    - chunks are grouped into batches of `batch_size` texts that actually need embedding,
+      a batch is also cut at `max_batch_nodes` chunks so runs of reused chunks stay bounded
+    - at most `max_concurrency` batches are in flight against the embedding model
+    - the queue between chunking and embedding holds `max_pending_batches`, and at most
+      `max_pending_batches + max_concurrency` batches exist between the reader and the
+      consumer (queued, embedding, or done but waiting for an earlier one), so a fast
+      reader waits for the embedder and the consumer instead of piling chunks up in memory
+    - `lookup(text)` may return an existing vector for a chunk, which is then not re-embedded
+
+    Any BaseEmbedding works, e.g. llama_index's MockEmbedding for local runs.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        node_parser: NodeParser | None = None,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_pending_batches: int | None = None,
+        max_batch_nodes: int | None = None,
+    ) -> None:
+        self.embed_model = embed_model
+        self.node_parser = node_parser or SentenceSplitter()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_pending_batches = max_pending_batches or 2 * max_concurrency
+        self.max_batch_nodes = max_batch_nodes or 4 * batch_size
+        self.stats = PipelineStats()
+
+    async def run(
+        self,
+        documents: Iterable[Document],
+        lookup: Callable[[str], Optional[np.ndarray]] | None = None,
+    ) -> Tuple[List[BaseNode], List[np.ndarray]]:
+        """Returns nodes and their vectors, in document order."""
+        nodes: List[BaseNode] = []
+        vectors: List[np.ndarray] = []
+        async for batch_nodes, batch_vectors in self.stream(documents, lookup=lookup):
+            nodes.extend(batch_nodes)
+            vectors.extend(batch_vectors)
+        return nodes, vectors
+
+    async def stream(
+        self,
+        documents: Iterable[Document],
+        lookup: Callable[[str], Optional[np.ndarray]] | None = None,
+    ) -> AsyncGenerator[Tuple[List[BaseNode], List[np.ndarray]], None]:
+        """
+        Yields (nodes, vectors) per batch, in document order, as soon as each batch is
+        embedded. Together with the bounded queue this keeps memory proportional to
+        the batches in flight rather than to the corpus.
+        """
+        self.stats = PipelineStats()
+        started = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending_batches)
+        finished: asyncio.Queue = asyncio.Queue()
+        # taken per batch by the reader, given back once the batch is yielded, so one slow
+        # batch cannot let the reorder buffer below grow without limit
+        window = asyncio.Semaphore(self.max_pending_batches + self.max_concurrency)
+
+        producer = asyncio.create_task(self._produce(documents, queue, window, lookup))
+        workers = [
+            asyncio.create_task(self._embed_worker(queue, finished))
+            for _ in range(self.max_concurrency)
+        ]
+
+        async def _close() -> None:
+            try:
+                await producer
+                for _ in workers:
+                    await queue.put(_DONE)
+                await asyncio.gather(*workers)
+            finally:
+                await finished.put(_DONE)
+
+        closer = asyncio.create_task(_close())
+
+        # batches finish out of order, hold early ones until their turn comes
+        pending: Dict[int, _Batch] = {}
+        next_seq = 0
+        try:
+            while True:
+                batch = await finished.get()
+                if batch is _DONE:
+                    break
+                if isinstance(batch, BaseException):
+                    raise batch
+                pending[batch.seq] = batch
+                while next_seq in pending:
+                    ready = pending.pop(next_seq)
+                    next_seq += 1
+                    window.release()
+                    yield ready.nodes, ready.vectors
+            # surface errors from the reader or the embedding model
+            await closer
+        finally:
+            for task in (producer, closer, *workers):
+                task.cancel()
+            self.stats.seconds = time.perf_counter() - started
+
+    async def _produce(self, documents, queue: asyncio.Queue, window: asyncio.Semaphore, lookup) -> None:
+        doc_iter = iter(documents)
+        seq = 0
+        batch = _Batch(seq=seq, nodes=[], vectors=[])
+
+        while True:
+            # reading and chunking are sync, keep them off the loop so embeds keep flowing
+            doc = await asyncio.to_thread(next, doc_iter, None)
+            if doc is None:
+                break
+            self.stats.documents += 1
+            chunks = await asyncio.to_thread(self.node_parser.get_nodes_from_documents, [doc])
+
+            for node in chunks:
+                self.stats.chunks += 1
+                text = node.get_content(metadata_mode=MetadataMode.EMBED)
+                vector = lookup(text) if lookup else None
+                batch.nodes.append(node)
+                batch.vectors.append(vector)
+                if vector is None:
+                    batch.texts.append(text)
+                    batch.positions.append(len(batch.nodes) - 1)
+                else:
+                    self.stats.reused += 1
+
+                if len(batch.texts) >= self.batch_size or len(batch.nodes) >= self.max_batch_nodes:
+                    await window.acquire()
+                    await queue.put(batch)
+                    seq += 1
+                    batch = _Batch(seq=seq, nodes=[], vectors=[])
+
+        if batch.nodes:
+            await window.acquire()
+            await queue.put(batch)
+
+    async def _embed_worker(self, queue: asyncio.Queue, finished: asyncio.Queue) -> None:
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                return
+            if batch.texts:
+                try:
+                    embeddings = await self.embed_model.aget_text_embedding_batch(batch.texts)
+                except Exception as e:
+                    # hand the error to the consumer, which tears the pipeline down
+                    await finished.put(e)
+                    return
+                for position, embedding in zip(batch.positions, embeddings):
+                    batch.vectors[position] = np.asarray(embedding, dtype=np.float32)
+                self.stats.embedded += len(batch.texts)
+                self.stats.batches += 1
+            await finished.put(batch)
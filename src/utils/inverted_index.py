@@ -0,0 +1,139 @@
+import json
+import os
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+from llama_index.core.schema import BaseNode, MetadataMode
+
+from src.utils.text import tokenize
+
+
+POSTINGS_FILE = "postings.npz"
+VOCAB_FILE = "vocab.json"
+
+
+class InvertedIndex:
+    """
+    BM25 inverted index in CSR layout: postings of term `t` are
+    doc_ids[offsets[t]:offsets[t + 1]] with matching term frequencies in tfs.
+    Doc ids are row positions, the same as in LocalIndexStore / NumpyVectorStore.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> None:
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        n_docs = len(doc_lengths)
+        df = np.diff(offsets)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_lengths.mean()) if n_docs else 1.0
+        self._norm = (k1 * (1 - b + b * doc_lengths / max(avgdl, 1.0))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, nodes: Sequence[BaseNode]) -> "InvertedIndex":
+        vocab: Dict[str, int] = {}
+        postings: list = []
+        doc_lengths = np.zeros(len(nodes), dtype=np.float32)
+
+        for doc_id, node in enumerate(nodes):
+            tokens = tokenize(node.get_content(metadata_mode=MetadataMode.NONE))
+            doc_lengths[doc_id] = len(tokens)
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                term_id = vocab.setdefault(token, len(vocab))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            postings.extend((term_id, doc_id, tf) for term_id, tf in counts.items())
+
+        if postings:
+            triples = np.array(postings, dtype=np.int64)
+            # sort by term, then doc, so each term's postings are one contiguous slice
+            triples = triples[np.lexsort((triples[:, 1], triples[:, 0]))]
+            term_ids, doc_ids, tfs = triples[:, 0], triples[:, 1], triples[:, 2]
+        else:
+            term_ids = doc_ids = tfs = np.zeros(0, dtype=np.int64)
+
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.add.at(offsets, term_ids + 1, 1)
+        offsets = np.cumsum(offsets)
+
+        return cls(
+            vocab=vocab,
+            offsets=offsets,
+            doc_ids=doc_ids.astype(np.int32),
+            tfs=np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+            doc_lengths=doc_lengths,
+        )
+
+    def search(self, query: str, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (doc ids, bm25 scores) of the best `top_k` docs, best first."""
+        term_ids = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if not term_ids or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            # each doc appears once per term, so plain fancy-index add is safe
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return hits, scores[hits]
+
+    def persist(self, persist_dir: str) -> None:
+        os.makedirs(persist_dir, exist_ok=True)
+        postings_path = os.path.join(persist_dir, POSTINGS_FILE)
+        with open(postings_path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                tfs=self.tfs,
+                doc_lengths=self.doc_lengths,
+            )
+        os.replace(postings_path + ".tmp", postings_path)
+
+        vocab_path = os.path.join(persist_dir, VOCAB_FILE)
+        with open(vocab_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f)
+        os.replace(vocab_path + ".tmp", vocab_path)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, POSTINGS_FILE)) and os.path.exists(
+            os.path.join(persist_dir, VOCAB_FILE)
+        )
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "InvertedIndex":
+        with open(os.path.join(persist_dir, VOCAB_FILE), encoding="utf-8") as f:
+            vocab = json.load(f)
+        with np.load(os.path.join(persist_dir, POSTINGS_FILE)) as data:
+            return cls(
+                vocab=vocab,
+                offsets=data["offsets"],
+                doc_ids=data["doc_ids"],
+                tfs=data["tfs"],
+                doc_lengths=data["doc_lengths"],
+            )
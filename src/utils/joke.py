@@ -1,4 +1,23 @@
+from typing import Optional
+
 from llama_index.core.workflow import Event
 
+class TopicEvent(Event):
+    topic: str
+    index: int = 0
+
 class JokeEvent(Event):
-    joke: str
\ No newline at end of file
+    joke: str
+    topic: str = ""
+    index: int = 0
+
+class CritiqueEvent(Event):
+    """one finished item of a batch run, also written to the event stream"""
+    index: int
+    topic: str
+    joke: Optional[str] = None
+    critique: Optional[str] = None
+    error: Optional[str] = None
+
+class AdmitEvent(Event):
+    """a batch item was collected, room for the next topic"""
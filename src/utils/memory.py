@@ -0,0 +1,147 @@
+from typing import Any, List, Optional, Tuple
+
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.llm import LLM
+from llama_index.core.memory import ChatMemoryBuffer
+
+from src.utils.packing import count_tokens
+
+
+# what the "[truncated, ...]" note added by truncate_text costs, roughly
+TRUNCATION_NOTE_TOKENS = count_tokens("\n... [truncated, 10000 of 10000 tokens omitted]")
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens` tokens, saying how much was left out."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = int(len(text) * max_tokens / tokens)
+    return text[:keep] + f"\n... [truncated, {tokens - max_tokens} of {tokens} tokens omitted]"
+
+
+def message_tokens(message: ChatMessage) -> int:
+    tokens = count_tokens(str(message.content or ""))
+    tool_calls = message.additional_kwargs.get("tool_calls")
+    if tool_calls:
+        tokens += count_tokens(str(tool_calls))
+    return tokens
+
+
+class CompactingMemory(ChatMemoryBuffer):
+    """
+    ChatMemoryBuffer that keeps prompts small in tool-heavy conversations:
+    - tool outputs over `max_tool_output_tokens` are truncated when stored
+      (the agent keeps the full ToolOutput in its sources)
+    - the last `keep_recent_turns` user turns are sent verbatim, tool outputs of older
+      turns are cut to `old_tool_output_tokens`
+    - if the history is still over `token_limit`, the oldest whole turns are dropped,
+      so a tool message is never separated from the assistant call that asked for it
+    - if the last turn alone is still over, its tool outputs share what is left of the limit
+
+    `last_prompt_tokens` is the size of the history returned by the last `get()`.
+    """
+
+    keep_recent_turns: int = Field(default=2)
+    max_tool_output_tokens: int = Field(default=1000)
+    old_tool_output_tokens: int = Field(default=64)
+
+    _last_prompt_tokens: int = PrivateAttr(default=0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CompactingMemory"
+
+    @classmethod
+    def from_defaults(
+        cls,
+        chat_history: Optional[List[ChatMessage]] = None,
+        llm: Optional[LLM] = None,
+        token_limit: Optional[int] = None,
+        keep_recent_turns: int = 2,
+        max_tool_output_tokens: int = 1000,
+        old_tool_output_tokens: int = 64,
+        **kwargs: Any,
+    ) -> "CompactingMemory":
+        memory = super().from_defaults(
+            chat_history=chat_history, llm=llm, token_limit=token_limit, **kwargs
+        )
+        memory.keep_recent_turns = keep_recent_turns
+        memory.max_tool_output_tokens = max_tool_output_tokens
+        memory.old_tool_output_tokens = old_tool_output_tokens
+        return memory
+
+    @property
+    def last_prompt_tokens(self) -> int:
+        return self._last_prompt_tokens
+
+    def truncate_tool_output(self, message: ChatMessage) -> ChatMessage:
+        if message.role == MessageRole.TOOL:
+            return self._shrink(message, self.max_tool_output_tokens)
+        return message
+
+    def put(self, message: ChatMessage) -> None:
+        super().put(self.truncate_tool_output(message))
+
+    @staticmethod
+    def _shrink(message: ChatMessage, max_tokens: int) -> ChatMessage:
+        content = str(message.content or "")
+        truncated = truncate_text(content, max_tokens)
+        if truncated == content:
+            return message
+        return ChatMessage(
+            role=message.role, content=truncated, additional_kwargs=message.additional_kwargs
+        )
+
+    def compact(
+        self, history: List[ChatMessage], initial_token_count: int = 0
+    ) -> Tuple[List[ChatMessage], int]:
+        """The messages of `history` to send and their token count, `history` is not modified."""
+        turn_starts = [i for i, m in enumerate(history) if m.role == MessageRole.USER] or [0]
+        if self.keep_recent_turns:
+            recent_start = turn_starts[-min(self.keep_recent_turns, len(turn_starts))]
+        else:
+            recent_start = len(history)
+
+        messages = [
+            self._shrink(m, self.old_tool_output_tokens)
+            if i < recent_start and m.role == MessageRole.TOOL
+            else m
+            for i, m in enumerate(history)
+        ]
+        sizes = [message_tokens(m) for m in messages]
+
+        # drop whole turns from the front, never the last one
+        start = 0
+        total = sum(sizes) + initial_token_count
+        for turn_start in turn_starts[1:]:
+            if total <= self.token_limit:
+                break
+            total -= sum(sizes[start:turn_start])
+            start = turn_start
+
+        if total > self.token_limit:
+            messages[start:], total = self._fit_tool_outputs(
+                messages[start:], sizes[start:], total, self.token_limit
+            )
+        return messages[start:], total
+
+    def _fit_tool_outputs(
+        self, messages: List[ChatMessage], sizes: List[int], total: int, limit: int
+    ) -> Tuple[List[ChatMessage], int]:
+        """Cut tool outputs so `total` gets to about `limit`, smallest outputs are kept whole first."""
+        tools = sorted((sizes[i], i) for i, m in enumerate(messages) if m.role == MessageRole.TOOL)
+        budget = limit - (total - sum(size for size, _ in tools))
+        messages = list(messages)
+        for n, (size, i) in enumerate(tools):
+            share = max(budget // (len(tools) - n), 0)
+            if size > share:
+                messages[i] = self._shrink(messages[i], max(share - TRUNCATION_NOTE_TOKENS, 0))
+                total += message_tokens(messages[i]) - size
+            budget -= min(size, share)
+        return messages, total
+
+    def get(self, input: Optional[str] = None, initial_token_count: int = 0, **kwargs: Any) -> List[ChatMessage]:
+        messages, self._last_prompt_tokens = self.compact(self.get_all(), initial_token_count)
+        return messages
@@ -0,0 +1,392 @@
+"""
+Offline stand-ins for OpenAI / OpenAIEmbedding, for benchmarks and load tests:
+
+    resources = ResourceRegistry(
+        llm_factory=mock_llm_factory(latency_ms=300, tokens_per_sec=80),
+        embed_model_factory=mock_embedding_factory(),
+    )
+    agent = FunctionCallingAgent(resources=resources, tools=tools)
+
+Everything is deterministic: answers, tool calls and latencies are derived from a hash
+of the request (and `seed`), so the same run costs the same time every time.
+
+`provider_limits=ProviderLimits(requests=..., tokens=...)` makes the mock enforce a
+provider's per-minute limits, answering over-limit calls with a 429 (MockRateLimitError).
+"""
+import asyncio
+import hashlib
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
+
+from src.utils.text import tokenize
+
+
+def _digest(*parts: Any) -> int:
+    data = "\x1f".join(str(part) for part in parts).encode("utf-8")
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "little")
+
+
+def sample_latency(rng: random.Random, mean_s: float, distribution: str, jitter: float) -> float:
+    """
+    - "fixed": always `mean_s`
+    - "uniform": mean_s * (1 +- jitter)
+    - "lognormal": long right tail with sigma `jitter`, median `mean_s`, like real APIs
+    """
+    if mean_s <= 0:
+        return 0.0
+    if distribution == "fixed":
+        return mean_s
+    if distribution == "uniform":
+        return max(mean_s * (1 + rng.uniform(-jitter, jitter)), 0.0)
+    if distribution == "lognormal":
+        return mean_s * rng.lognormvariate(0.0, jitter)
+    raise ValueError(f"unknown latency distribution {distribution!r}")
+
+
+class MockRateLimitError(Exception):
+    """What a provider answers over its limits: HTTP 429 with a Retry-After."""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ProviderLimits:
+    """
+    Requests and tokens allowed per sliding `window` seconds, shared by every mock LLM
+    handed the same instance (like an API key's limits). A shorter window speeds tests up.
+    """
+
+    def __init__(self, requests: Optional[int] = None, tokens: Optional[int] = None, window: float = 60.0) -> None:
+        self.requests = requests
+        self.tokens = tokens
+        self.window = window
+        self._log: deque = deque()
+        self._tokens_in_window = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    def admit(self, tokens: int) -> None:
+        now = time.monotonic()
+        while self._log and now - self._log[0][0] >= self.window:
+            self._tokens_in_window -= self._log.popleft()[1]
+        over_requests = self.requests is not None and len(self._log) + 1 > self.requests
+        over_tokens = self.tokens is not None and self._tokens_in_window + tokens > self.tokens
+        if over_requests or over_tokens:
+            self.rejected += 1
+            retry_after = self.window - (now - self._log[0][0]) if self._log else self.window
+            raise MockRateLimitError(
+                f"rate limit reached for {'requests' if over_requests else 'tokens'}", retry_after
+            )
+        self._log.append((now, tokens))
+        self._tokens_in_window += tokens
+        self.accepted += 1
+
+
+ScriptStep = Union[str, List[Dict[str, Any]]]
+
+
+class MockFunctionCallingLLM(FunctionCallingLLM):
+    """
+    FunctionCallingLLM that answers locally. Each call waits a sampled time to the first
+    token, then streams `output_tokens` tokens at `tokens_per_sec`.
+
+    `tool_script` scripts the agent loop: step k is used for the k-th assistant reply
+    after the latest user message, either a list of {"tool_name", "tool_kwargs"} dicts
+    (tool calls) or a string (the answer). Past the end of the script, and without one,
+    the reply is a deterministic text answer. `tool_script` may also be a callable
+    (chat_history, tools) -> step or None.
+    """
+
+    model: str = Field(default="mock")
+    latency_ms: float = Field(default=0.0, description="Median time to first token.")
+    latency_distribution: str = Field(default="fixed")
+    latency_jitter: float = Field(default=0.5)
+    tokens_per_sec: float = Field(default=0.0, description="0 streams without delay.")
+    output_tokens: int = Field(default=16)
+    temperature: float = Field(default=0.0, description="Answers are deterministic either way.")
+    context_window: int = Field(default=128000)
+    tool_script: Optional[Union[List[ScriptStep], Callable[..., Optional[ScriptStep]]]] = Field(
+        default=None, exclude=True
+    )
+    seed: int = Field(default=0)
+    provider_limits: Optional[ProviderLimits] = Field(default=None, exclude=True)
+
+    _calls: int = PrivateAttr(default=0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MockFunctionCallingLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=self.context_window,
+            num_output=self.output_tokens,
+            is_chat_model=True,
+            is_function_calling_model=True,
+            model_name=self.model,
+        )
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    # --- response generation -------------------------------------------------------
+
+    def _ttft(self, prompt: str) -> float:
+        if self.provider_limits is not None:
+            self.provider_limits.admit(len(tokenize(prompt)) + self.output_tokens)
+        self._calls += 1
+        rng = random.Random(_digest(self.seed, prompt))
+        return sample_latency(rng, self.latency_ms / 1000, self.latency_distribution, self.latency_jitter)
+
+    def _token_gap(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def _tokens(self, prompt: str) -> List[str]:
+        rng = random.Random(_digest(self.seed, "answer", prompt))
+        return [f"tok{rng.randrange(10000)} " for _ in range(self.output_tokens)]
+
+    def _script_step(self, messages: Sequence[ChatMessage], tools: Sequence[Any]) -> Optional[ScriptStep]:
+        if self.tool_script is None:
+            return None
+        if callable(self.tool_script):
+            return self.tool_script(messages, tools)
+        replies = 0
+        for message in reversed(messages):
+            if message.role == MessageRole.USER:
+                break
+            replies += message.role == MessageRole.ASSISTANT
+        return self.tool_script[replies] if replies < len(self.tool_script) else None
+
+    def _chat_message(self, messages: Sequence[ChatMessage], tools: Sequence[Any], prompt: str) -> ChatMessage:
+        step = self._script_step(messages, tools)
+        if isinstance(step, list):
+            tool_calls = [
+                {
+                    "id": f"call_{_digest(prompt, i) % 10**8}",
+                    "tool_name": call["tool_name"],
+                    "tool_kwargs": call.get("tool_kwargs", {}),
+                }
+                for i, call in enumerate(step)
+            ]
+            return ChatMessage(role=MessageRole.ASSISTANT, content="", additional_kwargs={"tool_calls": tool_calls})
+        content = step if isinstance(step, str) else "".join(self._tokens(prompt))
+        return ChatMessage(role=MessageRole.ASSISTANT, content=content)
+
+    @staticmethod
+    def _chat_prompt(messages: Sequence[ChatMessage]) -> str:
+        return "\n".join(f"{m.role.value}: {m.content or ''}" for m in messages)
+
+    @staticmethod
+    def _split(text: str) -> List[str]:
+        return [word + " " for word in text.split(" ") if word] or [""]
+
+    # --- completion ----------------------------------------------------------------
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self._ttft(prompt) + self._token_gap() * self.output_tokens)
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        await asyncio.sleep(self._ttft(prompt) + self._token_gap() * self.output_tokens)
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        def gen() -> CompletionResponseGen:
+            time.sleep(self._ttft(prompt))
+            text = ""
+            for token in self._tokens(prompt):
+                time.sleep(self._token_gap())
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+    @llm_completion_callback()
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        async def gen() -> CompletionResponseAsyncGen:
+            await asyncio.sleep(self._ttft(prompt))
+            text = ""
+            for token in self._tokens(prompt):
+                await asyncio.sleep(self._token_gap())
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+    # --- chat ----------------------------------------------------------------------
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        prompt = self._chat_prompt(messages)
+        message = self._chat_message(messages, kwargs.get("tools") or [], prompt)
+        time.sleep(self._ttft(prompt) + self._token_gap() * len(self._split(message.content or "")))
+        return ChatResponse(message=message)
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        prompt = self._chat_prompt(messages)
+        message = self._chat_message(messages, kwargs.get("tools") or [], prompt)
+        await asyncio.sleep(self._ttft(prompt) + self._token_gap() * len(self._split(message.content or "")))
+        return ChatResponse(message=message)
+
+    @llm_chat_callback()
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        def gen() -> ChatResponseGen:
+            prompt = self._chat_prompt(messages)
+            message = self._chat_message(messages, kwargs.get("tools") or [], prompt)
+            time.sleep(self._ttft(prompt))
+            text = ""
+            for token in self._split(message.content or ""):
+                time.sleep(self._token_gap())
+                text += token
+                yield ChatResponse(
+                    message=ChatMessage(role=message.role, content=text, additional_kwargs=message.additional_kwargs),
+                    delta=token,
+                )
+
+        return gen()
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        async def gen() -> ChatResponseAsyncGen:
+            prompt = self._chat_prompt(messages)
+            message = self._chat_message(messages, kwargs.get("tools") or [], prompt)
+            await asyncio.sleep(self._ttft(prompt))
+            text = ""
+            for token in self._split(message.content or ""):
+                await asyncio.sleep(self._token_gap())
+                text += token
+                yield ChatResponse(
+                    message=ChatMessage(role=message.role, content=text, additional_kwargs=message.additional_kwargs),
+                    delta=token,
+                )
+
+        return gen()
+
+    # --- function calling ----------------------------------------------------------
+
+    def _prepare_chat_with_tools(
+        self,
+        tools: Sequence[Any],
+        user_msg: Optional[Union[str, ChatMessage]] = None,
+        chat_history: Optional[List[ChatMessage]] = None,
+        verbose: bool = False,
+        allow_parallel_tool_calls: bool = False,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        messages = list(chat_history or [])
+        if isinstance(user_msg, str):
+            user_msg = ChatMessage(role=MessageRole.USER, content=user_msg)
+        if user_msg is not None:
+            messages.append(user_msg)
+        return {"messages": messages, "tools": list(tools), **kwargs}
+
+    def get_tool_calls_from_response(
+        self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any
+    ) -> List[ToolSelection]:
+        tool_calls = response.message.additional_kwargs.get("tool_calls", [])
+        if not tool_calls and error_on_no_tool_call:
+            raise ValueError("Expected at least one tool call, but got 0 tool calls.")
+        return [
+            ToolSelection(tool_id=call["id"], tool_name=call["tool_name"], tool_kwargs=call["tool_kwargs"])
+            for call in tool_calls
+        ]
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Deterministic embeddings without a model: each token is hashed to a signed position
+    of an `embed_dim` vector (feature hashing), so texts sharing words get similar
+    vectors and retrieval / semantic caches behave sensibly. `latency_ms` per call.
+    """
+
+    embed_dim: int = Field(default=256)
+    latency_ms: float = Field(default=0.0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.embed_dim, dtype=np.float32)
+        for token in tokenize(text) or [text]:
+            h = _digest(token)
+            vector[h % self.embed_dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._embed(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._embed(text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+
+def mock_llm_factory(**defaults: Any) -> Callable[..., MockFunctionCallingLLM]:
+    """`llm_factory` for ResourceRegistry; `defaults` are MockFunctionCallingLLM fields."""
+
+    def factory(registry: Any, model: Optional[str], **kwargs: Any) -> MockFunctionCallingLLM:
+        # OpenAI options such as temperature have no meaning here
+        options = {k: v for k, v in {**defaults, **kwargs}.items() if k in MockFunctionCallingLLM.model_fields}
+        return MockFunctionCallingLLM(model=model or "mock", **options)
+
+    return factory
+
+
+def mock_embedding_factory(**defaults: Any) -> Callable[..., HashEmbedding]:
+    """`embed_model_factory` for ResourceRegistry; `defaults` are HashEmbedding fields."""
+
+    def factory(registry: Any, model_name: str, **kwargs: Any) -> HashEmbedding:
+        options = {k: v for k, v in {**defaults, **kwargs}.items() if k in HashEmbedding.model_fields}
+        return HashEmbedding(model_name=model_name, **options)
+
+    return factory
@@ -0,0 +1,286 @@
+import uuid
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store backed by one contiguous matrix.
+
+    - exact search is a single matrix-vector product plus `argpartition` for top-k
+    - cosine scores come from precomputed inverse row norms, so a read-only
+      memory-mapped matrix (see LocalIndexStore) can be searched without copying it
+    - `dtype="float16"` halves memory at some query cost, scoring is done in float32 blocks
+    - `approximate=True` switches to an IVF index (k-means lists, `n_probe` lists
+      searched per query), meant for corpora past ~1M chunks
+
+    Nodes are kept alongside the rows, so the store can back a VectorStoreIndex
+    through `VectorStoreIndex.from_vector_store`. An InvertedIndex over the same rows
+    can be attached for hybrid retrieval; it is dropped once the rows change.
+    `version` changes on every mutation, caches built on top of the store key on it.
+    """
+
+    stores_text: bool = True
+    dtype: str = "float32"
+    approximate: bool = False
+    n_lists: Optional[int] = None
+    n_probe: int = 8
+    version: Optional[str] = None
+
+    _matrix: np.ndarray = PrivateAttr()
+    _inv_norms: np.ndarray = PrivateAttr()
+    _size: int = PrivateAttr(default=0)
+    _nodes: List[BaseNode] = PrivateAttr(default_factory=list)
+    _centroids: Optional[np.ndarray] = PrivateAttr(default=None)
+    _lists: Optional[List[np.ndarray]] = PrivateAttr(default=None)
+    _lexical_index: Any = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._matrix = np.zeros((0, 0), dtype=self.dtype)
+        self._inv_norms = np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @classmethod
+    def from_arrays(
+        cls, nodes: Sequence[BaseNode], embeddings: np.ndarray, **kwargs: Any
+    ) -> "NumpyVectorStore":
+        """Wrap an existing matrix, a float32 memmap is used as is."""
+        store = cls(**kwargs)
+        matrix = embeddings
+        if matrix.dtype != np.dtype(store.dtype):
+            matrix = matrix.astype(store.dtype)
+        store._matrix = matrix
+        store._size = len(nodes)
+        store._nodes = [node.model_copy(update={"embedding": None}) for node in nodes]
+        store._inv_norms = store._compute_inv_norms(matrix)
+        return store
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix[: self._size]
+
+    @property
+    def nodes(self) -> List[BaseNode]:
+        return self._nodes
+
+    @property
+    def lexical_index(self) -> Any:
+        return self._lexical_index
+
+    def set_lexical_index(self, lexical_index: Any) -> None:
+        assert len(lexical_index) == self._size, "lexical index must cover the same rows"
+        self._lexical_index = lexical_index
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _compute_inv_norms(matrix: np.ndarray, block: int = 65536) -> np.ndarray:
+        inv_norms = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), block):
+            rows = np.asarray(matrix[start : start + block], dtype=np.float32)
+            norms = np.linalg.norm(rows, axis=1)
+            inv_norms[start : start + block] = np.where(norms > 0, 1.0 / np.maximum(norms, 1e-12), 0.0)
+        return inv_norms
+
+    def _reserve(self, extra: int, dim: int) -> None:
+        needed = self._size + extra
+        if self._matrix.shape[1] not in (0, dim):
+            raise ValueError(f"embedding dim {dim} does not match store dim {self._matrix.shape[1]}")
+        if needed <= len(self._matrix) and self._matrix.flags.writeable:
+            return
+        # grow geometrically, this also turns a read-only memmap into a writable copy
+        capacity = max(needed, 2 * len(self._matrix), 1024)
+        matrix = np.zeros((capacity, dim), dtype=self.dtype)
+        matrix[: self._size] = self._matrix[: self._size]
+        self._matrix = matrix
+        inv_norms = np.zeros(capacity, dtype=np.float32)
+        inv_norms[: self._size] = self._inv_norms[: self._size]
+        self._inv_norms = inv_norms
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        rows = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        self._reserve(len(nodes), rows.shape[1])
+        end = self._size + len(nodes)
+        self._matrix[self._size : end] = rows
+        self._inv_norms[self._size : end] = self._compute_inv_norms(rows)
+        self._nodes.extend(node.model_copy(update={"embedding": None}) for node in nodes)
+        self._size = end
+        self._lists = None
+        self._lexical_index = None
+        self.version = uuid.uuid4().hex
+        return [node.node_id for node in nodes]
+
+    def _keep(self, keep: np.ndarray) -> None:
+        self._matrix = self._matrix[: self._size][keep]
+        self._inv_norms = self._inv_norms[: self._size][keep]
+        self._nodes = [node for node, kept in zip(self._nodes, keep) if kept]
+        self._size = len(self._nodes)
+        self._lists = None
+        self._lexical_index = None
+        self.version = uuid.uuid4().hex
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        keep = np.array([node.ref_doc_id != ref_doc_id for node in self._nodes], dtype=bool)
+        self._keep(keep)
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        if filters is not None:
+            raise NotImplementedError("NumpyVectorStore does not support metadata filters")
+        node_ids = set(node_ids or [])
+        keep = np.array([node.node_id not in node_ids for node in self._nodes], dtype=bool)
+        self._keep(keep)
+
+    def get_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+    ) -> List[BaseNode]:
+        if filters is not None:
+            raise NotImplementedError("NumpyVectorStore does not support metadata filters")
+        if node_ids is None:
+            return list(self._nodes)
+        wanted = set(node_ids)
+        return [node for node in self._nodes if node.node_id in wanted]
+
+    def clear(self) -> None:
+        self._matrix = np.zeros((0, 0), dtype=self.dtype)
+        self._inv_norms = np.zeros(0, dtype=np.float32)
+        self._nodes = []
+        self._size = 0
+        self._lists = None
+        self._lexical_index = None
+        self.version = uuid.uuid4().hex
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray | None = None, block: int = 65536) -> np.ndarray:
+        """Cosine similarity of `query` against all rows (or the given row indices)."""
+        matrix = self._matrix[: self._size]
+        inv_norms = self._inv_norms[: self._size]
+        if rows is not None:
+            matrix = matrix[rows]
+            inv_norms = inv_norms[rows]
+        if matrix.dtype == np.float32:
+            return (matrix @ query) * inv_norms
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), block):
+            chunk = np.asarray(matrix[start : start + block], dtype=np.float32)
+            scores[start : start + block] = chunk @ query
+        return scores * inv_norms
+
+    def similarities(self, query_embedding: List[float], rows: Sequence[int]) -> np.ndarray:
+        """Cosine similarity of `query_embedding` against the given rows, as `query` scores them."""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        return self._scores(q, rows=np.asarray(rows, dtype=np.int64))
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k >= len(scores):
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def build_ivf(self, n_lists: int | None = None, iterations: int = 10, sample: int = 100_000, seed: int = 0) -> None:
+        """k-means the (normalized) rows into `n_lists` inverted lists."""
+        n_lists = n_lists or self.n_lists or max(1, int(np.sqrt(self._size)))
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(self._size, size=min(sample, self._size), replace=False)
+        picked.sort()
+        data = np.asarray(self._matrix[picked], dtype=np.float32) * self._inv_norms[picked, None]
+        centroids = data[rng.choice(len(data), size=min(n_lists, len(data)), replace=False)]
+
+        for _ in range(iterations):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = data[assign == c]
+                if len(members):
+                    mean = members.mean(axis=0)
+                    centroids[c] = mean / max(np.linalg.norm(mean), 1e-12)
+
+        # assign every row, in blocks so the score matrix stays small
+        assign = np.empty(self._size, dtype=np.int32)
+        for start in range(0, self._size, 65536):
+            rows = np.asarray(self._matrix[start : start + 65536], dtype=np.float32)
+            assign[start : start + 65536] = np.argmax(rows @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        self._centroids = centroids
+        self._lists = [order[bounds[c] : bounds[c + 1]] for c in range(len(centroids))]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"NumpyVectorStore only supports the default query mode, got {query.mode}")
+        if query.filters is not None:
+            raise NotImplementedError("NumpyVectorStore does not support metadata filters")
+        if self._size == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        k = query.similarity_top_k
+
+        candidates = None
+        if query.node_ids is not None or query.doc_ids is not None:
+            node_ids = set(query.node_ids or [])
+            doc_ids = set(query.doc_ids or [])
+            candidates = np.array(
+                [
+                    i
+                    for i, node in enumerate(self._nodes)
+                    if (not node_ids or node.node_id in node_ids)
+                    and (not doc_ids or node.ref_doc_id in doc_ids)
+                ],
+                dtype=np.int64,
+            )
+        elif self.approximate:
+            if self._lists is None:
+                self.build_ivf()
+            probe = self._top_k(self._centroids @ q, min(self.n_probe, len(self._lists)))
+            candidates = np.concatenate([self._lists[c] for c in probe])
+            candidates.sort()
+
+        if candidates is not None:
+            if len(candidates) == 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            scores = self._scores(q, rows=candidates)
+            top = self._top_k(scores, k)
+            rows, similarities = candidates[top], scores[top]
+        else:
+            scores = self._scores(q)
+            rows = self._top_k(scores, k)
+            similarities = scores[rows]
+
+        nodes = [self._nodes[i] for i in rows]
+        return VectorStoreQueryResult(
+            nodes=nodes,
+            similarities=[float(s) for s in similarities],
+            ids=[node.node_id for node in nodes],
+        )
@@ -0,0 +1,125 @@
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence
+
+from llama_index.core.base.response.schema import RESPONSE_TYPE
+from llama_index.core.response_synthesizers import SimpleSummarize
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.utils import get_tokenizer
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str) -> int:
+    """tiktoken count, cached since the same chunks come back query after query."""
+    return len(get_tokenizer()(text))
+
+
+def _overlap(head: str, tail: str, min_chars: int) -> int:
+    """Length of the longest suffix of `head` that is also a prefix of `tail`."""
+    for size in range(min(len(head), len(tail)), min_chars - 1, -1):
+        if tail.startswith(head[-size:]):
+            return size
+    return 0
+
+
+def _trim(node: TextNode, kept: Sequence[TextNode], min_chars: int) -> Optional[str]:
+    """
+    Text of `node` minus whatever a kept chunk of the same document already covers,
+    None if nothing new is left. Uses the splitter's char offsets when both nodes
+    have them, otherwise looks for the chunk overlap in the text itself.
+    """
+    text = node.get_content(metadata_mode=MetadataMode.NONE)
+    start, end = node.start_char_idx, node.end_char_idx
+    for other in kept:
+        if other.ref_doc_id != node.ref_doc_id:
+            continue
+        other_text = other.get_content(metadata_mode=MetadataMode.NONE)
+        if text in other_text:
+            return None
+        if None not in (start, end, other.start_char_idx, other.end_char_idx):
+            lo, hi = max(start, other.start_char_idx), min(end, other.end_char_idx)
+            if hi - lo >= len(text):
+                return None
+            if hi > lo and lo == start:
+                text, start = text[hi - lo :], hi
+            elif hi > lo and hi == end:
+                text, end = text[: len(text) - (hi - lo)], lo
+            continue
+        cut = _overlap(other_text, text, min_chars)
+        if cut:
+            text = text[cut:]
+        cut = _overlap(text, other_text, min_chars)
+        if cut:
+            text = text[: len(text) - cut]
+    return text if text.strip() else None
+
+
+def pack_nodes(
+    nodes: Sequence[NodeWithScore],
+    token_budget: int,
+    min_overlap_chars: int = 32,
+    separator: str = "\n",
+) -> List[NodeWithScore]:
+    """
+    Highest scores first, add each node that still fits in `token_budget` (counted
+    as the LLM sees it, metadata included), with text already covered by an
+    overlapping chunk of the same document cut out. Nodes that do not fit are
+    skipped, so a smaller one further down can still go in. Ties keep retrieval order.
+    """
+    ordered = sorted(enumerate(nodes), key=lambda item: (-(item[1].score or 0.0), item[0]))
+    separator_tokens = count_tokens(separator)
+    packed: List[NodeWithScore] = []
+    kept: List[TextNode] = []
+    seen = set()
+    used = 0
+    for _, node in ordered:
+        text = node.node.get_content(metadata_mode=MetadataMode.NONE)
+        if text in seen:
+            continue
+        trimmed = _trim(node.node, kept, min_overlap_chars)
+        if trimmed is None:
+            continue
+        candidate = node.node if trimmed == text else node.node.model_copy(update={"text": trimmed})
+        cost = count_tokens(candidate.get_content(metadata_mode=MetadataMode.LLM))
+        cost += separator_tokens if packed else 0
+        if used + cost > token_budget:
+            continue
+        used += cost
+        seen.add(text)
+        kept.append(candidate)
+        packed.append(NodeWithScore(node=candidate, score=node.score))
+    return packed
+
+
+class PackedSynthesizer(SimpleSummarize):
+    """
+    Answers with exactly one LLM call: the reranked nodes are packed into a single
+    prompt by `pack_nodes` instead of being compacted and refined over several calls.
+
+    `token_budget` caps the context tokens; by default it is the LLM's context window
+    minus the prompt template and the tokens reserved for the answer.
+    """
+
+    def __init__(
+        self, *args: Any, token_budget: Optional[int] = None, min_overlap_chars: int = 32, **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.token_budget = token_budget
+        self.min_overlap_chars = min_overlap_chars
+
+    def budget(self, query_str: str) -> int:
+        if self.token_budget is not None:
+            return self.token_budget
+        metadata = self._llm.metadata
+        template = self._text_qa_template.partial_format(query_str=query_str)
+        prompt_tokens = count_tokens(template.format(llm=self._llm, context_str=""))
+        return max(metadata.context_window - max(metadata.num_output, 0) - prompt_tokens, 0)
+
+    def pack(self, query: str | QueryBundle, nodes: Sequence[NodeWithScore]) -> List[NodeWithScore]:
+        query_str = query.query_str if isinstance(query, QueryBundle) else query
+        return pack_nodes(nodes, self.budget(query_str), self.min_overlap_chars, separator="\n")
+
+    def synthesize(self, query, nodes: List[NodeWithScore], *args: Any, **kwargs: Any) -> RESPONSE_TYPE:
+        return super().synthesize(query, self.pack(query, nodes), *args, **kwargs)
+
+    async def asynthesize(self, query, nodes: List[NodeWithScore], *args: Any, **kwargs: Any) -> RESPONSE_TYPE:
+        return await super().asynthesize(query, self.pack(query, nodes), *args, **kwargs)
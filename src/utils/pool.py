@@ -0,0 +1,209 @@
+"""
+Serving many requests at once with bounded resources:
+
+    guard = LLMGuard(max_concurrency=16)
+    resources = ResourceRegistry(llm_factory=guard.factory(openai_llm_factory))
+    pool = WorkflowPool(
+        lambda: FunctionCallingAgent(resources=resources, tools=tools, timeout=120),
+        size=8, max_queue=64, timeout=30.0, llm_guard=guard,
+    )
+    async with pool:
+        result = await pool.run(input="...", session_id="user-1")
+
+`size` warm instances run one request each, later requests wait in a queue of at most
+`max_queue` and are served in arrival order; beyond that `run` raises asyncio.QueueFull
+right away, so the front end can answer 503 instead of piling up work. A request that misses its deadline (queue
+wait included) raises asyncio.TimeoutError and its run is cancelled. `close` turns new
+requests away with RuntimeError and waits for the admitted ones to finish.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.workflow import Workflow
+
+from src.utils.guarded_llm import LLMGuard
+
+
+class WorkflowPool:
+    """
+    A pool of `size` workflow instances built by `workflow_factory` up front, so
+    construction (tool indexing, client setup) never lands on a request.
+    """
+
+    def __init__(
+        self,
+        workflow_factory: Callable[[], Workflow],
+        size: int = 4,
+        max_queue: int = 100,
+        timeout: Optional[float] = 60.0,
+        llm_guard: Optional[LLMGuard] = None,
+    ) -> None:
+        self.workflow_factory = workflow_factory
+        self.size = size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.llm_guard = llm_guard
+        self._idle: Optional[deque] = None
+        # one future per queued request, oldest first; a freed instance goes to the oldest
+        self._waiters: deque = deque()
+        self._closing = False
+        self._active = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._started_at = 0.0
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self._queue_wait_seconds = 0.0
+
+    async def start(self) -> "WorkflowPool":
+        if self._idle is None:
+            self._idle = deque(self.workflow_factory() for _ in range(self.size))
+            self._closing = False
+            self._started_at = time.monotonic()
+        return self
+
+    async def close(self) -> None:
+        """Reject new requests, wait for admitted ones (queued included) to finish."""
+        self._closing = True
+        await self._drained.wait()
+        self._idle = None
+
+    async def __aenter__(self) -> "WorkflowPool":
+        return await self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def _acquire(self, deadline: Optional[float]) -> Workflow:
+        if self._idle and not self._waiters:
+            self.admitted += 1
+            return self._idle.popleft()
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise asyncio.QueueFull(f"{self.waiting} requests already waiting")
+        self.admitted += 1
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.waiting += 1
+        try:
+            remaining = None if deadline is None else max(deadline - started, 0.0)
+            return await asyncio.wait_for(waiter, timeout=remaining)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # handed an instance just as we gave up, pass it on
+                self._release(waiter.result())
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+        finally:
+            self.waiting -= 1
+            self._queue_wait_seconds += time.monotonic() - started
+
+    def _release(self, workflow: Workflow) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(workflow)
+                return
+        self._idle.append(workflow)
+
+    async def run(self, *, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """`workflow.run(**kwargs)` on an idle instance, within `timeout` (the pool's by default)."""
+        if self._closing:
+            self.rejected += 1
+            raise RuntimeError("WorkflowPool is closed")
+        if self._idle is None:
+            await self.start()
+        self._active += 1
+        self._drained.clear()
+        try:
+            return await self._run(timeout, kwargs)
+        finally:
+            self._active -= 1
+            if not self._active:
+                self._drained.set()
+
+    async def _run(self, timeout: Optional[float], kwargs: Dict[str, Any]) -> Any:
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            workflow = await self._acquire(deadline)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise
+
+        self._busy += 1
+        started = time.monotonic()
+        handler = None
+        try:
+            handler = workflow.run(**kwargs)
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            done, _ = await asyncio.wait({handler}, timeout=remaining)
+            if not done:
+                self.timed_out += 1
+                await self._cancel(handler)
+                raise asyncio.TimeoutError(f"run exceeded its {timeout}s deadline")
+            try:
+                result = handler.result()
+            except Exception:
+                self.failed += 1
+                raise
+            self.completed += 1
+            return result
+        except asyncio.CancelledError:
+            # the caller went away, e.g. the client disconnected
+            await self._cancel(handler)
+            raise
+        finally:
+            self._busy -= 1
+            self._busy_seconds += time.monotonic() - started
+            if handler is not None and not handler.done():
+                # still winding down after a cancel, it must not serve another request
+                handler.add_done_callback(lambda h: h.cancelled() or h.exception())
+                workflow = self.workflow_factory()
+            self._release(workflow)
+
+    @staticmethod
+    async def _cancel(handler: Any) -> None:
+        await handler.cancel_run()
+        # give the run a moment to wind down so the instance can be reused
+        await asyncio.wait({handler}, timeout=1.0)
+        if handler.done() and not handler.cancelled():
+            handler.exception()
+
+    async def map(self, requests: List[Dict[str, Any]], return_exceptions: bool = True) -> List[Any]:
+        """Run every kwargs dict in `requests`, results in the same order."""
+        return await asyncio.gather(*(self.run(**kwargs) for kwargs in requests), return_exceptions=return_exceptions)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        handled = self.admitted - self.waiting
+        stats = {
+            "size": self.size,
+            "busy": self._busy,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "utilization": round(self._busy / self.size, 3),
+            "utilization_avg": round(self._busy_seconds / (self.size * uptime), 3) if uptime else 0.0,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "queue_wait_mean_s": round(self._queue_wait_seconds / handled, 6) if handled else 0.0,
+        }
+        if self.llm_guard is not None:
+            stats["llm"] = self.llm_guard.stats
+        return stats
@@ -0,0 +1,258 @@
+"""
+Process-wide throttling of LLM calls, so bursts stay under the provider's limits
+instead of turning into retry storms:
+
+    limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=200_000, max_concurrency=32)
+    guard = LLMGuard(max_concurrency=64, rate_limiter=limiter)
+    resources = ResourceRegistry(llm_factory=guard.factory(partial(openai_llm_factory, max_retries=0)))
+
+Each call waits for a request and its estimated tokens in two token buckets (requests/min,
+tokens/min) and for a slot under an adaptive concurrency limit, which grows by one per
+window of successful calls and halves on a 429 (or when latency exceeds
+`latency_target`). Rate limited and transient failures are retried with full jitter,
+honouring Retry-After. Turn the client's own retries off (max_retries=0 above) so the
+two don't multiply.
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+THROTTLED = {429, 503}
+TRANSIENT = {408, 409, 500, 502, 504}
+TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "TimeoutException", "ConnectError", "ReadTimeout"}
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an openai / httpx error, or of anything with a `status_code`."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, from the error or its response headers."""
+    seconds = getattr(error, "retry_after", None)
+    if seconds is not None:
+        return float(seconds)
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_throttled(error: BaseException) -> bool:
+    return status_code(error) in THROTTLED or type(error).__name__ == "RateLimitError"
+
+
+def is_retryable(error: BaseException) -> bool:
+    return (
+        is_throttled(error)
+        or status_code(error) in TRANSIENT
+        or isinstance(error, asyncio.TimeoutError)
+        or type(error).__name__ in TRANSIENT_ERRORS
+    )
+
+
+class TokenBucket:
+    """`rate` units per minute, holding up to `burst` minutes' worth. Waiters are served in order."""
+
+    def __init__(self, rate: float, burst: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = rate * burst
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / 60)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` (at most the capacity), returns the seconds waited."""
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                await asyncio.sleep((amount - self._tokens) * 60 / self.rate)
+                self._refill()
+            self._tokens -= amount
+        return time.monotonic() - started
+
+    def debit(self, amount: float) -> None:
+        """Correct an estimate afterwards, positive when more was used; may go negative."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on calls in flight: +1 per `limit` successes, halved on throttling.
+    Only one decrease per round trip: a 429 for a call started before the last
+    decrease is the same overload, already accounted for.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64, backoff: float = 0.5) -> None:
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        """Wait for a slot, returns the time the call started (for `decrease`)."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self) -> None:
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    def increase(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def decrease(self, started: float) -> None:
+        if started < self._last_decrease:
+            return
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        self._last_decrease = time.monotonic()
+        self.decreases += 1
+
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute (None: unlimited), an adaptive
+    concurrency limit between `min_concurrency` and `max_concurrency`, and jittered
+    retries, shared by every call that goes through `run`. Lower `burst` (minutes' worth
+    the buckets hold) for providers that also enforce limits over shorter windows.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst: float = 1.0,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        initial_concurrency: Optional[int] = None,
+        latency_target: Optional[float] = None,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute, burst) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(
+            initial=initial_concurrency or max_concurrency, minimum=min_concurrency, maximum=max_concurrency
+        )
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        wait = retry_after(error)
+        if wait is not None:
+            # everyone throttled together gets the same Retry-After, spread them out
+            return wait + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        tokens: int = 0,
+        usage: Optional[Callable[[T], Optional[int]]] = None,
+        hold: bool = False,
+    ) -> T:
+        """
+        `await call()` once the limits allow, retrying throttled and transient failures.
+        `tokens` is the estimate taken from the tokens bucket, `usage(result)` the
+        actual count it is corrected by. With `hold` the successful call keeps its
+        concurrency slot, e.g. for a stream still being read; give it back with `release()`.
+        """
+        attempt = 0
+        while True:
+            held = False
+            started_wait = time.monotonic()
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None and tokens:
+                await self.tokens.acquire(tokens)
+            started = await self.concurrency.acquire()
+            self.wait_seconds += started - started_wait
+            self.calls += 1
+            try:
+                result = await call()
+            except Exception as e:
+                if is_throttled(e):
+                    self.throttled += 1
+                    self.concurrency.decrease(started)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self.backoff(attempt, e)
+            else:
+                if self.latency_target is not None and time.monotonic() - started > self.latency_target:
+                    self.concurrency.decrease(started)
+                else:
+                    self.concurrency.increase()
+                if usage is not None and self.tokens is not None and tokens:
+                    used = usage(result)
+                    if used is not None:
+                        self.tokens.debit(used - min(tokens, self.tokens.capacity))
+                held = hold
+                return result
+            finally:
+                if not held:
+                    await self.concurrency.release()
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def release(self) -> None:
+        """Give back the concurrency slot of a call made with `hold=True`."""
+        await self.concurrency.release()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures,
+            "decreases": self.concurrency.decreases,
+            "wait_mean_s": round(self.wait_seconds / self.calls, 6) if self.calls else 0.0,
+        }
+        if self.requests is not None:
+            stats["requests_available"] = round(self.requests.available, 1)
+        if self.tokens is not None:
+            stats["tokens_available"] = round(self.tokens.available, 1)
+        return stats
@@ -0,0 +1,201 @@
+import asyncio
+from typing import Any, List, Optional
+
+import numpy as np
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, SerializeAsAny
+from llama_index.core.postprocessor.llm_rerank import LLMRerank
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from src.utils.hybrid_retriever import FusedNodeWithScore
+from src.utils.text import bm25_scores
+
+
+class AsyncLLMRerank(LLMRerank):
+    """
+    LLMRerank whose choice batches are scored concurrently with `apredict`,
+    at most `max_concurrency` LLM calls in flight, results merged by relevance.
+    """
+
+    max_concurrency: int = Field(default=10, description="Max choice batches scored at once.")
+
+    def __init__(self, *args: Any, max_concurrency: int = 10, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.max_concurrency = max_concurrency
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "AsyncLLMRerank"
+
+    async def _ascore_batch(
+        self, semaphore: asyncio.Semaphore, nodes_batch: list, query_str: str
+    ) -> List[NodeWithScore]:
+        fmt_batch_str = self._format_node_batch_fn(nodes_batch)
+        async with semaphore:
+            raw_response = await self.llm.apredict(
+                self.choice_select_prompt,
+                context_str=fmt_batch_str,
+                query_str=query_str,
+            )
+        raw_choices, relevances = self._parse_choice_select_answer_fn(
+            raw_response, len(nodes_batch)
+        )
+        relevances = relevances or [1.0 for _ in raw_choices]
+        results = []
+        for choice, relevance in zip(raw_choices, relevances):
+            idx = int(choice) - 1
+            # the LLM occasionally cites a document number that is not in the batch
+            if 0 <= idx < len(nodes_batch):
+                results.append(NodeWithScore(node=nodes_batch[idx], score=relevance))
+        return results
+
+    async def apostprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+        query_str: Optional[str] = None,
+    ) -> List[NodeWithScore]:
+        if query_str is not None and query_bundle is None:
+            query_bundle = QueryBundle(query_str)
+        if query_bundle is None:
+            raise ValueError("Query bundle must be provided.")
+        if not nodes:
+            return []
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        batches = [
+            [node.node for node in nodes[idx : idx + self.choice_batch_size]]
+            for idx in range(0, len(nodes), self.choice_batch_size)
+        ]
+        scored = await asyncio.gather(
+            *(self._ascore_batch(semaphore, batch, query_bundle.query_str) for batch in batches)
+        )
+        results = [node for batch in scored for node in batch]
+        return sorted(results, key=lambda x: x.score or 0.0, reverse=True)[: self.top_n]
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    spread = float(scores.max() - scores.min()) if len(scores) else 0.0
+    if spread == 0.0:
+        return np.zeros_like(scores)
+    return (scores - scores.min()) / spread
+
+
+class LocalRerank(BaseNodePostprocessor):
+    """
+    Reranks retrieved nodes without an LLM call:
+    fused = alpha * dense + (1 - alpha) * bm25, both min-max normalized over the candidates.
+
+    The dense signal is the retrieval cosine already on each node (`dense_score` for
+    hybrid results, whose `score` is the RRF fusion and already counts BM25); nodes
+    without one are embedded with `embed_model`, against the query bundle's embedding
+    when it carries one. When the cut at `top_n` is too close to call
+    (fused gap below `ambiguity_margin`) and a `fallback` reranker is set, the
+    candidates are escalated to it, e.g. an LLMRerank.
+    """
+
+    top_n: int = Field(default=3)
+    alpha: float = Field(default=0.5, description="Weight of the dense score.")
+    ambiguity_margin: float = Field(default=0.05)
+    embed_model: Optional[SerializeAsAny[BaseEmbedding]] = Field(default=None)
+    fallback: Optional[SerializeAsAny[BaseNodePostprocessor]] = Field(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalRerank"
+
+    @staticmethod
+    def _retrieval_cosines(nodes: List[NodeWithScore]) -> np.ndarray:
+        """The cosine each node was retrieved with, NaN where there is none."""
+        cosines = [node.dense_score if isinstance(node, FusedNodeWithScore) else node.score for node in nodes]
+        return np.array([cosine if cosine is not None else np.nan for cosine in cosines], dtype=np.float32)
+
+    @staticmethod
+    def _texts(nodes: List[NodeWithScore], missing: np.ndarray) -> List[str]:
+        return [node.node.get_content(metadata_mode=MetadataMode.EMBED) for node, miss in zip(nodes, missing) if miss]
+
+    @staticmethod
+    def _cosine(vectors: List[List[float]], query_embedding: List[float]) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * max(float(np.linalg.norm(q)), 1e-12)
+        return (vectors @ q) / np.maximum(norms, 1e-12)
+
+    def _dense_scores(self, nodes: List[NodeWithScore], query_bundle: QueryBundle) -> np.ndarray:
+        scores = self._retrieval_cosines(nodes)
+        missing = np.isnan(scores)
+        if missing.any() and self.embed_model is not None:
+            query_embedding = query_bundle.embedding or self.embed_model.get_query_embedding(query_bundle.query_str)
+            vectors = self.embed_model.get_text_embedding_batch(self._texts(nodes, missing))
+            scores[missing] = self._cosine(vectors, query_embedding)
+        return np.nan_to_num(scores, nan=0.0)
+
+    async def _adense_scores(self, nodes: List[NodeWithScore], query_bundle: QueryBundle) -> np.ndarray:
+        scores = self._retrieval_cosines(nodes)
+        missing = np.isnan(scores)
+        if missing.any() and self.embed_model is not None:
+            query_embedding = query_bundle.embedding or await self.embed_model.aget_query_embedding(
+                query_bundle.query_str
+            )
+            vectors = await self.embed_model.aget_text_embedding_batch(self._texts(nodes, missing))
+            scores[missing] = self._cosine(vectors, query_embedding)
+        return np.nan_to_num(scores, nan=0.0)
+
+    def _fuse(self, nodes: List[NodeWithScore], query_bundle: QueryBundle, dense: np.ndarray) -> np.ndarray:
+        lexical = bm25_scores(
+            query_bundle.query_str,
+            [node.node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes],
+        )
+        return self.alpha * _min_max(dense) + (1 - self.alpha) * _min_max(lexical)
+
+    def score(self, nodes: List[NodeWithScore], query_bundle: QueryBundle) -> np.ndarray:
+        return self._fuse(nodes, query_bundle, self._dense_scores(nodes, query_bundle))
+
+    def is_ambiguous(self, fused: np.ndarray) -> bool:
+        if len(fused) <= self.top_n:
+            return False
+        ordered = np.sort(fused)[::-1]
+        return float(ordered[self.top_n - 1] - ordered[self.top_n]) < self.ambiguity_margin
+
+    def _rank(self, nodes: List[NodeWithScore], fused: np.ndarray) -> List[NodeWithScore]:
+        order = np.argsort(-fused)[: self.top_n]
+        return [NodeWithScore(node=nodes[i].node, score=float(fused[i])) for i in order]
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("Query bundle must be provided.")
+        if not nodes:
+            return []
+        fused = self.score(nodes, query_bundle)
+        if self.fallback is not None and self.is_ambiguous(fused):
+            return self.fallback.postprocess_nodes(nodes, query_bundle=query_bundle)
+        return self._rank(nodes, fused)
+
+    async def apostprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+        query_str: Optional[str] = None,
+    ) -> List[NodeWithScore]:
+        """Same as postprocess_nodes, but an escalation never blocks the event loop."""
+        if query_str is not None and query_bundle is None:
+            query_bundle = QueryBundle(query_str)
+        if query_bundle is None:
+            raise ValueError("Query bundle must be provided.")
+        if not nodes:
+            return []
+        fused = self._fuse(nodes, query_bundle, await self._adense_scores(nodes, query_bundle))
+        if self.fallback is None or not self.is_ambiguous(fused):
+            return self._rank(nodes, fused)
+
+        if hasattr(self.fallback, "apostprocess_nodes"):
+            return await self.fallback.apostprocess_nodes(nodes, query_bundle=query_bundle)
+        return await asyncio.to_thread(
+            self.fallback.postprocess_nodes, nodes, query_bundle=query_bundle
+        )
@@ -0,0 +1,119 @@
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms.llm import LLM
+
+
+def openai_llm_factory(registry: "ResourceRegistry", model: Optional[str], **kwargs: Any) -> LLM:
+    from llama_index.llms.openai import OpenAI
+
+    if model is not None:
+        kwargs["model"] = model
+    return OpenAI(
+        http_client=registry.http_client,
+        async_http_client=registry.async_http_client,
+        **kwargs,
+    )
+
+
+def openai_embedding_factory(registry: "ResourceRegistry", model_name: str, **kwargs: Any) -> BaseEmbedding:
+    from llama_index.embeddings.openai import OpenAIEmbedding
+
+    return OpenAIEmbedding(
+        model_name=model_name,
+        http_client=registry.http_client,
+        async_http_client=registry.async_http_client,
+        **kwargs,
+    )
+
+
+class ResourceRegistry:
+    """
+    Clients shared by the steps of a workflow (and by several workflows, if handed
+    the same registry): LLMs, embedding models, synthesizers and the httpx connection
+    pools underneath them. Everything is created on first use and reused afterwards,
+    so requests keep their HTTP connections warm. Close it on shutdown with
+    `await registry.aclose()` or use it as an async context manager.
+
+    `llm_factory` / `embed_model_factory` decide what backs `llm()` and `embed_model()`,
+    OpenAI by default.
+    """
+
+    def __init__(
+        self,
+        llm_factory: Callable[..., LLM] = openai_llm_factory,
+        embed_model_factory: Callable[..., BaseEmbedding] = openai_embedding_factory,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        timeout: float = 60.0,
+    ) -> None:
+        self.llm_factory = llm_factory
+        self.embed_model_factory = embed_model_factory
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._timeout = timeout
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+        self._resources: Dict[str, Any] = {}
+
+    @property
+    def http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self._limits, timeout=self._timeout)
+        return self._http_client
+
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        if self._async_http_client is None:
+            self._async_http_client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+        return self._async_http_client
+
+    def get(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Return the resource stored under `key`, creating it with `factory` the first time."""
+        if key not in self._resources:
+            self._resources[key] = factory()
+        return self._resources[key]
+
+    def register(self, key: str, resource: Any) -> None:
+        self._resources[key] = resource
+
+    @staticmethod
+    def _key(kind: str, name: Optional[str], kwargs: Dict[str, Any]) -> str:
+        return f"{kind}:{name}:" + ",".join(f"{k}={kwargs[k]!r}" for k in sorted(kwargs))
+
+    def llm(self, model: Optional[str] = None, **kwargs: Any) -> LLM:
+        return self.get(
+            self._key("llm", model, kwargs), lambda: self.llm_factory(self, model, **kwargs)
+        )
+
+    def embed_model(self, model_name: str = "text-embedding-3-small", **kwargs: Any) -> BaseEmbedding:
+        return self.get(
+            self._key("embed_model", model_name, kwargs),
+            lambda: self.embed_model_factory(self, model_name, **kwargs),
+        )
+
+    async def aclose(self) -> None:
+        for resource in self._resources.values():
+            close = getattr(resource, "close", None)
+            # only plain clients, llama_index components have no close()
+            if callable(close) and not isinstance(resource, (LLM, BaseEmbedding)):
+                result = close()
+                if hasattr(result, "__await__"):
+                    await result
+        self._resources.clear()
+        if self._async_http_client is not None:
+            await self._async_http_client.aclose()
+            self._async_http_client = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+
+    async def __aenter__(self) -> "ResourceRegistry":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.llms import ChatMessage
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.storage.chat_store import BaseChatStore, SimpleChatStore
+
+
+@dataclass
+class Session:
+    session_id: str
+    memory: ChatMemoryBuffer
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SessionStore:
+    """
+    Conversation memory per session id. Messages live in `chat_store` under the session
+    id as key, so any llama_index chat store works (SimpleChatStore in memory by default,
+    Redis, Postgres, ... to survive restarts or share sessions between processes).
+
+    At most `max_sessions` sessions are kept, least recently used evicted first, and a
+    session idle for `ttl` seconds is evicted on the next access. With `evict_history`
+    the evicted session's messages are deleted from the chat store too; turn it off when
+    the store expires keys by itself.
+    """
+
+    def __init__(
+        self,
+        memory_factory: Optional[Callable[[BaseChatStore, str], ChatMemoryBuffer]] = None,
+        chat_store: Optional[BaseChatStore] = None,
+        ttl: float = 3600.0,
+        max_sessions: int = 10000,
+        evict_history: bool = True,
+    ) -> None:
+        self.memory_factory = memory_factory
+        self.chat_store = chat_store or SimpleChatStore()
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.evict_history = evict_history
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _evict(self, session_id: str) -> None:
+        self._sessions.pop(session_id)
+        self.evictions += 1
+        if self.evict_history:
+            self.chat_store.delete_messages(session_id)
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        # ordered by last use, so expired sessions are all at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self.ttl:
+                break
+            self._evict(oldest.session_id)
+
+    def get(self, session_id: str) -> Session:
+        self._purge()
+        session = self._sessions.get(session_id)
+        if session is None:
+            if self.memory_factory is None:
+                memory = ChatMemoryBuffer.from_defaults(chat_store=self.chat_store, chat_store_key=session_id)
+            else:
+                memory = self.memory_factory(self.chat_store, session_id)
+            session = Session(session_id, memory)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._evict(next(iter(self._sessions)))
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def commit(self, session_id: str, messages: List[ChatMessage]) -> None:
+        """Append the messages of a finished turn in one go, so turns never interleave."""
+        session = self.get(session_id)
+        async with session.lock:
+            for message in messages:
+                session.memory.put(message)
+
+    def end(self, session_id: str) -> None:
+        if session_id in self._sessions:
+            self._evict(session_id)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "evictions": self.evictions}
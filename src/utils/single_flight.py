@@ -0,0 +1,240 @@
+"""
+Collapsing identical LLM requests: concurrent calls with the same model, prompt and
+parameters share one upstream call, and deterministic (temperature 0) completions can be
+answered from a persistent cache:
+
+    coalescer = LLMCoalescer(cache=CompletionCache("completions.sqlite"))
+    resources = ResourceRegistry(llm_factory=coalescer.factory(guard.factory(openai_llm_factory)))
+
+Wrap outside an LLMGuard as above, so requests that join an in-flight call don't take
+a slot or rate limit budget. `acomplete` and `achat` are coalesced; streams and tool
+calling pass through.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence
+
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, CompletionResponse
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.llm import LLM
+
+from src.utils.guarded_llm import DelegatingLLM, unwrap_llm
+
+
+class SingleFlight:
+    """
+    At most one call per key in flight; callers arriving meanwhile get its result.
+    If the caller making the call is cancelled, one of the waiting callers makes it instead.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        while key in self._pending:
+            future = self._pending[key]
+            self.followers += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the leader was cancelled, not us: join whoever took over, or take over
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                self.followers -= 1
+
+        self.leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody else may be waiting, don't log "exception never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._pending[key]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.followers
+        return {
+            "in_flight": len(self._pending),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_rate": self.followers / calls if calls else 0.0,
+        }
+
+
+class CompletionCache:
+    """
+    Completion texts by request key: an in-memory LRU of `max_memory_items` and an
+    optional SQLite file (`path`) so they survive restarts. Safe to share between threads.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_items: int = 10_000) -> None:
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value, default=str)),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def request_key(llm: LLM, kind: str, payload: Any, kwargs: Dict[str, Any]) -> str:
+    """Same key for the same model, sampling parameters, prompt and call options."""
+    inner = unwrap_llm(llm)
+    params = {
+        "class": inner.class_name(),
+        "model": inner.metadata.model_name,
+        "temperature": getattr(inner, "temperature", None),
+        "max_tokens": getattr(inner, "max_tokens", None),
+        "additional_kwargs": getattr(inner, "additional_kwargs", None),
+    }
+    data = json.dumps([kind, params, payload, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class LLMCoalescer:
+    """
+    The SingleFlight and optional CompletionCache shared by every CoalescingLLM it wraps.
+    Only completions of temperature 0 calls are cached, others would pin one sample.
+    """
+
+    def __init__(self, cache: Optional[CompletionCache] = None) -> None:
+        self.flight = SingleFlight()
+        self.cache = cache
+
+    def wrap(self, llm: LLM) -> "CoalescingLLM":
+        return CoalescingLLM.wrap(llm, self)
+
+    def factory(self, llm_factory: Callable[..., LLM]) -> Callable[..., LLM]:
+        """`llm_factory` for ResourceRegistry, with every LLM it makes coalesced."""
+
+        def coalescing_factory(registry: Any, model: Optional[str], **kwargs: Any) -> LLM:
+            return self.wrap(llm_factory(registry, model, **kwargs))
+
+        return coalescing_factory
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        stats = {"single_flight": self.flight.stats}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats
+        return stats
+
+
+class CoalescingLLM(DelegatingLLM):
+    """Delegates to `llm`, identical concurrent `acomplete` / `achat` calls made once."""
+
+    _coalescer: LLMCoalescer = PrivateAttr()
+
+    @classmethod
+    def wrap(cls, llm: LLM, coalescer: LLMCoalescer) -> "CoalescingLLM":
+        coalescing = cls._wrapping(llm)
+        coalescing._coalescer = coalescer
+        return coalescing
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CoalescingLLM"
+
+    @property
+    def coalescer(self) -> LLMCoalescer:
+        return self._coalescer
+
+    def _deterministic(self, kwargs: Dict[str, Any]) -> bool:
+        return kwargs.get("temperature", getattr(unwrap_llm(self.llm), "temperature", None)) == 0
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        key = request_key(self.llm, "complete", [prompt, formatted], kwargs)
+        cache = self._coalescer.cache if self._deterministic(kwargs) else None
+
+        async def call() -> CompletionResponse:
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                return CompletionResponse(text=cached["text"], additional_kwargs=cached["additional_kwargs"])
+            response = await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+            if cache is not None:
+                cache.put(key, {"text": response.text, "additional_kwargs": response.additional_kwargs})
+            return response
+
+        response = await self._coalescer.flight.do(key, call)
+        # every caller gets its own copy, callers may edit theirs (nested fields included)
+        return response.model_copy(deep=True)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        payload = [[message.role.value, message.content, message.additional_kwargs] for message in messages]
+        key = request_key(self.llm, "chat", payload, kwargs)
+        response = await self._coalescer.flight.do(key, lambda: self.llm.achat(messages, **kwargs))
+        return response.model_copy(deep=True)
@@ -0,0 +1,44 @@
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+
+# keeps part numbers / error codes such as "E-1042" or "v2.3.1" in one token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def bm25_scores(
+    query: str,
+    texts: Sequence[str],
+    k1: float = 1.5,
+    b: float = 0.75,
+) -> np.ndarray:
+    """
+    BM25 of `query` against a small candidate set, statistics are taken from the
+    candidates themselves. Only query terms are counted, so this stays a
+    (docs x query terms) matrix.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not texts or not terms:
+        return np.zeros(len(texts), dtype=np.float32)
+
+    index = {term: j for j, term in enumerate(terms)}
+    tf = np.zeros((len(texts), len(terms)), dtype=np.float32)
+    lengths = np.empty(len(texts), dtype=np.float32)
+    for i, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths[i] = len(tokens)
+        for token in tokens:
+            j = index.get(token)
+            if j is not None:
+                tf[i, j] += 1
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+    return ((tf * (k1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
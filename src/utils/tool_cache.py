@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from llama_index.core.tools import ToolOutput
+
+
+def tool_cache_key(tool_name: str, kwargs: Dict[str, Any]) -> str:
+    """Same key whatever the argument order or whitespace the LLM produced."""
+    return tool_name + ":" + json.dumps(kwargs, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolResultCache:
+    """
+    Memoizes tool outputs by tool name + canonical kwargs, for tools that are
+    deterministic. Entries live for `ttl` seconds (or the per-tool ttl given to `acall`),
+    at most `max_entries` are kept, least recently used evicted first. Identical calls
+    in flight at the same time share one execution; if the caller running it is
+    cancelled, one of the others runs it instead. Failed calls are not cached.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1024) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, ToolOutput]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get(self, key: str) -> Optional[ToolOutput]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, output = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return output
+
+    def put(self, key: str, output: ToolOutput, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), output)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def acall(
+        self,
+        tool_name: str,
+        kwargs: Dict[str, Any],
+        call: Callable[[], Awaitable[ToolOutput]],
+        ttl: Optional[float] = None,
+    ) -> ToolOutput:
+        key = tool_cache_key(tool_name, kwargs)
+        while True:
+            output = self.get(key)
+            if output is not None:
+                self.hits += 1
+                return output
+            future = self._pending.get(key)
+            if future is None:
+                break
+            self.hits += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the caller running the tool was cancelled, not us: look again, and run it
+                # ourselves unless another waiter already took over
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            output = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody else may be waiting, don't log "exception never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(output)
+            self.put(key, output, ttl)
+            return output
+        finally:
+            del self._pending[key]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
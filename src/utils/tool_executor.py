@@ -0,0 +1,89 @@
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from llama_index.core.tools import FunctionTool, ToolOutput
+from llama_index.core.tools.function_tool import sync_to_async
+from llama_index.core.tools.types import AsyncBaseTool, BaseTool, BaseToolAsyncAdapter
+
+# FunctionTool(fn=...) without an async_fn gets sync_to_async(fn), which runs fn on the
+# default executor; every such wrapper shares this code object, whatever it is named
+_SYNC_TO_ASYNC_CODE = sync_to_async(lambda: None).__code__
+
+
+def is_native_async(tool: BaseTool) -> bool:
+    """True when `acall` awaits real async code rather than blocking or hopping to a thread."""
+    if isinstance(tool, FunctionTool):
+        async_fn = tool.async_fn
+        wrapped_sync = getattr(async_fn, "__code__", None) is _SYNC_TO_ASYNC_CODE
+        return inspect.iscoroutinefunction(async_fn) and not wrapped_sync
+    return isinstance(tool, AsyncBaseTool) and not isinstance(tool, BaseToolAsyncAdapter)
+
+
+def _call_fn(fn, kwargs: Dict[str, Any]) -> Any:
+    return fn(**kwargs)
+
+
+class ToolExecutor:
+    """
+    Runs tool calls without blocking the event loop: native async tools are awaited,
+    sync tools go to a bounded thread pool and CPU-bound FunctionTools to a process pool
+    (their function must be picklable, i.e. defined at module level).
+
+    A call that exceeds its timeout raises asyncio.TimeoutError; a sync tool keeps its
+    worker thread until it returns, threads cannot be interrupted.
+    """
+
+    def __init__(self, max_workers: int = 8, max_processes: Optional[int] = None) -> None:
+        self.max_workers = max_workers
+        self.max_processes = max_processes
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def threads(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        return self._threads
+
+    @property
+    def processes(self) -> ProcessPoolExecutor:
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(max_workers=self.max_processes)
+        return self._processes
+
+    async def _run(self, tool: BaseTool, kwargs: Dict[str, Any], cpu_bound: bool) -> ToolOutput:
+        if is_native_async(tool):
+            return await tool.acall(**kwargs)
+
+        loop = asyncio.get_running_loop()
+        if cpu_bound and isinstance(tool, FunctionTool):
+            raw_output = await loop.run_in_executor(
+                self.processes, functools.partial(_call_fn, tool.fn, kwargs)
+            )
+            return ToolOutput(
+                content=str(raw_output),
+                tool_name=tool.metadata.name,
+                raw_input={"args": (), "kwargs": kwargs},
+                raw_output=raw_output,
+            )
+        return await loop.run_in_executor(self.threads, functools.partial(tool, **kwargs))
+
+    async def arun(
+        self,
+        tool: BaseTool,
+        kwargs: Dict[str, Any],
+        timeout: Optional[float] = None,
+        cpu_bound: bool = False,
+    ) -> ToolOutput:
+        return await asyncio.wait_for(self._run(tool, kwargs, cpu_bound), timeout=timeout)
+
+    def close(self) -> None:
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
@@ -0,0 +1,102 @@
+import copy
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.tools.types import BaseTool, ToolMetadata
+
+
+@dataclass
+class CachedToolMetadata(ToolMetadata):
+    """ToolMetadata whose parameter schema is generated once, every caller gets its own copy."""
+
+    _parameters: Optional[dict] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def of(cls, metadata: ToolMetadata) -> "CachedToolMetadata":
+        return cls(**{f.name: getattr(metadata, f.name) for f in fields(ToolMetadata)})
+
+    def get_parameters_dict(self) -> dict:
+        if self._parameters is None:
+            self._parameters = super().get_parameters_dict()
+        # LLM integrations edit the schema they get (OpenAI sets strict / additionalProperties)
+        return copy.deepcopy(self._parameters)
+
+
+class OfferedTool(BaseTool):
+    """Stands in for `tool` when it is offered to an LLM: same metadata, schema cached."""
+
+    def __init__(self, tool: BaseTool) -> None:
+        self.tool = tool
+        self._metadata = CachedToolMetadata.of(tool.metadata)
+
+    @property
+    def metadata(self) -> ToolMetadata:
+        return self._metadata
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.tool(*args, **kwargs)
+
+
+class ToolRegistry:
+    """
+    The agent's tools, indexed once: lookup by name, tool schemas generated on first
+    use (`offered`), and optionally the tools most similar to a query (by embedding of name and
+    description) so only a relevant subset is sent to the LLM. Names in `always_include`
+    are part of every selection.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        embed_model: Optional[BaseEmbedding] = None,
+        always_include: Iterable[str] = (),
+    ) -> None:
+        self.tools = list(tools)
+        self.by_name: Dict[str, BaseTool] = {tool.metadata.get_name(): tool for tool in self.tools}
+        self.embed_model = embed_model
+        self.always_include = [name for name in always_include if name in self.by_name]
+        self._offered: Dict[str, OfferedTool] = {name: OfferedTool(tool) for name, tool in self.by_name.items()}
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def get(self, name: str) -> Optional[BaseTool]:
+        return self.by_name.get(name)
+
+    def offered(self, names: Optional[Sequence[str]] = None) -> List[BaseTool]:
+        """
+        The tools to hand to `achat_with_tools`: any LLM builds its request from them as
+        usual, but the parameter schema of each tool is only generated once.
+        """
+        return [self._offered[name] for name in (names if names is not None else self.by_name)]
+
+    @staticmethod
+    def _tool_text(tool: BaseTool) -> str:
+        return f"{tool.metadata.get_name()}: {tool.metadata.description}"
+
+    async def _tool_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            vectors = await self.embed_model.aget_text_embedding_batch(
+                [self._tool_text(tool) for tool in self.tools]
+            )
+            matrix = np.asarray(vectors, dtype=np.float32)
+            self._matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return self._matrix
+
+    async def aselect(self, query: str, top_k: int) -> List[BaseTool]:
+        """The `top_k` tools closest to `query` plus `always_include`, in registry order."""
+        if self.embed_model is None or top_k >= len(self.tools):
+            return list(self.tools)
+        matrix = await self._tool_matrix()
+        q = np.asarray(await self.embed_model.aget_query_embedding(query), dtype=np.float32)
+        scores = matrix @ (q / max(float(np.linalg.norm(q)), 1e-12))
+        chosen = set(np.argpartition(-scores, top_k - 1)[:top_k].tolist()) if top_k > 0 else set()
+        chosen.update(self.tools.index(self.by_name[name]) for name in self.always_include)
+        return [self.tools[i] for i in sorted(chosen)]
@@ -0,0 +1,456 @@
+"""
+Where does a workflow run spend its time? `WorkflowTracer` hooks into llama_index's
+instrumentation dispatcher and records, per run and per step, wall time, queue wait,
+LLM calls, prompt/completion tokens and bytes. No workflow code has to change:
+
+    tracer = WorkflowTracer().install()
+    await RagWorkflow(...).run(query=..., index=index)
+    tracer.dump_json("traces.json")      # OpenTelemetry-style spans
+    print(tracer.prometheus())           # text exposition format, e.g. for a /metrics route
+
+Queue wait is the time from an event being sent to a step picking it up. Events
+returned by a step are stamped when the step ends, events sent with `ctx.send_event`
+when they are sent, the StartEvent when the run starts.
+"""
+import bisect
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.instrumentation.events.llm import (
+    LLMChatEndEvent,
+    LLMChatStartEvent,
+    LLMCompletionEndEvent,
+    LLMCompletionStartEvent,
+)
+from llama_index.core.instrumentation.span.simple import SimpleSpan
+from llama_index.core.instrumentation.span_handlers.base import BaseSpanHandler
+from llama_index.core.workflow import Context, Event, Workflow
+
+from src.utils.packing import count_tokens
+
+
+INF = 'le="+Inf"'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+@dataclass
+class StepTrace:
+    span_id: str
+    name: str
+    start: float
+    end: Optional[float] = None
+    queue_wait: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    prompt_bytes: int = 0
+    completion_bytes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+
+@dataclass
+class RunTrace:
+    run_id: str
+    workflow: str
+    start: float
+    end: Optional[float] = None
+    steps: List[StepTrace] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["duration"] = self.duration
+        for step, trace in zip(data["steps"], self.steps):
+            step["duration"] = trace.duration
+        return data
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def llm_usage(response: Any, prompt: str, text: str) -> Tuple[int, int]:
+    """(prompt, completion) tokens: what the API reported, counted locally otherwise."""
+    kwargs = getattr(response, "additional_kwargs", None) or {}
+    if "prompt_tokens" in kwargs and "completion_tokens" in kwargs:
+        return int(kwargs["prompt_tokens"]), int(kwargs["completion_tokens"])
+    usage = getattr(getattr(response, "raw", None), "usage", None)
+    if usage is None and isinstance(getattr(response, "raw", None), dict):
+        usage = response.raw.get("usage")
+    if isinstance(usage, dict):
+        usage = type("Usage", (), usage)
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return int(usage.prompt_tokens), int(usage.completion_tokens or 0)
+    return count_tokens(prompt), count_tokens(text)
+
+
+class _LLMEvents(BaseEventHandler):
+    tracer: Any = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "WorkflowTracerLLMEvents"
+
+    def handle(self, event: BaseEvent, **kwargs: Any) -> None:
+        if isinstance(event, (LLMChatStartEvent, LLMCompletionStartEvent)):
+            self.tracer.on_llm_start(event)
+        elif isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+            self.tracer.on_llm_end(event)
+
+
+class WorkflowTracer(BaseSpanHandler[SimpleSpan]):
+    """
+    Span handler recording every Workflow run and step. Finished runs are kept for
+    export (the last `max_runs`), aggregates for `prometheus()` cover all runs since
+    the tracer was installed.
+    """
+
+    def __init__(
+        self,
+        max_runs: int = 1000,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        llm_stream_ttl: float = 600.0,
+    ) -> None:
+        """`llm_stream_ttl`: seconds after which an LLM call that never ended (a stream
+        dropped before its end) is forgotten."""
+        super().__init__(open_spans={}, completed_spans=[], dropped_spans=[], current_span_ids={})
+        self._max_runs = max_runs
+        self._buckets = buckets
+        self._llm_stream_ttl = llm_stream_ttl
+        self._state_lock = threading.Lock()
+        self._parents: Dict[str, Optional[str]] = {}
+        self._runs: Dict[str, RunTrace] = {}
+        self._steps: Dict[str, Tuple[RunTrace, StepTrace]] = {}
+        # per run: id(event) -> when it was sent; the run's context keeps its events alive
+        self._sent: Dict[str, Dict[int, float]] = {}
+        # LLM calls in flight, oldest first: span id -> (started, run, step)
+        self._llm_calls: "OrderedDict[str, Tuple[float, RunTrace, StepTrace]]" = OrderedDict()
+        self._finished: Deque[RunTrace] = deque(maxlen=max_runs)
+        self._histograms: Dict[Tuple[str, ...], _Histogram] = {}
+        self._counters: Dict[Tuple[str, ...], float] = {}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "WorkflowTracer"
+
+    def install(self) -> "WorkflowTracer":
+        dispatcher = get_dispatcher()
+        dispatcher.add_span_handler(self)
+        dispatcher.add_event_handler(_LLMEvents(tracer=self))
+        return self
+
+    @property
+    def runs(self) -> List[RunTrace]:
+        return list(self._finished)
+
+    def reset(self) -> List[RunTrace]:
+        """Forget finished runs and aggregates, returning the runs. Open runs are kept."""
+        with self._state_lock:
+            runs = list(self._finished)
+            self._finished.clear()
+            self._histograms.clear()
+            self._counters.clear()
+        return runs
+
+    # --- span handler ------------------------------------------------------------------
+
+    def new_span(
+        self,
+        id_: str,
+        bound_args: inspect.BoundArguments,
+        instance: Optional[Any] = None,
+        parent_span_id: Optional[str] = None,
+        tags: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Optional[SimpleSpan]:
+        now = time.time()
+        method = id_.partition("-")[0].rpartition(".")[2]
+        with self._state_lock:
+            self._parents[id_] = parent_span_id
+            if not isinstance(instance, Workflow):
+                return None
+            if method == "run":
+                self._runs[id_] = RunTrace(run_id=id_, workflow=type(instance).__name__, start=now)
+                self._sent[id_] = {}
+            elif not method.startswith("_") and parent_span_id in self._runs:
+                run = self._runs[parent_span_id]
+                step = StepTrace(span_id=id_, name=method, start=now)
+                sent = self._sent[parent_span_id]
+                for arg in bound_args.arguments.values():
+                    if isinstance(arg, Context):
+                        self._watch(arg, parent_span_id)
+                    elif isinstance(arg, Event):
+                        # not stamped: the StartEvent, sent as the run started
+                        step.queue_wait = max(now - sent.get(id(arg), run.start), 0.0)
+                run.steps.append(step)
+                self._steps[id_] = (run, step)
+        return None
+
+    def _watch(self, ctx: Context, run_id: str) -> None:
+        """Stamp the events steps send through `ctx` mid-step; call with the lock held."""
+        if "_traced_run_id" not in vars(ctx):
+            send_event = ctx.send_event
+
+            def stamped_send_event(message: Event, step: Optional[str] = None) -> None:
+                now = time.time()
+                with self._state_lock:
+                    sent = self._sent.get(ctx._traced_run_id)
+                    if sent is not None:
+                        sent.setdefault(id(message), now)
+                send_event(message, step=step)
+
+            ctx.send_event = stamped_send_event
+        # a context handed to a later run belongs to that run from now on
+        ctx._traced_run_id = run_id
+
+    def _close(self, id_: str, err: Optional[BaseException], result: Any = None) -> None:
+        now = time.time()
+        with self._state_lock:
+            self._parents.pop(id_, None)
+            if id_ in self._steps:
+                run, step = self._steps.pop(id_)
+                step.end = now
+                step.error = repr(err) if err is not None else None
+                if isinstance(result, Event) and run.run_id in self._sent:
+                    # the workflow sends what a step returns right after the step ends
+                    self._sent[run.run_id].setdefault(id(result), now)
+                self._observe_step(run, step)
+            elif id_ in self._runs:
+                run = self._runs.pop(id_)
+                run.end = now
+                run.error = repr(err) if err is not None else None
+                self._sent.pop(id_, None)
+                self._finished.append(run)
+                self._observe_run(run)
+
+    def prepare_to_exit_span(
+        self,
+        id_: str,
+        bound_args: inspect.BoundArguments,
+        instance: Optional[Any] = None,
+        result: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._close(id_, None, result)
+
+    def prepare_to_drop_span(
+        self,
+        id_: str,
+        bound_args: inspect.BoundArguments,
+        instance: Optional[Any] = None,
+        err: Optional[BaseException] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._close(id_, err)
+
+    # --- llm events ------------------------------------------------------------------
+
+    def _step_of(self, span_id: Optional[str]) -> Optional[Tuple[RunTrace, StepTrace]]:
+        # the LLM call has its own span, walk up to the step that made it
+        while span_id is not None and span_id not in self._steps:
+            span_id = self._parents.get(span_id)
+        return self._steps.get(span_id) if span_id is not None else None
+
+    def on_llm_start(self, event: BaseEvent) -> None:
+        # streamed responses end after the step returned and its span closed,
+        # so the step is looked up while the call starts
+        now = time.time()
+        with self._state_lock:
+            # a stream dropped before its end never sends an end event
+            while self._llm_calls:
+                started = next(iter(self._llm_calls.values()))[0]
+                if now - started < self._llm_stream_ttl:
+                    break
+                self._llm_calls.popitem(last=False)
+            owner = self._step_of(event.span_id)
+            if owner is not None:
+                self._llm_calls[event.span_id] = (now, *owner)
+
+    def on_llm_end(self, event: BaseEvent) -> None:
+        if isinstance(event, LLMChatEndEvent):
+            prompt = "\n".join(str(m.content or "") for m in event.messages)
+            text = str(event.response.message.content or "") if event.response else ""
+        else:
+            prompt, text = event.prompt, event.response.text if event.response else ""
+        prompt_tokens, completion_tokens = llm_usage(event.response, prompt, text)
+        prompt_bytes, completion_bytes = len(prompt.encode("utf-8")), len(text.encode("utf-8"))
+
+        with self._state_lock:
+            call = self._llm_calls.pop(event.span_id, None)
+            owner = call[1:] if call is not None else self._step_of(event.span_id)
+            if owner is None:
+                return
+            run, step = owner
+            step.llm_calls += 1
+            step.prompt_tokens += prompt_tokens
+            step.completion_tokens += completion_tokens
+            step.prompt_bytes += prompt_bytes
+            step.completion_bytes += completion_bytes
+            labels = (run.workflow, step.name)
+            self._add("workflow_llm_calls_total", labels, 1)
+            self._add("workflow_llm_prompt_tokens_total", labels, prompt_tokens)
+            self._add("workflow_llm_completion_tokens_total", labels, completion_tokens)
+            self._add("workflow_llm_prompt_bytes_total", labels, prompt_bytes)
+            self._add("workflow_llm_completion_bytes_total", labels, completion_bytes)
+
+    # --- aggregates ------------------------------------------------------------------
+
+    def _observe(self, name: str, labels: Tuple[str, ...], value: float) -> None:
+        key = (name, *labels)
+        if key not in self._histograms:
+            self._histograms[key] = _Histogram(self._buckets)
+        self._histograms[key].observe(value)
+
+    def _add(self, name: str, labels: Tuple[str, ...], value: float) -> None:
+        key = (name, *labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe_step(self, run: RunTrace, step: StepTrace) -> None:
+        labels = (run.workflow, step.name)
+        self._observe("workflow_step_seconds", labels, step.duration)
+        self._observe("workflow_step_queue_wait_seconds", labels, step.queue_wait)
+        self._add("workflow_step_errors_total", labels, step.error is not None)
+
+    def _observe_run(self, run: RunTrace) -> None:
+        self._observe("workflow_run_seconds", (run.workflow,), run.duration)
+        self._add("workflow_run_errors_total", (run.workflow,), run.error is not None)
+
+    # --- export ----------------------------------------------------------------------
+
+    def summary(self, runs: Optional[List[RunTrace]] = None) -> Dict[str, Dict[str, Any]]:
+        """Per "Workflow.step": count, mean and p50/p95/p99 seconds over `runs` (the kept runs)."""
+        durations: Dict[str, List[float]] = {}
+        waits: Dict[str, List[float]] = {}
+        for run in self.runs if runs is None else runs:
+            durations.setdefault(run.workflow, []).append(run.duration)
+            for step in run.steps:
+                key = f"{run.workflow}.{step.name}"
+                durations.setdefault(key, []).append(step.duration)
+                waits.setdefault(key, []).append(step.queue_wait)
+
+        def pct(values: List[float], q: float) -> float:
+            return round(values[min(int(q * len(values)), len(values) - 1)], 6)
+
+        summary = {}
+        for key, values in sorted(durations.items()):
+            values = sorted(values)
+            summary[key] = {
+                "count": len(values),
+                "mean_s": round(sum(values) / len(values), 6),
+                "p50_s": pct(values, 0.50),
+                "p95_s": pct(values, 0.95),
+                "p99_s": pct(values, 0.99),
+            }
+            if key in waits:
+                summary[key]["queue_wait_mean_s"] = round(sum(waits[key]) / len(waits[key]), 6)
+        return summary
+
+    def to_otel(self, runs: Optional[List[RunTrace]] = None) -> List[Dict[str, Any]]:
+        """Finished runs as OpenTelemetry-style spans, one trace per run."""
+        spans = []
+        for run in self.runs if runs is None else runs:
+            trace_id = uuid.uuid5(uuid.NAMESPACE_OID, run.run_id).hex
+            run_span_id = trace_id[:16]
+            spans.append(
+                {
+                    "traceId": trace_id,
+                    "spanId": run_span_id,
+                    "parentSpanId": None,
+                    "name": f"{run.workflow}.run",
+                    "startTimeUnixNano": int(run.start * 1e9),
+                    "endTimeUnixNano": int((run.end or run.start) * 1e9),
+                    "attributes": {"workflow.name": run.workflow},
+                    "status": {"code": "ERROR" if run.error else "OK", "message": run.error or ""},
+                }
+            )
+            for step in run.steps:
+                spans.append(
+                    {
+                        "traceId": trace_id,
+                        "spanId": uuid.uuid5(uuid.NAMESPACE_OID, step.span_id).hex[:16],
+                        "parentSpanId": run_span_id,
+                        "name": f"{run.workflow}.{step.name}",
+                        "startTimeUnixNano": int(step.start * 1e9),
+                        "endTimeUnixNano": int((step.end or step.start) * 1e9),
+                        "attributes": {
+                            "workflow.name": run.workflow,
+                            "workflow.step": step.name,
+                            "workflow.step.queue_wait_s": step.queue_wait,
+                            "llm.calls": step.llm_calls,
+                            "llm.usage.prompt_tokens": step.prompt_tokens,
+                            "llm.usage.completion_tokens": step.completion_tokens,
+                            "llm.request.bytes": step.prompt_bytes,
+                            "llm.response.bytes": step.completion_bytes,
+                        },
+                        "status": {"code": "ERROR" if step.error else "OK", "message": step.error or ""},
+                    }
+                )
+        return spans
+
+    def dump_json(self, path: str, runs: Optional[List[RunTrace]] = None) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"spans": self.to_otel(runs), "summary": self.summary(runs)}, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def prometheus(self) -> str:
+        """All aggregates in the Prometheus text exposition format."""
+
+        def label_str(key: Tuple[str, ...], extra: str = "") -> str:
+            names = ("workflow", "step")[: len(key) - 1]
+            parts = [f'{n}="{v}"' for n, v in zip(names, key[1:])] + ([extra] if extra else [])
+            return "{" + ",".join(parts) + "}"
+
+        with self._state_lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines: List[str] = []
+        typed = set()
+        for key, histogram in histograms:
+            name = key[0]
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{label_str(key, le)} {cumulative}")
+            lines.append(f"{name}_bucket{label_str(key, INF)} {histogram.count}")
+            lines.append(f"{name}_sum{label_str(key)} {histogram.sum}")
+            lines.append(f"{name}_count{label_str(key)} {histogram.count}")
+        for key, value in counters:
+            name = key[0]
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{label_str(key)} {value:g}")
+        return "\n".join(lines) + "\n"
@@ -1,12 +1,18 @@
-from typing import Any, List 
+import asyncio
+from typing import Any, Dict, List 
 
-from llama_index.core.workflow import Workflow, Event, StartEvent, StopEvent, step
+from llama_index.core.workflow import Context, Workflow, Event, StartEvent, StopEvent, step
 from llama_index.core.llms import ChatMessage
 from llama_index.core.llms.function_calling import FunctionCallingLLM 
 from llama_index.core.tools import ToolSelection,ToolOutput
 from llama_index.core.tools.types import BaseTool
-from llama_index.core.memory import ChatMemoryBuffer 
-from llama_index.llms.openai import OpenAI 
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from src.utils.resources import ResourceRegistry
+from src.utils.tool_executor import ToolExecutor
+from src.utils.tool_cache import ToolResultCache
+from src.utils.memory import CompactingMemory
+from src.utils.sessions import SessionStore
+from src.utils.tool_registry import ToolRegistry
 
 
 
@@ -14,6 +20,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+DEFAULT_SESSION = "default"
+
 class InputEvent(Event):
     input: List[ChatMessage]
 
@@ -37,6 +45,20 @@ class FunctionCallingAgent(Workflow):
                  *args: Any , 
                  llm: FunctionCallingLLM | None = None,
                  tools: List[BaseTool] | None = None,
+                 resources: ResourceRegistry | None = None,
+                 max_tool_workers: int = 8,
+                 tool_timeout: float | None = 30.0,
+                 tool_timeouts: Dict[str, float] | None = None,
+                 cpu_bound_tools: List[str] | None = None,
+                 cacheable_tools: List[str] | Dict[str, float] | None = None,
+                 tool_cache: ToolResultCache | None = None,
+                 memory_token_limit: int | None = None,
+                 keep_recent_turns: int = 2,
+                 max_tool_output_tokens: int = 1000,
+                 sessions: SessionStore | None = None,
+                 tool_top_k: int | None = None,
+                 tool_embed_model: BaseEmbedding | None = None,
+                 always_include_tools: List[str] | None = None,
                  **kwargs: Any 
                  )-> None:
         """
@@ -46,18 +68,91 @@ class FunctionCallingAgent(Workflow):
             - chat history, by including memory buffer 
             - sources which includes the outouts of the executed tools  
 
-
+        clients (the default LLM and its connection pool) come from `resources`, pass the
+        same registry to several agents to share them.
+
+        tool calls of one turn run concurrently: async tools are awaited together, sync tools
+        run on a pool of `max_tool_workers` threads, tools named in `cpu_bound_tools` in a
+        process pool. Each call gets `tool_timeout` seconds, or its entry in `tool_timeouts`.
+
+        outputs of deterministic tools named in `cacheable_tools` (a list, or a dict of
+        name -> ttl seconds) are reused for identical arguments, within a run and across
+        runs; pass the same `tool_cache` to several agents to share it.
+
+        memory is a CompactingMemory capped at `memory_token_limit` (default: 3/4 of the
+        LLM's context window): the last `keep_recent_turns` turns are sent as they are,
+        older tool outputs are cut short and no tool output is stored above
+        `max_tool_output_tokens`. Prompt tokens of each LLM call are in the result's
+        "prompt_tokens".
+
+        conversations are kept per `session_id` (passed to `run`, "default" otherwise) in
+        `sessions`, everything else about a run lives in its Context, so one agent can serve
+        many sessions at once. A run's messages are added to its session when it finishes.
+        Pass a SessionStore to pick the chat store (e.g. Redis), ttl and max sessions; its
+        memories are built by the agent unless it has a `memory_factory` of its own
+        (which must return CompactingMemory).
+
+        tools are indexed once in a ToolRegistry, with each tool's schema generated once.
+        With `tool_top_k` only the `tool_top_k` tools whose description is closest to the
+        user's message (embedded with `tool_embed_model`), plus `always_include_tools`,
+        are offered to the LLM in that run.
         """
         super().__init__(*args, **kwargs)
+        self.resources = resources or ResourceRegistry()
         self.tools = tools  or []
-        self.llm = llm or OpenAI()
+        self.llm = llm or self.resources.llm()
         assert self.llm.metadata.is_function_calling_model
 
-        self.memory = ChatMemoryBuffer.from_defaults(llm=self.llm)
-        self.sources = []
+        self.tool_top_k = tool_top_k
+        if tool_top_k is not None and tool_embed_model is None:
+            tool_embed_model = self.resources.embed_model()
+        self.tool_registry = ToolRegistry(
+            self.tools, embed_model=tool_embed_model, always_include=always_include_tools or []
+        )
+
+        self.tool_timeout = tool_timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.cpu_bound_tools = set(cpu_bound_tools or [])
+        cacheable_tools = cacheable_tools or {}
+        if not isinstance(cacheable_tools, dict):
+            cacheable_tools = dict.fromkeys(cacheable_tools)
+        self.cacheable_tools = cacheable_tools
+        if tool_cache is None and cacheable_tools:
+            tool_cache = ToolResultCache()
+        self.tool_cache = tool_cache
+        # the registry shuts the pools down on aclose()
+        self.tool_executor = self.resources.get(
+            f"tool_executor:{max_tool_workers}", lambda: ToolExecutor(max_workers=max_tool_workers)
+        )
+
+        self.memory_token_limit = memory_token_limit
+        self.keep_recent_turns = keep_recent_turns
+        self.max_tool_output_tokens = max_tool_output_tokens
+        self.sessions = sessions if sessions is not None else SessionStore()
+        if self.sessions.memory_factory is None:
+            self.sessions.memory_factory = self._new_memory
+
+    def _new_memory(self, chat_store, session_id: str) -> CompactingMemory:
+        return CompactingMemory.from_defaults(
+            llm=self.llm,
+            token_limit=self.memory_token_limit,
+            keep_recent_turns=self.keep_recent_turns,
+            max_tool_output_tokens=self.max_tool_output_tokens,
+            chat_store=chat_store,
+            chat_store_key=session_id,
+        )
+
+    async def _chat_history(self, ctx: Context, *messages: ChatMessage) -> List[ChatMessage]:
+        """add `messages` to this run's turn, return what the LLM gets to see"""
+        memory = self.sessions.get(await ctx.get("session_id")).memory
+        turn = await ctx.get("turn") + [memory.truncate_tool_output(m) for m in messages]
+        await ctx.set("turn", turn)
+        chat_history, tokens = memory.compact(memory.get_all() + turn)
+        await ctx.set("prompt_tokens", await ctx.get("prompt_tokens") + [tokens])
+        return chat_history
     
     @step 
-    async def prepare_chat_history(self, ev: StartEvent) -> InputEvent:
+    async def prepare_chat_history(self, ctx: Context, ev: StartEvent) -> InputEvent:
 
         """ 
         Here, we take user input, and restructure it in llama index's chat message format.
@@ -65,20 +160,27 @@ class FunctionCallingAgent(Workflow):
 
         """
 
-        self.sources = []
+        session_id = ev.get("session_id", DEFAULT_SESSION)
+        await ctx.set("session_id", session_id)
+        await ctx.set("turn", [])
+        await ctx.set("sources", [])
+        await ctx.set("prompt_tokens", [])
 
         user_message = ev.input 
 
-        user_message = ChatMessage(role="user", content=user_message)
+        tools = self.tools
+        if self.tool_top_k is not None:
+            tools = await self.tool_registry.aselect(user_message, self.tool_top_k)
+        await ctx.set("tool_names", [tool.metadata.get_name() for tool in tools])
 
-        self.memory.put(user_message)
+        user_message = ChatMessage(role="user", content=user_message)
 
-        chat_history = self.memory.get()
+        chat_history = await self._chat_history(ctx, user_message)
 
         return InputEvent(input=chat_history)
        
     @step 
-    async def handle_llm_input(self, ev: InputEvent) -> ToolCallEvent | StopEvent:
+    async def handle_llm_input(self, ctx: Context, ev: InputEvent) -> ToolCallEvent | StopEvent:
         """ 
         Here, we handle the chat history, exctract tool call prompts,
         pack them again in history, then return the extracted tool calls
@@ -86,12 +188,16 @@ class FunctionCallingAgent(Workflow):
         """
         chat_history = ev.input 
 
+        tool_names = await ctx.get("tool_names")
+        # the registry's tools keep their schemas, so they are not regenerated every turn
         response = await self.llm.achat_with_tools(
-            tools = self.tools, 
-            chat_history=chat_history
+            tools = self.tool_registry.offered(tool_names), 
+            chat_history=chat_history,
+            allow_parallel_tool_calls=True,
         )
 
-        self.memory.put(response.message) #appearantly response.messagne returns a ChatMessage
+        turn = await ctx.get("turn") + [response.message] #appearantly response.messagne returns a ChatMessage
+        await ctx.set("turn", turn)
 
 
         tool_calls = self.llm.get_tool_calls_from_response(
@@ -101,16 +207,20 @@ class FunctionCallingAgent(Workflow):
 
 
         if not tool_calls:
+            session_id = await ctx.get("session_id")
+            await self.sessions.commit(session_id, turn)
             return StopEvent(result={
                 "response": response, 
-                "sources": [*self.sources]
+                "sources": [*await ctx.get("sources")],
+                "prompt_tokens": [*await ctx.get("prompt_tokens")],
+                "session_id": session_id,
             })
         
         else: 
             return ToolCallEvent(tool_calls=tool_calls)
         
     @step 
-    async def handle_tool_calls(self, ev: ToolCallEvent) -> InputEvent:
+    async def handle_tool_calls(self, ctx: Context, ev: ToolCallEvent) -> InputEvent:
 
         """ 
         Here, we execute the tools that we previously defined, 
@@ -119,64 +229,73 @@ class FunctionCallingAgent(Workflow):
 
         Eventually, we pack outputs in chat format and share it as InputEvent 
         """
-        tools_msgs = []
-
-
         #tools selected from llm 
         tool_calls = ev.tool_calls
 
-        # all tools 
-        tools_by_name = {tool.metadata.get_name(): tool for tool in self.tools}
+        # all tools, not just the ones offered this run: the history may name others
+        tools_by_name = self.tool_registry.by_name
 
+        # run every call of this turn at once, gather keeps the original order
+        outputs = await asyncio.gather(
+            *(self._call_tool(tools_by_name.get(tool_call.tool_name), tool_call) for tool_call in tool_calls),
+            return_exceptions=True,
+        )
 
-        #iterate through tool_calls 
-        for tool_call in tool_calls:
-            tool = tools_by_name.get(tool_call.tool_name)
+        sources = []
+        tools_msgs = []
+        for tool_call, output in zip(tool_calls, outputs):
             additional_kwargs={
                 "tool_call_id": tool_call.tool_id,
-                "name": tool.metadata.get_name() # should this be the same as tool_call.tool_name
+                "name": tool_call.tool_name
             }
 
             #if tool does not exist, add info to chat messages list, and continue to next tool
-            if not tool:
-                tools_msgs.append(
-                    ChatMessage(
-                        role="tool",
-                        content=f"Tool {tool_call} does not exist.",
-                        additional_kwargs=additional_kwargs
-                    )
+            if tool_call.tool_name not in tools_by_name:
+                content = f"Tool {tool_call} does not exist."
+            elif isinstance(output, asyncio.TimeoutError):
+                timeout = self.tool_timeouts.get(tool_call.tool_name, self.tool_timeout)
+                content = f"Error while executing {tool_call.tool_name}: timed out after {timeout}s"
+            elif isinstance(output, BaseException):
+                # CancelledError too: gather hands it back like any other failure
+                content = f"Error while executing {tool_call.tool_name}: {output}"
+            else:
+                sources.append(output)
+                content = output.content
+
+            tools_msgs.append(
+                ChatMessage(
+                    role="tool",
+                    content=content,
+                    additional_kwargs=additional_kwargs
                 )
+            )
 
-                continue 
-            
-            try: 
-                tool_output = tool(**tool_call.tool_kwargs)
-                self.sources.append(tool_output)
-
-                tools_msgs.append(
-                    ChatMessage(
-                        role="tool",
-                        content=tool_output.content,
-                        additional_kwargs=additional_kwargs
-                    )
-                )
-            except Exception as e: 
-                tools_msgs.append(
-                    ChatMessage(
-                        role="tool",
-                        content=f"Error while executing {tool_call.tool_name}: {e}",
-                        additional_kwargs=additional_kwargs
-                    )
-                )
-
-        
-        for msg in tools_msgs:
-            self.memory.put(msg)
-
-        chat_history = self.memory.get()
+        await ctx.set("sources", await ctx.get("sources") + sources)
+        chat_history = await self._chat_history(ctx, *tools_msgs)
 
         return InputEvent(input=chat_history)
 
+    async def _call_tool(self, tool: BaseTool | None, tool_call: ToolSelection) -> ToolOutput | None:
+        if tool is None:
+            return None
+
+        def call():
+            return self.tool_executor.arun(
+                tool,
+                tool_call.tool_kwargs,
+                timeout=self.tool_timeouts.get(tool_call.tool_name, self.tool_timeout),
+                cpu_bound=tool_call.tool_name in self.cpu_bound_tools,
+            )
+
+        if self.tool_cache is not None and tool_call.tool_name in self.cacheable_tools:
+            return await self.tool_cache.acall(
+                tool_call.tool_name,
+                tool_call.tool_kwargs,
+                call,
+                ttl=self.cacheable_tools[tool_call.tool_name],
+            )
+        return await call()
+
 
 
 
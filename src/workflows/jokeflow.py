@@ -1,34 +1,238 @@
-from src.utils.joke import JokeEvent 
+from src.utils.joke import AdmitEvent, CritiqueEvent, JokeEvent, TopicEvent
 from llama_index.core.workflow import (
+    Context,
     StartEvent,
     StopEvent,
     Workflow,
     step,
 )
-from llama_index.llms.openai import OpenAI
+from src.utils.resources import ResourceRegistry
 from dotenv import load_dotenv
-import os 
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional, Tuple
+import asyncio
+import json
+import os
 
 
 load_dotenv()
 
+# workers per stage; a batch keeps at most `concurrency` topics in flight across both,
+# so `concurrency` cannot go above this
+BATCH_WORKERS = 64
+
+# checkpoints a batch run is appending to, two runs must not write the same file
+_open_checkpoints: set = set()
+
+
+def read_checkpoint(path: str) -> Dict[int, str]:
+    """index -> topic of the topics a previous batch run finished without error"""
+    done: Dict[int, str] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of a crashed run may be cut off
+                continue
+            if record.get("error") is None:
+                done[record["index"]] = record.get("topic")
+    return done
+
+
+def _ends_mid_line(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except OSError:
+        # missing or empty
+        return False
+
+
+def _pending(topics: Iterable[str], done: Dict[int, str], stats: Dict[str, int]) -> Iterator[Tuple[int, str]]:
+    for i, topic in enumerate(topics):
+        # same position but another topic: the list changed since the checkpoint was written
+        if done.get(i) == topic:
+            stats["skipped"] += 1
+            continue
+        yield i, topic
 
 
 class JokeFlow(Workflow):
-    llm = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    """
+    One topic per run: `await JokeFlow().run(topic="cats")` returns the critique.
+
+    Batch mode, for many topics: `run(topics=iterable, concurrency=32, checkpoint="jokes.jsonl")`
+    keeps `concurrency` topics in flight, and generating jokes overlaps critiquing earlier
+    ones. Every finished topic is a CritiqueEvent on the event stream (in completion order)
+    and a line in the JSONL checkpoint, so running again with the same topics and checkpoint
+    skips what is done. A failed topic is recorded with its error and retried on resume.
+    `concurrency` is capped at BATCH_WORKERS, the workers per stage.
+
+    `run_batch` wraps this as an async iterator that only admits a topic when the consumer
+    has taken a result, so a slow consumer slows the batch down instead of buffering it.
+    A consumer that stops early should close it, which stops the run and its checkpoint:
+
+        async with contextlib.aclosing(flow.run_batch(topics, checkpoint="jokes.jsonl")) as results:
+            async for result in results:
+                ...
+
+    Give batch runs `timeout=None`.
+    """
+
+    def __init__(self, *args: Any, resources: ResourceRegistry | None = None, **kwargs: Any) -> None:
+        """the LLM client is taken from `resources` once and reused across runs"""
+        super().__init__(*args, **kwargs)
+        self.resources = resources or ResourceRegistry()
+        # OpenAI reads OPENAI_API_KEY from the environment
+        self.llm = self.resources.llm()
 
     @step
-    async def generate_joke(self, ev: StartEvent) -> JokeEvent:
+    async def start(self, ctx: Context, ev: StartEvent) -> TopicEvent | StopEvent | None:
+        topics = ev.get("topics")
+        await ctx.set("batch", topics is not None)
+        if topics is None:
+            return TopicEvent(topic=ev.topic)
+
+        checkpoint = ev.get("checkpoint")
+        done = read_checkpoint(checkpoint) if checkpoint else {}
+        # one dict, shared by reference and only changed between awaits, so the steps
+        # updating it never race; "in_flight" is dropped from the final result
+        stats = {"skipped": 0, "completed": 0, "failed": 0, "in_flight": 0}
+        await ctx.set("pending", _pending(topics, done, stats))
+        await ctx.set("checkpoint_file", ev.get("checkpoint_file"))
+        await ctx.set("admission", ev.get("admission"))
+        await ctx.set("stats", stats)
+
+        for _ in range(ev.get("concurrency", 32)):
+            if not await self._admit(ctx):
+                break
+        if stats["in_flight"] == 0:
+            return await self._finish(ctx)
+        return None
+
+    @step(num_workers=BATCH_WORKERS)
+    async def generate_joke(self, ctx: Context, ev: TopicEvent) -> JokeEvent | CritiqueEvent:
         topic = ev.topic
 
         prompt = f"Write your best joke about {topic}."
-        response = await self.llm.acomplete(prompt)
-        return JokeEvent(joke=str(response))
+        try:
+            response = await self.llm.acomplete(prompt)
+        except Exception as e:
+            if not await ctx.get("batch"):
+                raise
+            return CritiqueEvent(index=ev.index, topic=topic, error=repr(e))
+        return JokeEvent(joke=str(response), topic=topic, index=ev.index)
 
-    @step
-    async def critique_joke(self, ev: JokeEvent) -> StopEvent:
+    @step(num_workers=BATCH_WORKERS)
+    async def critique_joke(self, ctx: Context, ev: JokeEvent) -> StopEvent | CritiqueEvent:
         joke = ev.joke
 
         prompt = f"Give a thorough analysis and critique of the following joke: {joke}"
-        response = await self.llm.acomplete(prompt)
-        return StopEvent(result=str(response))
+        try:
+            response = await self.llm.acomplete(prompt)
+        except Exception as e:
+            if not await ctx.get("batch"):
+                raise
+            return CritiqueEvent(index=ev.index, topic=ev.topic, joke=joke, error=repr(e))
+        if not await ctx.get("batch"):
+            return StopEvent(result=str(response))
+        return CritiqueEvent(index=ev.index, topic=ev.topic, joke=joke, critique=str(response))
+
+    @step(num_workers=1)
+    async def collect(self, ctx: Context, ev: CritiqueEvent) -> AdmitEvent:
+        """one worker, so checkpoint lines and counters are never interleaved"""
+        f = await ctx.get("checkpoint_file")
+        if f is not None:
+            f.write(json.dumps(ev.model_dump()) + "\n")
+            f.flush()
+        stats = await ctx.get("stats")
+        stats["failed" if ev.error else "completed"] += 1
+        stats["in_flight"] -= 1
+        ctx.write_event_to_stream(ev)
+        return AdmitEvent()
+
+    @step(num_workers=1)
+    async def admit(self, ctx: Context, ev: AdmitEvent) -> StopEvent | None:
+        """
+        A step of its own, so waiting for run_batch's consumer never holds up collect.
+        One worker: topics are admitted in order and the run finishes once.
+        """
+        await self._admit(ctx)
+        stats = await ctx.get("stats")
+        if stats["in_flight"] == 0 and not await ctx.get("finished", default=False):
+            await ctx.set("finished", True)
+            return await self._finish(ctx)
+        return None
+
+    async def _admit(self, ctx: Context) -> bool:
+        """send the next pending topic into the pipeline, False when there is none"""
+        pending: Iterator[Tuple[int, str]] = await ctx.get("pending")
+        item = next(pending, None)
+        if item is None:
+            return False
+        admission: Optional[asyncio.Semaphore] = await ctx.get("admission")
+        if admission is not None:
+            # released by run_batch as its consumer takes each result
+            await admission.acquire()
+        stats = await ctx.get("stats")
+        stats["in_flight"] += 1
+        ctx.send_event(TopicEvent(index=item[0], topic=item[1]))
+        return True
+
+    async def _finish(self, ctx: Context) -> StopEvent:
+        stats = await ctx.get("stats")
+        return StopEvent(result={key: value for key, value in stats.items() if key != "in_flight"})
+
+    def run(self, *args: Any, **kwargs: Any) -> Any:
+        """A batch run's checkpoint file is opened here and closed when the run ends, however it ends."""
+        if kwargs.get("topics") is not None and kwargs.get("concurrency", 32) > BATCH_WORKERS:
+            raise ValueError(f"concurrency {kwargs['concurrency']} is above BATCH_WORKERS ({BATCH_WORKERS})")
+        checkpoint = kwargs.get("checkpoint")
+        if kwargs.get("topics") is None or not checkpoint:
+            return super().run(*args, **kwargs)
+        path = os.path.realpath(checkpoint)
+        if path in _open_checkpoints:
+            raise RuntimeError(f"{checkpoint} is already being written by another batch run")
+        f = open(checkpoint, "a", encoding="utf-8")
+        try:
+            if _ends_mid_line(checkpoint):
+                # a crashed run cut its last line off, start ours on a line of its own
+                f.write("\n")
+            handler = super().run(*args, checkpoint_file=f, **kwargs)
+        except BaseException:
+            f.close()
+            raise
+        _open_checkpoints.add(path)
+
+        def _close(_: Any) -> None:
+            f.close()
+            _open_checkpoints.discard(path)
+
+        handler.add_done_callback(_close)
+        return handler
+
+    async def run_batch(
+        self,
+        topics: Iterable[str],
+        concurrency: int = 32,
+        checkpoint: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """yield {"index", "topic", "joke", "critique", "error"} per topic as they finish"""
+        admission = asyncio.Semaphore(concurrency)
+        handler = self.run(topics=topics, concurrency=concurrency, checkpoint=checkpoint, admission=admission)
+        try:
+            async for ev in handler.stream_events():
+                if isinstance(ev, CritiqueEvent):
+                    yield ev.model_dump()
+                    # the consumer is back for more, room for one more topic
+                    admission.release()
+            await handler
+        finally:
+            # the consumer stopped early, don't leave the batch running behind its back;
+            # wait for it to stop, so the checkpoint is closed once this returns
+            if not handler.done():
+                await handler.cancel_run()
+                await asyncio.wait({handler})
@@ -44,7 +44,7 @@ class LoopExampleFlow(Workflow):
     async def improve_query(self, ev: FailedEvent) -> QueryEvent | StopEvent:
         random_number = random.randint(0,1)
         if random_number == 0:
-            return QueryEvent(error="Here is another query")
+            return QueryEvent(query="Here is another query")
         else:
             return StopEvent(result="Failed to fix query") 
 
@@ -6,19 +6,25 @@ from llama_index.core.workflow import (
     step,
     Context
 )
-from llama_index.llms.openai import OpenAI
 from llama_index.core.workflow import draw_all_possible_flows
 from llama_index.utils.workflow import draw_most_recent_execution 
 
+from src.utils.resources import ResourceRegistry
 from dotenv import load_dotenv 
-import os 
+from typing import Any
 
 load_dotenv()
 
 class OpenAIGenerator(Workflow):
+    def __init__(self, *args: Any, resources: ResourceRegistry | None = None, **kwargs: Any) -> None:
+        """the LLM client is taken from `resources` once and reused across runs"""
+        super().__init__(*args, **kwargs)
+        self.resources = resources or ResourceRegistry()
+
     @step 
     async def generate(self, ev: StartEvent) -> StopEvent:
-        llm = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # OpenAI reads OPENAI_API_KEY from the environment
+        llm = self.resources.llm()
         response = await llm.acomplete(ev.query)
         return StopEvent(result=str(response))
     
@@ -1,4 +1,7 @@
-from urllib import response
+import os
+import time
+from typing import Any
+
 from llama_index.core.workflow import (
     Context,
     Workflow,
@@ -7,17 +10,25 @@ from llama_index.core.workflow import (
     StopEvent,
     step,
 )
-from llama_index.core.schema import NodeWithScore
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core.postprocessor.llm_rerank import LLMRerank 
-from llama_index.llms.openai import OpenAI
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.base.embeddings.base import BaseEmbedding
 from llama_index.core.response_synthesizers import CompactAndRefine
+from llama_index.core.base.response.schema import AsyncStreamingResponse, Response
+from src.utils.index_store import LocalIndexStore
+from src.utils.embedding_cache import CachedEmbedding, EmbeddingCache
+from src.utils.rerank import AsyncLLMRerank, LocalRerank
+from src.utils.hybrid_retriever import HybridRetriever
+from src.utils.answer_cache import SemanticAnswerCache
+from src.utils.resources import ResourceRegistry
+from src.utils.packing import PackedSynthesizer
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
+# nodes kept by the reranker and handed to synthesis
+RERANK_TOP_N = 3
+
 class RetrieverEvent(Event):
     "Result of running retrieval"
     nodes: list[NodeWithScore]
@@ -26,26 +37,134 @@ class RerankEvent(Event):
     "Result of reranking on retrieval nodes"
     nodes: list[NodeWithScore]
 
+class RetrievalStreamEvent(Event):
+    "Streamed to the caller as soon as retrieval is done"
+    nodes: list[NodeWithScore]
+
+class TokenEvent(Event):
+    "One streamed chunk of the answer"
+    delta: str
+
+class RunMetricsEvent(Event):
+    "Streamed last: time to first token and throughput of the answer"
+    metrics: dict
+
 
 class RagWorkflow(Workflow):
 
+    def __init__(self,
+                 *args: Any,
+                 persist_dir: str | None = None,
+                 embed_model: BaseEmbedding | None = None,
+                 incremental: bool = False,
+                 embed_cache: EmbeddingCache | None = None,
+                 vector_store_kwargs: dict | None = None,
+                 reranker: str = "llm",
+                 similarity_top_k: int = 2,
+                 rerank_concurrency: int = 10,
+                 hybrid: bool = False,
+                 answer_cache: SemanticAnswerCache | None = None,
+                 resources: ResourceRegistry | None = None,
+                 synthesis: str = "compact",
+                 token_budget: int | None = None,
+                 **kwargs: Any
+                 ) -> None:
+        """
+        - persist_dir: where the embedded corpus is stored, so later runs load it instead of re-embedding
+        - embed_model: used for both document and query embeddings
+        - incremental: default for re-syncing a persisted store with its directory on ingest
+        - embed_cache: shared by ingest and retrieve, so no text is embedded twice. Defaults to
+          an in-memory LRU, backed by a SQLite file inside `persist_dir` when one is set;
+          the default is kept in `resources` and closed with it
+        - vector_store_kwargs: options for the NumpyVectorStore behind the index,
+          e.g. {"approximate": True, "n_probe": 16} for IVF search on very large corpora
+        - reranker: "local" scores nodes with BM25 + embedding cosine and only calls the
+          LLM reranker when the cut is ambiguous, "llm" always uses the LLM reranker
+        - similarity_top_k: nodes retrieved per query and handed to the reranker; with
+          reranker="local" at least twice the RERANK_TOP_N nodes that are kept
+        - rerank_concurrency: LLM rerank choice batches scored in parallel
+        - hybrid: fuse dense retrieval with a BM25 lookup in the inverted index built at
+          ingest (reciprocal rank fusion), so exact terms like part numbers are not missed
+        - answer_cache: serves near-identical queries from earlier answers, skipping
+          retrieval, reranking and synthesis; cleared when the index changes
+        - resources: registry the LLM, embedding model, rerankers and synthesizer come from;
+          they are built once and reused by every run. Close it with `await resources.aclose()`
+        - synthesis: "compact" uses CompactAndRefine, which makes extra refine calls when the
+          nodes overflow the context; "packed" packs the best nodes into one prompt, one LLM call
+        - token_budget: context tokens for "packed", defaults to what the LLM's window leaves free
+        """
+        super().__init__(*args, **kwargs)
+        self.resources = resources or ResourceRegistry()
+        self.persist_dir = persist_dir
+        embed_model = embed_model or self.resources.embed_model("text-embedding-3-small")
+        if not isinstance(embed_model, CachedEmbedding):
+            if embed_cache is None:
+                cache_path = os.path.join(persist_dir, "embedding_cache.sqlite") if persist_dir else None
+                # opens its SQLite file on first use, `resources.aclose()` closes it
+                embed_cache = self.resources.get(
+                    f"embedding_cache:{cache_path}", lambda: EmbeddingCache(path=cache_path)
+                )
+            embed_model = CachedEmbedding(embed_model, cache=embed_cache)
+        self.embed_model = embed_model
+        self.vector_store_kwargs = vector_store_kwargs or {}
+        self.reranker = reranker
+        self.similarity_top_k = similarity_top_k
+        self.rerank_concurrency = rerank_concurrency
+        self.hybrid = hybrid
+        self.answer_cache = answer_cache
+        self.incremental = incremental
+        self.synthesis = synthesis
+        self.token_budget = token_budget
+
     @step
     async def ingest(self, ctx: Context, ev: StartEvent)-> StopEvent:
-        """Entry point to ingest a document, triggered by a StartEvent with `dirname`."""
+        """Entry point to ingest a document, triggered by a StartEvent with `dirname`.
+
+        With a `persist_dir` (on the workflow or the StartEvent) an existing store is
+        loaded back instead of re-reading and re-embedding the directory; pass `rebuild=True`
+        to force a fresh ingest. With `incremental=True` the loaded store is synced with
+        `dirname`: only new or modified files are re-chunked and only their changed chunks
+        are embedded, nodes of deleted files are dropped.
+
+        Embedding runs through the EmbeddingPipeline; `embed_batch_size` and
+        `embed_concurrency` on the StartEvent tune batch size and requests in flight.
+        """
         dirname = ev.get("dirname")
         if not dirname:
             return None 
-        
-        documents = SimpleDirectoryReader(dirname).load_data()
-        index = VectorStoreIndex.from_documents(
-            documents=documents,
-            embed_model=OpenAIEmbedding(model_name="text-embedding-3-small")
-        )
+
+        persist_dir = ev.get("persist_dir") or self.persist_dir
+        rebuild = ev.get("rebuild", False)
+        incremental = ev.get("incremental", self.incremental)
+
+        store = None
+        if persist_dir and not rebuild and LocalIndexStore.exists(persist_dir):
+            store = LocalIndexStore.load(persist_dir)
+            if store.model_name != self.embed_model.model_name:
+                print(f"stored index was built with {store.model_name}, rebuilding")
+                store = None
+            else:
+                print(f"Loaded {len(store.nodes)} nodes from {persist_dir}")
+
+        if store is None or incremental:
+            store = store or LocalIndexStore()
+            stats = await store.aupdate(
+                dirname,
+                embed_model=self.embed_model,
+                batch_size=ev.get("embed_batch_size", 64),
+                max_concurrency=ev.get("embed_concurrency", 4),
+            )
+            print(f"Ingested {dirname}: {stats}")
+            dirty = stats["changed"] or stats["removed"] or stats["refreshed"]
+            if persist_dir and (dirty or not LocalIndexStore.exists(persist_dir)):
+                store.persist(persist_dir)
+
+        index = store.to_index(embed_model=self.embed_model, **self.vector_store_kwargs)
 
         return StopEvent(result=index)
     
     @step 
-    async def retrieve(self, ctx: Context, ev: StartEvent)-> RetrieverEvent:
+    async def retrieve(self, ctx: Context, ev: StartEvent)-> RetrieverEvent | StopEvent:
         "Entry point for RAG, triggered by a StartEvent with `query`."
         query = ev.get("query")
         index = ev.get("index")
@@ -54,32 +173,75 @@ class RagWorkflow(Workflow):
             return None
         
         await ctx.set("query", query)
+        await ctx.set("started", time.perf_counter())
+        await ctx.set("stream", bool(ev.get("stream", False)))
 
 
         if index is None:
             print("no index available, load documennts before query")
             return None 
-        
-        retriever = index.as_retriever(similarity_top_k=2)
 
-        nodes = await retriever.aretrieve(query)
+        # embedded once: the answer cache, retrieval and the reranker all use this vector
+        query_embedding = await self.embed_model.aget_query_embedding(query)
+        await ctx.set("query_embedding", query_embedding)
+
+        if self.answer_cache is not None:
+            version = getattr(index.vector_store, "version", None) or str(id(index))
+            self.answer_cache.check_version(version)
+            cached = self.answer_cache.lookup(query_embedding)
+            if cached is not None:
+                print(f"Answer cache hit for '{cached.query}'")
+                response = AsyncStreamingResponse(
+                    response_gen=None,
+                    source_nodes=cached.source_nodes,
+                    response_txt=cached.answer,
+                )
+                if await ctx.get("stream"):
+                    ctx.write_event_to_stream(RetrievalStreamEvent(nodes=cached.source_nodes))
+                    response = await self._stream_tokens(ctx, response)
+                return StopEvent(result=response)
+        
+        top_k = self.similarity_top_k
+        if self.reranker == "local":
+            # the local reranker needs more candidates than it keeps to find an ambiguous cut
+            top_k = max(top_k, 2 * RERANK_TOP_N)
+        retriever = index.as_retriever(similarity_top_k=top_k)
+        vector_store = index.vector_store
+        if self.hybrid and getattr(vector_store, "lexical_index", None) is not None:
+            candidate_k = max(10, 2 * top_k)
+            retriever = HybridRetriever(
+                index.as_retriever(similarity_top_k=candidate_k),
+                vector_store=vector_store,
+                similarity_top_k=top_k,
+                candidate_k=candidate_k,
+            )
+
+        nodes = await retriever.aretrieve(QueryBundle(query, embedding=query_embedding))
 
         print(f"Retrieved {len(nodes)} nodes.")
 
+        if await ctx.get("stream"):
+            ctx.write_event_to_stream(RetrievalStreamEvent(nodes=nodes))
+
         return RetrieverEvent(nodes=nodes)
     
     @step
     async def rerank(self, ctx: Context, ev: RetrieverEvent) -> RerankEvent:
 
-        ranker = LLMRerank(
+        ranker = self.resources.get(f"rag_llm_reranker:{self.rerank_concurrency}", lambda: AsyncLLMRerank(
             choice_batch_size=5,
-            top_n=3,
-            llm=OpenAI(model="gpt-4o-mini")
-        )   
-
-        new_nodes = ranker.postprocess_nodes(
-            nodes=ev.nodes, 
-            query_str=await ctx.get("query", default=None)
+            top_n=RERANK_TOP_N,
+            llm=self.resources.llm("gpt-4o-mini"),
+            max_concurrency=self.rerank_concurrency,
+        ))
+        if self.reranker == "local":
+            ranker = self.resources.get(f"rag_local_reranker:{id(self.embed_model)}", lambda: LocalRerank(
+                top_n=RERANK_TOP_N, embed_model=self.embed_model, fallback=ranker
+            ))
+
+        new_nodes = await ranker.apostprocess_nodes(
+            nodes=ev.nodes,
+            query_bundle=QueryBundle(await ctx.get("query"), embedding=await ctx.get("query_embedding")),
         )
         print(f"Reranked Nodes to {len(new_nodes)}")
 
@@ -87,21 +249,88 @@ class RagWorkflow(Workflow):
     
     @step
     async def synthesize(self, ctx: Context, ev: RerankEvent) -> StopEvent:
-        """Return a streaming response using reranked nodes."""
-        llm = OpenAI(model="gpt-4o-mini")
-        summarizer = CompactAndRefine(
-            llm=llm, 
-            streaming=True, 
-            verbose=True, 
-        )
+        """Return a streaming response using reranked nodes.
+
+        With `stream=True` on the StartEvent the tokens are instead pushed to the event
+        stream while the run is in flight, and the result is the finished Response,
+        with time-to-first-token and tokens/sec in `response.metadata["metrics"]`:
+
+            handler = w.run(query=..., index=index, stream=True)
+            async for ev in handler.stream_events():
+                if isinstance(ev, TokenEvent):
+                    print(ev.delta, end="", flush=True)
+            response = await handler
+        """
+        if self.synthesis == "packed":
+            summarizer = self.resources.get(f"rag_packed_synthesizer:{self.token_budget}", lambda: PackedSynthesizer(
+                llm=self.resources.llm("gpt-4o-mini"),
+                streaming=True,
+                token_budget=self.token_budget,
+            ))
+        else:
+            summarizer = self.resources.get("rag_synthesizer", lambda: CompactAndRefine(
+                llm=self.resources.llm("gpt-4o-mini"), 
+                streaming=True, 
+                verbose=True, 
+            ))
 
         query = await ctx.get("query", default=True)
 
 
         response = await summarizer.asynthesize(query, nodes=ev.nodes)
 
+        if self.answer_cache is not None and isinstance(response, AsyncStreamingResponse):
+            response.response_gen = self._cache_when_done(
+                response.response_gen,
+                query=query,
+                query_embedding=await ctx.get("query_embedding"),
+                source_nodes=ev.nodes,
+                started=await ctx.get("started"),
+            )
+
+        if await ctx.get("stream"):
+            response = await self._stream_tokens(ctx, response)
+
         return StopEvent(result=response)
 
+    async def _stream_tokens(self, ctx: Context, response: AsyncStreamingResponse) -> Response:
+        """Drain the answer into TokenEvents, measuring from the start of the run."""
+        started = await ctx.get("started")
+        first_token_at = None
+        tokens = 0
+        async for token in response.async_response_gen():
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            tokens += 1
+            ctx.write_event_to_stream(TokenEvent(delta=token))
+        finished = time.perf_counter()
+
+        generation = finished - (first_token_at or finished)
+        metrics = {
+            "time_to_first_token_s": round((first_token_at or finished) - started, 4),
+            "total_s": round(finished - started, 4),
+            "tokens": tokens,
+            "tokens_per_sec": round(tokens / generation, 1) if generation > 0 else None,
+        }
+        ctx.write_event_to_stream(RunMetricsEvent(metrics=metrics))
+        metadata = dict(response.metadata or {})
+        metadata["metrics"] = metrics
+        return Response(response.response_txt, source_nodes=response.source_nodes, metadata=metadata)
+
+    async def _cache_when_done(self, response_gen, query, query_embedding, source_nodes, started):
+        """Pass tokens through to the caller, store the full answer once the stream ends."""
+        answer = ""
+        async for token in response_gen:
+            answer += token
+            yield token
+        self.answer_cache.put(
+            query,
+            query_embedding,
+            answer,
+            source_nodes=source_nodes,
+            latency=time.perf_counter() - started,
+        )
+
 
 
 
@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+from src.utils.mock_backend import mock_embedding_factory, mock_llm_factory
+from src.utils.resources import ResourceRegistry
+from src.workflows.rag import RagWorkflow
+
+
+def test_sqlite_cache_opens_on_first_use_and_closes_with_resources(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("hello world " * 50)
+    persist_dir = str(tmp_path / "store")
+
+    async def main():
+        resources = ResourceRegistry(llm_factory=mock_llm_factory(), embed_model_factory=mock_embedding_factory())
+        workflow = RagWorkflow(resources=resources, persist_dir=persist_dir, timeout=30)
+        created_on_init = os.path.exists(persist_dir)
+        await workflow.run(dirname=str(data))
+        cache = workflow.embed_model.cache
+        opened = cache._db is not None
+        await resources.aclose()
+        return created_on_init, opened, cache._db
+
+    created_on_init, opened, db = asyncio.run(main())
+
+    assert not created_on_init
+    assert opened
+    assert os.path.exists(os.path.join(persist_dir, "embedding_cache.sqlite"))
+    assert db is None
@@ -0,0 +1,123 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import MetadataMode
+
+from src.utils.index_store import LocalIndexStore
+from src.utils.mock_backend import HashEmbedding
+
+PARSER = SentenceSplitter(chunk_size=64, chunk_overlap=0)
+
+
+class CountingEmbedding(HashEmbedding):
+    embedded: int = 0
+
+    async def _aget_text_embeddings(self, texts):
+        self.embedded += len(texts)
+        return await super()._aget_text_embeddings(texts)
+
+
+def write(path, doc: int, sentences: int = 30, extra: str = "") -> None:
+    path.write_text(" ".join(f"File {doc} sentence {s} says something." for s in range(sentences)) + extra)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for doc in range(3):
+        write(data / f"doc{doc}.txt", doc)
+    return data
+
+
+def update(store, dirname, embed_model, **kwargs):
+    return asyncio.run(store.aupdate(str(dirname), embed_model=embed_model, node_parser=PARSER, batch_size=4, **kwargs))
+
+
+def assert_consistent(store, embed_model):
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in store.nodes]
+    expected = np.asarray(embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+    assert np.allclose(store.embeddings, expected, atol=1e-6)
+    assert len(store.lexical_index) == len(store.nodes)
+
+
+def test_reingest_embeds_only_what_changed(corpus, tmp_path):
+    embed_model = CountingEmbedding(embed_dim=16)
+    store = LocalIndexStore()
+    first = update(store, corpus, embed_model)
+    assert first["changed"] == 3 and first["embedded"] == len(store.nodes)
+    store.persist(str(tmp_path / "store"))
+    store = LocalIndexStore.load(str(tmp_path / "store"))
+
+    embed_model.embedded = 0
+    assert update(store, corpus, embed_model)["unchanged"] == 3
+    assert embed_model.embedded == 0
+
+    # one file grows a sentence, one is deleted
+    write(corpus / "doc1.txt", 1, extra=" And one more sentence at the end.")
+    os.remove(corpus / "doc2.txt")
+    stats = update(store, corpus, embed_model)
+
+    assert (stats["unchanged"], stats["changed"], stats["removed"]) == (1, 1, 1)
+    assert 0 < stats["embedded"] < stats["reused"]
+    assert embed_model.embedded == stats["embedded"]
+    assert {node.metadata["file_path"] for node in store.nodes} == {str(corpus / "doc0.txt"), str(corpus / "doc1.txt")}
+    assert_consistent(store, embed_model)
+
+
+def test_touched_files_are_refreshed_and_the_refresh_persists(corpus, tmp_path):
+    embed_model = CountingEmbedding(embed_dim=16)
+    store = LocalIndexStore()
+    update(store, corpus, embed_model)
+    store.persist(str(tmp_path / "store"))
+
+    stat = os.stat(corpus / "doc0.txt")
+    os.utime(corpus / "doc0.txt", (stat.st_atime, stat.st_mtime + 10))
+    store = LocalIndexStore.load(str(tmp_path / "store"))
+    embed_model.embedded = 0
+    stats = update(store, corpus, embed_model)
+    assert (stats["refreshed"], stats["changed"], embed_model.embedded) == (1, 0, 0)
+
+    store.persist(str(tmp_path / "store"))
+    store = LocalIndexStore.load(str(tmp_path / "store"))
+    assert update(store, corpus, embed_model)["unchanged"] == 3
+
+
+def test_a_cancelled_update_leaves_the_store_as_it_was(corpus):
+    class SlowEmbedding(CountingEmbedding):
+        async def _aget_text_embeddings(self, texts):
+            await asyncio.sleep(0.05)
+            return await super()._aget_text_embeddings(texts)
+
+    embed_model = SlowEmbedding(embed_dim=16)
+    store = LocalIndexStore()
+    update(store, corpus, embed_model)
+    nodes, embeddings = list(store.nodes), store.embeddings.copy()
+    write(corpus / "doc0.txt", 0, sentences=200)
+
+    async def cancelled():
+        task = asyncio.create_task(store.aupdate(str(corpus), embed_model=embed_model, node_parser=PARSER, batch_size=4))
+        await asyncio.sleep(0.08)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled())
+
+    assert [node.node_id for node in store.nodes] == [node.node_id for node in nodes]
+    assert np.array_equal(store.embeddings, embeddings)
+    # the next update picks the change up
+    assert update(store, corpus, embed_model)["changed"] == 1
+    assert_consistent(store, embed_model)
+
+
+def test_another_embedding_model_is_refused(corpus):
+    store = LocalIndexStore()
+    update(store, corpus, HashEmbedding(embed_dim=16, model_name="a"))
+
+    with pytest.raises(ValueError):
+        update(store, corpus, HashEmbedding(embed_dim=16, model_name="b"))
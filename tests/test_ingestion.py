@@ -0,0 +1,111 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import Document, MetadataMode
+
+from src.utils.ingestion import EmbeddingPipeline
+from src.utils.mock_backend import HashEmbedding
+
+
+class TrackingEmbedding(HashEmbedding):
+    """Records batches in flight; the first batch is the slowest, so batches finish out of order."""
+
+    in_flight: int = 0
+    peak: int = 0
+    batches: int = 0
+    fail_on: str = ""
+
+    async def _aget_text_embeddings(self, texts):
+        self.batches += 1
+        slow = self.batches == 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.05 if slow else 0.005)
+            if self.fail_on and any(self.fail_on in text for text in texts):
+                raise RuntimeError("embedding service down")
+            return [self._embed(text) for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+def documents(count: int = 6):
+    return [
+        Document(text=" ".join(f"Document {d} sentence {s} is here." for s in range(40)), id_=f"doc{d}")
+        for d in range(count)
+    ]
+
+
+def pipeline(embed_model, **kwargs) -> EmbeddingPipeline:
+    return EmbeddingPipeline(
+        embed_model, node_parser=SentenceSplitter(chunk_size=64, chunk_overlap=0), batch_size=4, **kwargs
+    )
+
+
+def test_vectors_come_back_in_document_order_within_the_concurrency_limit():
+    embed_model = TrackingEmbedding(embed_dim=16)
+    pipe = pipeline(embed_model, max_concurrency=3)
+
+    nodes, vectors = asyncio.run(pipe.run(documents()))
+
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    assert [node.ref_doc_id for node in nodes] == sorted(node.ref_doc_id for node in nodes)
+    assert np.allclose(np.stack(vectors), np.asarray(embed_model.get_text_embedding_batch(texts), dtype=np.float32))
+    assert 1 < embed_model.peak <= 3
+    assert pipe.stats.embedded == pipe.stats.chunks == len(nodes)
+
+
+def test_lookup_hits_are_not_embedded():
+    embed_model = TrackingEmbedding(embed_dim=16)
+    known = {}
+    first_nodes, first_vectors = asyncio.run(pipeline(embed_model).run(documents(2)))
+    for node, vector in zip(first_nodes, first_vectors):
+        known[node.get_content(metadata_mode=MetadataMode.EMBED)] = vector
+
+    pipe = pipeline(embed_model)
+    nodes, vectors = asyncio.run(pipe.run(documents(3), lookup=known.get))
+
+    assert pipe.stats.reused == len(first_nodes)
+    assert pipe.stats.embedded == len(nodes) - len(first_nodes)
+    assert all(vector is not None for vector in vectors)
+
+
+def test_a_slow_consumer_bounds_the_batches_ahead_of_it():
+    async def main():
+        embed_model = TrackingEmbedding(embed_dim=16)
+        pipe = pipeline(embed_model, max_concurrency=2, max_pending_batches=2)
+        stream = pipe.stream(documents(20))
+        await stream.__anext__()
+        await asyncio.sleep(0.2)
+        ahead = embed_model.batches
+        await stream.aclose()
+        return ahead
+
+    # the window: 2 queued + 2 embedding, plus the one handed out and the one being cut
+    assert asyncio.run(main()) <= 2 + 2 + 2
+
+
+def test_embedding_errors_reach_the_consumer_and_stop_the_pipeline():
+    async def main():
+        embed_model = TrackingEmbedding(embed_dim=16, fail_on="Document 2 ")
+        with pytest.raises(RuntimeError):
+            await pipeline(embed_model).run(documents())
+        await asyncio.sleep(0.05)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(main()) == []
+
+
+def test_closing_the_stream_early_cancels_the_pipeline():
+    async def main():
+        stream = pipeline(TrackingEmbedding(embed_dim=16)).stream(documents(20))
+        async for _ in stream:
+            break
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(main()) == []
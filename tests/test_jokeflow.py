@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from src.utils.mock_backend import MockFunctionCallingLLM, mock_llm_factory
+from src.utils.resources import ResourceRegistry
+from src.workflows.jokeflow import BATCH_WORKERS, JokeFlow, read_checkpoint
+
+TOPICS = [f"topic {i}" for i in range(20)]
+
+
+def joke_flow(latency_ms: float = 1.0) -> JokeFlow:
+    resources = ResourceRegistry(llm_factory=mock_llm_factory(latency_ms=latency_ms))
+    return JokeFlow(resources=resources, timeout=None)
+
+
+def test_closing_run_batch_stops_the_run_and_its_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "jokes.jsonl")
+
+    async def main():
+        flow = joke_flow()
+        async with contextlib.aclosing(flow.run_batch(TOPICS, concurrency=4, checkpoint=checkpoint)) as results:
+            async for _ in results:
+                break
+        written = len(read_checkpoint(checkpoint))
+        await asyncio.sleep(0.05)
+        return written
+
+    written = asyncio.run(main())
+
+    assert 1 <= written < len(TOPICS)
+    # nothing was appended after the close returned
+    assert len(read_checkpoint(checkpoint)) == written
+
+
+def test_checkpoint_is_written_by_one_run_at_a_time(tmp_path):
+    checkpoint = str(tmp_path / "jokes.jsonl")
+
+    async def main():
+        flow = joke_flow()
+        first = flow.run(topics=TOPICS, concurrency=4, checkpoint=checkpoint)
+        with pytest.raises(RuntimeError):
+            flow.run(topics=TOPICS, concurrency=4, checkpoint=checkpoint)
+        stats = await first
+        # free again once the first run is done
+        again = await flow.run(topics=TOPICS, concurrency=4, checkpoint=checkpoint)
+        return stats, again
+
+    stats, again = asyncio.run(main())
+
+    assert stats == {"skipped": 0, "completed": len(TOPICS), "failed": 0}
+    assert again == {"skipped": len(TOPICS), "completed": 0, "failed": 0}
+
+
+def test_concurrency_above_the_worker_count_is_refused():
+    with pytest.raises(ValueError):
+        joke_flow().run(topics=TOPICS, concurrency=BATCH_WORKERS + 1)
+
+
+class FlakyJokeLLM(MockFunctionCallingLLM):
+    """Fails every prompt mentioning one of `failing`."""
+
+    failing: list = []
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        if any(topic in prompt for topic in self.failing):
+            raise RuntimeError(f"no joke for {prompt}")
+        return await super().acomplete(prompt, formatted=formatted, **kwargs)
+
+
+def flaky_flow(failing) -> JokeFlow:
+    resources = ResourceRegistry(llm_factory=lambda registry, model, **kwargs: FlakyJokeLLM(failing=failing))
+    return JokeFlow(resources=resources, timeout=None)
+
+
+def test_resume_skips_done_topics_and_retries_failed_ones(tmp_path):
+    checkpoint = str(tmp_path / "jokes.jsonl")
+
+    async def main():
+        first = await flaky_flow(["topic 3", "topic 7"]).run(topics=TOPICS, concurrency=4, checkpoint=checkpoint)
+        # a crash while writing cuts the last line off
+        with open(checkpoint, "a", encoding="utf-8") as f:
+            f.write('{"index": 19, "topic": "top')
+        results = []
+        async for result in flaky_flow([]).run_batch(TOPICS, concurrency=4, checkpoint=checkpoint):
+            results.append(result)
+        return first, results
+
+    first, results = asyncio.run(main())
+
+    assert first == {"skipped": 0, "completed": 18, "failed": 2}
+    assert sorted(result["index"] for result in results) == [3, 7]
+    assert all(result["error"] is None for result in results)
+    assert read_checkpoint(checkpoint) == dict(enumerate(TOPICS))
+
+
+def test_a_changed_topic_list_is_not_skipped(tmp_path):
+    checkpoint = str(tmp_path / "jokes.jsonl")
+    changed = list(TOPICS)
+    changed[5] = "something else"
+
+    async def main():
+        await joke_flow().run(topics=TOPICS, concurrency=4, checkpoint=checkpoint)
+        return await joke_flow().run(topics=changed, concurrency=4, checkpoint=checkpoint)
+
+    stats = asyncio.run(main())
+
+    assert stats == {"skipped": len(TOPICS) - 1, "completed": 1, "failed": 0}
@@ -0,0 +1,131 @@
+import asyncio
+
+from llama_index.core.workflow import StartEvent, StopEvent, Workflow, step
+
+from src.utils.pool import WorkflowPool
+
+
+class SleepFlow(Workflow):
+    @step
+    async def sleep(self, ev: StartEvent) -> StopEvent:
+        await asyncio.sleep(ev.get("delay", 0.0))
+        return StopEvent(result=ev.get("tag"))
+
+
+def test_freed_instance_goes_to_the_oldest_waiter():
+    async def main():
+        pool = await WorkflowPool(lambda: SleepFlow(timeout=10), size=1).start()
+        workflow = await pool._acquire(None)
+        queued = [asyncio.create_task(pool._acquire(None)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # a newcomer scheduled in the same loop pass as the release must not take the instance
+        late = asyncio.create_task(pool._acquire(None))
+        pool._release(workflow)
+        await asyncio.sleep(0.01)
+        served = [task.done() for task in queued + [late]]
+        for task in queued + [late]:
+            task.cancel()
+        return served
+
+    assert asyncio.run(main()) == [True, False, False, False]
+
+
+def test_runs_keep_arrival_order():
+    async def main():
+        started = []
+
+        class RecordingFlow(SleepFlow):
+            @step
+            async def sleep(self, ev: StartEvent) -> StopEvent:
+                started.append(ev.get("tag"))
+                await asyncio.sleep(ev.get("delay", 0.0))
+                return StopEvent(result=ev.get("tag"))
+
+        async with WorkflowPool(lambda: RecordingFlow(timeout=10), size=2, timeout=5) as pool:
+            results = await asyncio.gather(*(pool.run(tag=i, delay=0.01) for i in range(8)))
+        return started, results
+
+    started, results = asyncio.run(main())
+    assert started == list(range(8))
+    assert results == list(range(8))
+
+
+def test_full_queue_is_refused_right_away():
+    async def main():
+        async with WorkflowPool(lambda: SleepFlow(timeout=10), size=1, max_queue=2, timeout=5) as pool:
+            runs = [asyncio.create_task(pool.run(tag=i, delay=0.1)) for i in range(3)]
+            await asyncio.sleep(0.01)
+            try:
+                await pool.run(tag=3)
+            except asyncio.QueueFull:
+                refused = True
+            else:
+                refused = False
+            results = await asyncio.gather(*runs)
+            return refused, results, pool.stats
+
+    refused, results, stats = asyncio.run(main())
+
+    assert refused
+    assert results == [0, 1, 2]
+    assert stats["rejected"] == 1 and stats["completed"] == 3
+
+
+def test_deadline_covers_queue_wait_and_run():
+    async def main():
+        async with WorkflowPool(lambda: SleepFlow(timeout=10), size=1, timeout=0.1) as pool:
+            slow = asyncio.create_task(pool.run(tag=0, delay=1.0))
+            await asyncio.sleep(0.01)
+            # expires while still waiting for the only instance
+            queued = asyncio.create_task(pool.run(tag=1, timeout=0.05))
+            outcomes = await asyncio.gather(slow, queued, return_exceptions=True)
+            # the timed out run's instance was replaced, the pool still serves
+            after = await pool.run(tag=2, timeout=5)
+            return outcomes, after, pool.stats
+
+    outcomes, after, stats = asyncio.run(main())
+
+    assert all(isinstance(outcome, asyncio.TimeoutError) for outcome in outcomes)
+    assert after == 2
+    assert stats["timed_out"] == 2 and stats["queue_depth"] == 0
+
+
+def test_close_drains_admitted_runs_and_refuses_new_ones():
+    async def main():
+        pool = await WorkflowPool(lambda: SleepFlow(timeout=10), size=1, timeout=5).start()
+        runs = [asyncio.create_task(pool.run(tag=i, delay=0.05)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        closing = asyncio.create_task(pool.close())
+        await asyncio.sleep(0)
+        try:
+            await pool.run(tag=3)
+        except RuntimeError:
+            refused = True
+        else:
+            refused = False
+        await closing
+        return refused, [run.done() for run in runs], await asyncio.gather(*runs)
+
+    refused, done_at_close, results = asyncio.run(main())
+
+    assert refused
+    assert done_at_close == [True, True, True]
+    assert results == [0, 1, 2]
+
+
+def test_cancelled_caller_frees_its_slot():
+    async def main():
+        async with WorkflowPool(lambda: SleepFlow(timeout=10), size=1, timeout=5) as pool:
+            caller = asyncio.create_task(pool.run(tag=0, delay=1.0))
+            await asyncio.sleep(0.01)
+            caller.cancel()
+            try:
+                await caller
+            except asyncio.CancelledError:
+                pass
+            return await pool.run(tag=1), pool.stats
+
+    result, stats = asyncio.run(main())
+
+    assert result == 1
+    assert stats["busy"] == 0
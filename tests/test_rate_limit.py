@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from src.utils.guarded_llm import LLMGuard
+from src.utils.mock_backend import MockFunctionCallingLLM, MockRateLimitError, ProviderLimits
+from src.utils.rate_limit import AdaptiveConcurrency, RateLimiter, TokenBucket
+
+
+class Flaky:
+    """Fails with `errors` in turn, then succeeds."""
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class ServerError(Exception):
+    status_code = 500
+
+
+def test_aimd_grows_by_one_per_window_and_halves_once_per_round_trip():
+    limit = AdaptiveConcurrency(initial=4, minimum=1, maximum=8)
+    # +1/limit per success: about one window of `limit` successes for +1
+    for _ in range(5):
+        limit.increase()
+    assert int(limit.limit) == 5
+
+    started_before = time.monotonic()
+    limit.decrease(time.monotonic())
+    # a 429 for a call that started before that decrease is the same overload
+    limit.decrease(started_before)
+    assert limit.limit == pytest.approx(5.0 * 0.5, rel=0.05)
+    assert limit.decreases == 1
+
+    for _ in range(10):
+        limit.decrease(time.monotonic())
+    assert limit.limit == 1
+
+
+def test_throttled_calls_are_retried_after_retry_after():
+    async def main():
+        limiter = RateLimiter(base_delay=0.01)
+        call = Flaky(MockRateLimitError("slow down", retry_after=0.05), ServerError())
+        started = time.monotonic()
+        result = await limiter.run(call)
+        return limiter, call, result, time.monotonic() - started
+
+    limiter, call, result, elapsed = asyncio.run(main())
+
+    assert (result, call.calls) == ("ok", 3)
+    assert elapsed >= 0.05
+    assert limiter.stats["throttled"] == 1 and limiter.stats["retries"] == 2
+    assert limiter.concurrency.limit < 16
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_permanent_errors_and_exhausted_retries_fail():
+    async def main():
+        limiter = RateLimiter(max_retries=2, base_delay=0.001)
+        with pytest.raises(ValueError):
+            await limiter.run(Flaky(ValueError("bad request")))
+        always = Flaky(*[ServerError() for _ in range(5)])
+        with pytest.raises(ServerError):
+            await limiter.run(always)
+        return limiter, always
+
+    limiter, always = asyncio.run(main())
+
+    assert always.calls == 3
+    assert limiter.stats["failures"] == 2
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_a_call_cancelled_during_backoff_holds_no_slot():
+    async def main():
+        limiter = RateLimiter(max_concurrency=1, base_delay=10.0)
+        task = asyncio.create_task(limiter.run(Flaky(ServerError())))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # the only slot is free again
+        return await asyncio.wait_for(limiter.run(Flaky()), timeout=1.0), limiter
+
+    result, limiter = asyncio.run(main())
+
+    assert result == "ok"
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_token_bucket_waits_for_refill():
+    async def main():
+        bucket = TokenBucket(rate=600, burst=1 / 600)  # 10 per second, holds one
+        waits = [await bucket.acquire() for _ in range(3)]
+        return waits
+
+    waits = asyncio.run(main())
+
+    assert waits[0] < 0.01
+    assert sum(waits) == pytest.approx(0.2, abs=0.08)
+
+
+def test_limited_calls_stay_within_provider_limits():
+    async def main():
+        limits = ProviderLimits(requests=5, window=0.2)
+        llm = LLMGuard(
+            max_concurrency=8,
+            rate_limiter=RateLimiter(requests_per_minute=5 * 60 / 0.2, burst=0.2 / 60, base_delay=0.01),
+        ).wrap(MockFunctionCallingLLM(provider_limits=limits))
+        responses = await asyncio.gather(*(llm.acomplete(f"prompt {i}") for i in range(20)))
+        return limits, responses
+
+    limits, responses = asyncio.run(main())
+
+    assert len(responses) == 20
+    assert limits.accepted == 20
+
+
+def test_stream_holds_its_slots_until_drained():
+    async def main():
+        limiter = RateLimiter(max_concurrency=4)
+        guard = LLMGuard(max_concurrency=4, rate_limiter=limiter)
+        llm = guard.wrap(MockFunctionCallingLLM(output_tokens=5))
+        stream = await llm.astream_complete("hello")
+        first = await stream.__anext__()
+        held = (limiter.concurrency.in_flight, guard.in_flight)
+        rest = [chunk async for chunk in stream]
+        return first, rest, held, (limiter.concurrency.in_flight, guard.in_flight)
+
+    first, rest, held, after = asyncio.run(main())
+
+    assert len(rest) == 4
+    assert held == (1, 1)
+    assert after == (0, 0)
@@ -0,0 +1,137 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+
+from src.utils.hybrid_retriever import FusedNodeWithScore, HybridRetriever
+from src.utils.inverted_index import InvertedIndex
+from src.utils.mock_backend import HashEmbedding
+from src.utils.numpy_vector_store import NumpyVectorStore
+from src.utils.rerank import LocalRerank, _min_max
+from src.utils.text import bm25_scores
+
+TEXTS = [
+    "The cat sat on the mat and purred at the cat next door.",
+    "Dogs bark at cats, cats ignore dogs.",
+    "A mat is a flat piece of fabric placed on a floor.",
+    "Purring is a sound made by cats when they are content.",
+    "The stock market fell sharply on Monday.",
+    "Cat food prices rose for the third month.",
+    "Weaving a mat takes patience and reeds.",
+    "Cats sleep up to sixteen hours a day.",
+]
+QUERY = "why do cats purr on the mat"
+
+
+@pytest.fixture
+def embed_model():
+    return HashEmbedding(embed_dim=64)
+
+
+@pytest.fixture
+def index(embed_model):
+    nodes = [TextNode(text=text, id_=f"n{i}") for i, text in enumerate(TEXTS)]
+    embeddings = np.asarray(
+        embed_model.get_text_embedding_batch([node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]),
+        dtype=np.float32,
+    )
+    vector_store = NumpyVectorStore.from_arrays(nodes, embeddings)
+    vector_store.set_lexical_index(InvertedIndex.build(nodes))
+    return VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+
+
+def expected_order(nodes, embed_model, alpha=0.5, top_n=3):
+    """LocalRerank's formula with the cosine recomputed from scratch for every candidate."""
+    texts = [node.node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    q = np.asarray(embed_model.get_query_embedding(QUERY), dtype=np.float32)
+    vectors = np.asarray(embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+    dense = (vectors @ q) / np.maximum(np.linalg.norm(vectors, axis=1) * np.linalg.norm(q), 1e-12)
+    lexical = bm25_scores(QUERY, [node.node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes])
+    fused = alpha * _min_max(dense) + (1 - alpha) * _min_max(lexical)
+    return [nodes[i].node.node_id for i in np.argsort(-fused)[:top_n]]
+
+
+@pytest.mark.parametrize("hybrid", [False, True])
+def test_rerank_uses_dense_cosine(index, embed_model, hybrid):
+    retriever = index.as_retriever(similarity_top_k=6)
+    if hybrid:
+        retriever = HybridRetriever(
+            index.as_retriever(similarity_top_k=10),
+            vector_store=index.vector_store,
+            similarity_top_k=6,
+            candidate_k=10,
+        )
+    nodes = retriever.retrieve(QUERY)
+    assert len(nodes) == 6
+
+    reranked = LocalRerank(top_n=3, embed_model=embed_model).postprocess_nodes(nodes, QueryBundle(QUERY))
+
+    assert [node.node.node_id for node in reranked] == expected_order(nodes, embed_model)
+
+
+def test_hybrid_nodes_keep_dense_cosine(index):
+    dense = {node.node.node_id: node.score for node in index.as_retriever(similarity_top_k=10).retrieve(QUERY)}
+    retriever = HybridRetriever(
+        index.as_retriever(similarity_top_k=10), vector_store=index.vector_store, similarity_top_k=6, candidate_k=10
+    )
+
+    nodes = retriever.retrieve(QUERY)
+
+    assert all(isinstance(node, FusedNodeWithScore) for node in nodes)
+    for node in nodes:
+        assert node.dense_score == pytest.approx(dense[node.node.node_id])
+        assert node.score != pytest.approx(node.dense_score)
+
+
+def test_rerank_ignores_rrf_score(embed_model):
+    nodes = [
+        FusedNodeWithScore(node=TextNode(text=text, id_=f"n{i}"), score=1.0 / (60 + i), dense_score=None)
+        for i, text in enumerate(TEXTS)
+    ]
+    plain = [NodeWithScore(node=node.node) for node in nodes]
+    rerank = LocalRerank(top_n=3, embed_model=embed_model)
+
+    fused = rerank.postprocess_nodes(nodes, QueryBundle(QUERY))
+    embedded = rerank.postprocess_nodes(plain, QueryBundle(QUERY))
+
+    assert [node.node.node_id for node in fused] == [node.node.node_id for node in embedded]
+
+
+def test_lexical_hits_get_cosine_from_the_store(index, embed_model):
+    query_embedding = embed_model.get_query_embedding(QUERY)
+    dense = {node.node.node_id: node.score for node in index.as_retriever(similarity_top_k=8).retrieve(QUERY)}
+    # a dense path of 2 leaves most fused nodes as lexical-only hits
+    retriever = HybridRetriever(
+        index.as_retriever(similarity_top_k=2), vector_store=index.vector_store, similarity_top_k=6, candidate_k=6
+    )
+
+    nodes = retriever.retrieve(QueryBundle(QUERY, embedding=query_embedding))
+
+    for node in nodes:
+        assert node.dense_score == pytest.approx(dense[node.node.node_id], abs=1e-6)
+
+
+class CountingEmbedding(HashEmbedding):
+    sync_calls: int = 0
+
+    def _get_query_embedding(self, query):
+        self.sync_calls += 1
+        return super()._get_query_embedding(query)
+
+    def _get_text_embeddings(self, texts):
+        self.sync_calls += 1
+        return super()._get_text_embeddings(texts)
+
+
+def test_async_rerank_does_not_embed_synchronously(index):
+    embed_model = CountingEmbedding(embed_dim=64)
+    nodes = [FusedNodeWithScore(node=TextNode(text=text, id_=f"n{i}"), score=0.0) for i, text in enumerate(TEXTS)]
+    rerank = LocalRerank(top_n=3, embed_model=embed_model)
+
+    reranked = asyncio.run(rerank.apostprocess_nodes(nodes, query_str=QUERY))
+
+    assert embed_model.sync_calls == 0
+    assert [node.node.node_id for node in reranked] == expected_order(nodes, embed_model)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from llama_index.core.llms import ChatMessage
+from llama_index.core.tools import FunctionTool
+
+from src.utils.mock_backend import MockFunctionCallingLLM
+from src.utils.sessions import SessionStore
+from src.workflows.function_calling import FunctionCallingAgent
+
+
+async def lookup(city: str) -> str:
+    """Look up the weather in a city."""
+    await asyncio.sleep(0.05)
+    return f"sunny in {city}"
+
+
+def make_agent(**kwargs) -> FunctionCallingAgent:
+    def script(messages, tools):
+        # one tool call with the user's message, then the answer naming it
+        if messages[-1].role.value == "user":
+            return [{"tool_name": "lookup", "tool_kwargs": {"city": messages[-1].content}}]
+        return f"answer for {messages[-1].content}"
+
+    llm = MockFunctionCallingLLM(tool_script=script)
+    return FunctionCallingAgent(llm=llm, tools=[FunctionTool.from_defaults(async_fn=lookup)], timeout=10, **kwargs)
+
+
+def contents(agent: FunctionCallingAgent, session_id: str):
+    return [m.content for m in agent.sessions.get(session_id).memory.get_all() if m.role.value in ("user", "assistant") and m.content]
+
+
+def test_concurrent_runs_keep_their_own_session_and_sources():
+    agent = make_agent()
+
+    async def main():
+        return await asyncio.gather(*(agent.run(input=city, session_id=city) for city in ["paris", "oslo", "rome"]))
+
+    results = asyncio.run(main())
+
+    for city, result in zip(["paris", "oslo", "rome"], results):
+        assert result["session_id"] == city
+        assert [str(source) for source in result["sources"]] == [f"sunny in {city}"]
+        assert contents(agent, city) == [city, f"answer for sunny in {city}"]
+
+
+def test_a_cancelled_run_leaves_its_session_untouched():
+    agent = make_agent()
+
+    async def main():
+        await agent.run(input="paris", session_id="s")
+        handler = agent.run(input="oslo", session_id="s")
+        await asyncio.sleep(0.02)  # inside the tool call
+        await handler.cancel_run()
+        await asyncio.wait({handler})
+        # the conversation carries on from the last finished turn
+        return await agent.run(input="rome", session_id="s")
+
+    asyncio.run(main())
+
+    assert contents(agent, "s") == ["paris", "answer for sunny in paris", "rome", "answer for sunny in rome"]
+
+
+def test_commits_of_one_session_never_interleave():
+    store = SessionStore()
+    turns = [[ChatMessage(role="user", content=f"{n}-{i}") for i in range(3)] for n in range(5)]
+
+    async def main():
+        await asyncio.gather(*(store.commit("s", turn) for turn in turns))
+
+    asyncio.run(main())
+
+    stored = [m.content for m in store.get("s").memory.get_all()]
+    assert sorted(stored[i : i + 3] for i in range(0, len(stored), 3)) == [[m.content for m in t] for t in turns]
+
+
+def test_least_recently_used_and_idle_sessions_are_evicted():
+    store = SessionStore(max_sessions=2, ttl=0.05)
+    asyncio.run(store.commit("a", [ChatMessage(role="user", content="hi")]))
+    store.get("b")
+    store.get("a")
+    store.get("c")  # b is the least recently used
+
+    assert "b" not in store and "a" in store and store.evictions == 1
+
+    time.sleep(0.06)
+    store.get("d")
+    assert len(store) == 1 and store.evictions == 3
+    assert store.chat_store.get_messages("a") == []
+
+
+def test_a_session_resumes_from_its_chat_store():
+    agent = make_agent(sessions=SessionStore(evict_history=False))
+    # a fresh agent on the same chat store, e.g. after a restart
+    resumed = make_agent(sessions=SessionStore(chat_store=agent.sessions.chat_store))
+
+    async def main():
+        await agent.run(input="paris", session_id="s")
+        agent.sessions.end("s")
+        await resumed.run(input="oslo", session_id="s")
+
+    asyncio.run(main())
+
+    assert contents(resumed, "s") == ["paris", "answer for sunny in paris", "oslo", "answer for sunny in oslo"]
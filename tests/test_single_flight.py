@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from src.utils.mock_backend import MockFunctionCallingLLM
+from src.utils.single_flight import CompletionCache, LLMCoalescer, SingleFlight
+
+
+class Upstream:
+    """Counts calls; each one takes `delay` seconds and returns its call number."""
+
+    def __init__(self, delay: float = 0.05, error: Exception | None = None) -> None:
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        number = self.calls
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return number
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        results = await asyncio.gather(*(flight.do("k", upstream) for _ in range(5)))
+        return flight, upstream, results
+
+    flight, upstream, results = asyncio.run(main())
+
+    assert results == [1] * 5
+    assert upstream.calls == 1
+    assert flight.stats["leaders"] == 1 and flight.stats["followers"] == 4
+    assert len(flight) == 0
+
+
+def test_a_waiter_takes_over_when_the_leader_is_cancelled():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        leader = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(flight.do("k", upstream)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return upstream, results
+
+    upstream, results = asyncio.run(main())
+
+    # one follower made the second call, the others joined it
+    assert upstream.calls == 2
+    assert results == [2, 2, 2]
+
+
+def test_a_cancelled_follower_leaves_the_call_running():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        leader = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return upstream, await leader
+
+    upstream, result = asyncio.run(main())
+
+    assert (upstream.calls, result) == (1, 1)
+
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream(error=ValueError("boom"))
+        results = await asyncio.gather(*(flight.do("k", upstream) for _ in range(3)), return_exceptions=True)
+        upstream.error = None
+        return upstream, results, await flight.do("k", upstream)
+
+    upstream, results, retried = asyncio.run(main())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == 2
+
+
+def test_coalesced_responses_are_copies_and_cached_at_temperature_zero():
+    async def main():
+        llm = MockFunctionCallingLLM(latency_ms=20, temperature=0.0)
+        coalescing = LLMCoalescer(cache=CompletionCache()).wrap(llm)
+        first, second = await asyncio.gather(coalescing.acomplete("hi"), coalescing.acomplete("hi"))
+        first.additional_kwargs["seen"] = True
+        third = await coalescing.acomplete("hi")
+        return llm, first, second, third
+
+    llm, first, second, third = asyncio.run(main())
+
+    assert llm.calls == 1
+    assert first.text == second.text == third.text
+    assert "seen" not in second.additional_kwargs and "seen" not in third.additional_kwargs
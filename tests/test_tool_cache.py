@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from llama_index.core.tools import ToolOutput
+
+from src.utils.tool_cache import ToolResultCache, tool_cache_key
+
+
+class Tool:
+    def __init__(self, delay: float = 0.05, error: Exception | None = None) -> None:
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self) -> ToolOutput:
+        self.calls += 1
+        number = self.calls
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return ToolOutput(content=str(number), tool_name="lookup", raw_input={}, raw_output=number)
+
+
+def test_key_ignores_argument_order():
+    assert tool_cache_key("lookup", {"a": 1, "b": [2, 3]}) == tool_cache_key("lookup", {"b": [2, 3], "a": 1})
+
+
+def test_identical_calls_in_flight_run_once_then_hit():
+    async def main():
+        cache, tool = ToolResultCache(), Tool()
+        outputs = await asyncio.gather(*(cache.acall("lookup", {"key": 1}, tool) for _ in range(4)))
+        again = await cache.acall("lookup", {"key": 1}, tool)
+        return cache, tool, outputs, again
+
+    cache, tool, outputs, again = asyncio.run(main())
+
+    assert tool.calls == 1
+    assert [output.raw_output for output in outputs + [again]] == [1] * 5
+    assert cache.stats["misses"] == 1 and cache.stats["hits"] == 4
+
+
+def test_a_waiter_runs_the_tool_when_the_runner_is_cancelled():
+    async def main():
+        cache, tool = ToolResultCache(), Tool()
+        runner = asyncio.create_task(cache.acall("lookup", {"key": 1}, tool))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.acall("lookup", {"key": 1}, tool)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        runner.cancel()
+        outputs = await asyncio.gather(*waiters)
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+        return cache, tool, outputs
+
+    cache, tool, outputs = asyncio.run(main())
+
+    assert tool.calls == 2
+    assert [output.raw_output for output in outputs] == [2, 2, 2]
+    assert cache.get(tool_cache_key("lookup", {"key": 1})).raw_output == 2
+
+
+def test_failures_are_not_cached():
+    async def main():
+        cache, tool = ToolResultCache(), Tool(error=RuntimeError("down"))
+        with pytest.raises(RuntimeError):
+            await cache.acall("lookup", {"key": 1}, tool)
+        tool.error = None
+        return tool, await cache.acall("lookup", {"key": 1}, tool)
+
+    tool, output = asyncio.run(main())
+
+    assert (tool.calls, output.raw_output) == (2, 2)
+
+
+def test_entries_expire_and_the_least_recently_used_is_evicted():
+    async def main():
+        cache, tool = ToolResultCache(max_entries=2), Tool(delay=0.0)
+        await cache.acall("lookup", {"key": "expiring"}, tool, ttl=0.0)
+        await cache.acall("lookup", {"key": "expiring"}, tool, ttl=0.0)
+        for key in ("a", "b", "a", "c"):
+            await cache.acall("lookup", {"key": key}, tool)
+        return cache, tool
+
+    cache, tool = asyncio.run(main())
+
+    # "expiring" ran twice, "a" once: its second call was a hit
+    assert tool.calls == 5
+    assert cache.get(tool_cache_key("lookup", {"key": "a"})) is not None
+    assert cache.get(tool_cache_key("lookup", {"key": "b"})) is None
+    assert cache.stats["evictions"] == 2
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from llama_index.core.tools import FunctionTool
+
+from src.utils.tool_executor import ToolExecutor, is_native_async
+
+
+def add(a: int, b: int) -> int:
+    """Add two integers."""
+    return a + b
+
+
+async def aadd(a: int, b: int) -> int:
+    """Add two integers, asynchronously."""
+    return a + b
+
+
+def test_sync_tool_is_not_native_async():
+    assert not is_native_async(FunctionTool.from_defaults(fn=add))
+
+
+def test_async_tool_is_native_async():
+    assert is_native_async(FunctionTool.from_defaults(async_fn=aadd))
+    assert is_native_async(FunctionTool.from_defaults(fn=add, async_fn=aadd))
+
+
+def test_sync_tool_runs_on_executor_threads():
+    seen = []
+
+    def where(x: int) -> str:
+        """Report the thread."""
+        seen.append(threading.current_thread().name)
+        return str(x)
+
+    executor = ToolExecutor(max_workers=2)
+    try:
+        output = asyncio.run(executor.arun(FunctionTool.from_defaults(fn=where), {"x": 1}))
+    finally:
+        executor.close()
+
+    assert output.content == "1"
+    assert seen[0].startswith("tool")
+
+
+def test_timeout():
+    async def slow(x: int) -> int:
+        """Sleep."""
+        await asyncio.sleep(1)
+        return x
+
+    executor = ToolExecutor()
+
+    async def main():
+        try:
+            await executor.arun(FunctionTool.from_defaults(async_fn=slow), {"x": 1}, timeout=0.01)
+        except asyncio.TimeoutError:
+            return "timeout"
+
+    assert asyncio.run(main()) == "timeout"
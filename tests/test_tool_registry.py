@@ -0,0 +1,60 @@
+import pytest
+
+from llama_index.core.tools import FunctionTool
+from llama_index.llms.openai import OpenAI
+
+from src.utils.tool_registry import ToolRegistry
+
+
+def add(a: int, b: int) -> int:
+    """Add two integers."""
+    return a + b
+
+
+def search(query: str, limit: int = 5) -> str:
+    """Search the docs for `query`."""
+    return query
+
+
+@pytest.fixture
+def tools():
+    return [FunctionTool.from_defaults(fn=add), FunctionTool.from_defaults(fn=search)]
+
+
+@pytest.mark.parametrize("strict", [False, True])
+@pytest.mark.parametrize("model", ["gpt-4o-mini", "gpt-3.5-turbo-instruct"])
+def test_offered_tools_give_the_same_request(tools, strict, model):
+    registry = ToolRegistry(tools)
+    llm = OpenAI(model=model, api_key="sk-test", strict=strict)
+
+    expected = llm._prepare_chat_with_tools(tools, chat_history=[], allow_parallel_tool_calls=True)
+    # twice: the first request must not have edited the cached schemas
+    for _ in range(2):
+        prepared = llm._prepare_chat_with_tools(registry.offered(), chat_history=[], allow_parallel_tool_calls=True)
+        assert prepared == expected
+
+
+def test_schema_is_generated_once(tools, monkeypatch):
+    registry = ToolRegistry(tools)
+    calls = []
+    schema = tools[1].metadata.fn_schema
+    original = schema.model_json_schema
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(schema, "model_json_schema", counting)
+    for _ in range(3):
+        registry.offered(["search"])[0].metadata.to_openai_tool()
+
+    assert len(calls) == 1
+
+
+def test_offered_order_and_call(tools):
+    registry = ToolRegistry(tools)
+
+    offered = registry.offered(["search", "add"])
+
+    assert [tool.metadata.get_name() for tool in offered] == ["search", "add"]
+    assert offered[1](a=1, b=2).content == "3"
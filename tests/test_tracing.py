@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.workflow import Context, Event, StartEvent, StopEvent, Workflow, step
+
+from src.utils.mock_backend import MockFunctionCallingLLM
+from src.utils.tracing import WorkflowTracer
+
+
+class WorkEvent(Event):
+    n: int
+
+
+class DoneEvent(Event):
+    pass
+
+
+class FanOutFlow(Workflow):
+    """Two events queue up for one worker, the second waits for the first to finish."""
+
+    @step
+    async def start(self, ctx: Context, ev: StartEvent) -> WorkEvent:
+        ctx.send_event(WorkEvent(n=0))
+        return WorkEvent(n=1)
+
+    @step(num_workers=1)
+    async def work(self, ev: WorkEvent) -> DoneEvent:
+        await asyncio.sleep(0.1)
+        return DoneEvent()
+
+    @step
+    async def done(self, ctx: Context, ev: DoneEvent) -> StopEvent | None:
+        if len(ctx.collect_events(ev, [DoneEvent, DoneEvent]) or []) == 2:
+            return StopEvent(result="done")
+        return None
+
+
+class DroppedStreamFlow(Workflow):
+    llm = MockFunctionCallingLLM(output_tokens=4)
+
+    @step
+    async def start(self, ev: StartEvent) -> StopEvent:
+        for _ in range(ev.get("streams")):
+            # opened, never read to the end
+            await self.llm.astream_complete("tell me a story")
+        return StopEvent(result="done")
+
+
+@pytest.fixture
+def tracer():
+    def install(**kwargs):
+        installed.append(WorkflowTracer(**kwargs).install())
+        return installed[-1]
+
+    installed = []
+    yield install
+    dispatcher = get_dispatcher()
+    for tracer in installed:
+        dispatcher.span_handlers.remove(tracer)
+        dispatcher.event_handlers[:] = [h for h in dispatcher.event_handlers if getattr(h, "tracer", None) is not tracer]
+
+
+def test_queue_wait_runs_from_send_to_step_start(tracer):
+    traced = tracer()
+
+    async def main():
+        return await FanOutFlow(timeout=10).run()
+
+    asyncio.run(main())
+
+    work = sorted((s for s in traced.runs[0].steps if s.name == "work"), key=lambda s: s.start)
+    assert work[0].queue_wait < 0.05
+    # sent together with the first, picked up once the only worker was free again
+    assert work[1].queue_wait == pytest.approx(0.1, abs=0.05)
+
+
+def test_dropped_streams_are_forgotten(tracer):
+    traced = tracer(llm_stream_ttl=0.0)
+
+    async def main():
+        return await DroppedStreamFlow(timeout=10).run(streams=5)
+
+    asyncio.run(main())
+
+    assert len(traced._llm_calls) <= 1